@@ -0,0 +1,94 @@
+"""Benchmark de arranque en frío: tiempo hasta la primera petición atendida.
+
+Prepara una base temporal (esquema y datos de ejemplo, fuera de la medición)
+y arranca varias veces un proceso uvicorn nuevo, midiendo desde el lanzamiento
+hasta la primera respuesta de /health y de /api/inventario/productos. También
+mide el tiempo de importar ``main`` en un intérprete limpio.
+
+Uso: python benchmarks/bench_arranque.py [repeticiones]
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(url, limite: float = 60):
+    fin = time.perf_counter() + limite
+    while time.perf_counter() < fin:
+        try:
+            if httpx.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def arrancar(entorno):
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-c",
+         f"import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={puerto}, log_level='warning')"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        salud = esperar(f"http://127.0.0.1:{puerto}/health") - inicio
+        api = esperar(f"http://127.0.0.1:{puerto}/api/inventario/productos") - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return salud, api
+
+
+def medir_importacion(entorno):
+    salida = subprocess.run(
+        [sys.executable, "-c",
+         "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True
+    )
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = dict(
+            os.environ,
+            STOREVISION_DB=f"sqlite:///{os.path.join(directorio, 'arranque.db')}",
+            STOREVISION_MANTENIMIENTO="0"
+        )
+        subprocess.run(
+            [sys.executable, "main.py", "sembrar"],
+            cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, check=True
+        )
+
+        # La primera ejecución compila los .pyc; no se cuenta
+        arrancar(entorno)
+        tiempos = [arrancar(entorno) for _ in range(repeticiones)]
+        importacion = [medir_importacion(entorno) for _ in range(repeticiones)]
+
+    salud = [t[0] for t in tiempos]
+    api = [t[1] for t in tiempos]
+    print(f"{repeticiones} arranques")
+    print(f"  import main            : mediana {statistics.median(importacion) * 1000:7.0f} ms")
+    print(f"  primera /health        : mediana {statistics.median(salud) * 1000:7.0f} ms  mín {min(salud) * 1000:7.0f} ms")
+    print(f"  primera petición a API : mediana {statistics.median(api) * 1000:7.0f} ms  mín {min(api) * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark de la consulta de costo del balance.
+
+Compara el costo de ventas calculado uniendo items_venta con productos
+(costo actual del producto) contra el costo guardado en cada item al vender.
+Usa una base SQLite temporal con datos sintéticos.
+
+Uso: python benchmarks/bench_balance_costo.py [ventas] [productos]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+
+from models.database import Base
+from models.modelos import Usuario, Sucursal, Producto, Venta, ItemVenta
+
+
+def poblar(motor, num_ventas: int, num_productos: int):
+    rng = random.Random(42)
+    inicio = datetime(2025, 1, 1, 8, 0, 0)
+    categorias = ["Lácteos", "Granos", "Aseo", "Bebidas", "Panadería", "Carnes"]
+
+    productos = [
+        {
+            "id": i,
+            "codigo": f"P{i:06d}",
+            "nombre": f"Producto {i}",
+            "categoria": categorias[i % len(categorias)],
+            "precio_venta": 1000.0 + i % 500 * 100,
+            "costo": 700.0 + i % 500 * 70,
+            "stock_actual": 100,
+            "stock_minimo": 5
+        }
+        for i in range(1, num_productos + 1)
+    ]
+    ventas = []
+    items = []
+    for venta_id in range(1, num_ventas + 1):
+        total = 0.0
+        for _ in range(rng.randint(1, 5)):
+            producto = productos[rng.randrange(num_productos)]
+            cantidad = rng.randint(1, 4)
+            subtotal = cantidad * producto["precio_venta"]
+            total += subtotal
+            items.append({
+                "venta_id": venta_id,
+                "producto_id": producto["id"],
+                "cantidad": cantidad,
+                "precio_unitario": producto["precio_venta"],
+                "subtotal": subtotal,
+                "costo_unitario": producto["costo"],
+                "categoria": producto["categoria"]
+            })
+        ventas.append({
+            "id": venta_id,
+            "sucursal_id": 1,
+            "usuario_id": 1,
+            "total": total,
+            "fecha_venta": inicio + timedelta(seconds=365 * 86400 * venta_id // num_ventas),
+            "estado": "completada"
+        })
+
+    with motor.begin() as conexion:
+        conexion.execute(insert(Usuario), [{
+            "id": 1, "nombre": "Cajera", "email": "caja@bench", "hashed_password": "x", "rol": "cajero"
+        }])
+        conexion.execute(insert(Sucursal), [{"id": 1, "nombre": "Principal"}])
+        conexion.execute(insert(Producto), productos)
+        conexion.execute(insert(Venta), ventas)
+        conexion.execute(insert(ItemVenta), items)
+    return len(items)
+
+
+def medir(motor, consulta, repeticiones: int = 5):
+    tiempos = []
+    with motor.connect() as conexion:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            filas = conexion.execute(consulta).all()
+            tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), filas
+
+
+def main():
+    num_ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    num_productos = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+
+    with tempfile.TemporaryDirectory() as directorio:
+        motor = create_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}")
+        Base.metadata.create_all(bind=motor)
+        num_items = poblar(motor, num_ventas, num_productos)
+
+        dia = func.date(Venta.fecha_venta)
+        filtros = (
+            Venta.fecha_venta >= datetime(2025, 1, 1),
+            Venta.fecha_venta < datetime(2026, 1, 1),
+            Venta.estado == "completada"
+        )
+
+        con_union = (select(dia, ItemVenta.producto_id, func.sum(ItemVenta.cantidad * Producto.costo))
+            .join(Venta, ItemVenta.venta_id == Venta.id)
+            .join(Producto, ItemVenta.producto_id == Producto.id)
+            .where(*filtros)
+            .group_by(dia, ItemVenta.producto_id))
+        desnormalizada = (select(dia, ItemVenta.producto_id, func.sum(ItemVenta.cantidad * ItemVenta.costo_unitario))
+            .join(Venta, ItemVenta.venta_id == Venta.id)
+            .where(*filtros)
+            .group_by(dia, ItemVenta.producto_id))
+
+        t_union, filas_union = medir(motor, con_union)
+        t_desnormalizada, filas_desnormalizada = medir(motor, desnormalizada)
+        motor.dispose()
+
+    costo_union = sum(fila[2] for fila in filas_union)
+    costo_desnormalizado = sum(fila[2] for fila in filas_desnormalizada)
+
+    print(f"{num_ventas} ventas, {num_items} items, {num_productos} productos (un año, por día y producto)")
+    print(f"  unión con productos     : {t_union * 1000:8.1f} ms")
+    print(f"  costo guardado en item  : {t_desnormalizada * 1000:8.1f} ms")
+    print(f"  mejora                  : {t_union / t_desnormalizada:8.2f}x")
+    print(f"  costo total igual       : {abs(costo_union - costo_desnormalizado) < 0.01}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark del costo de registrar en la bitácora desde el hilo de la petición.
+
+Compara, por llamada a ``logger.info`` con argumentos:
+  - manejador síncrono (StreamHandler + formato en el hilo que registra),
+  - ManejadorCola de la bitácora (formato JSON y escritura en otro hilo),
+  - nivel filtrado (el registro no se emite),
+con un archivo normal como destino y con un destino lento (cada escritura
+tarda ``LATENCIA_DESTINO``, como una consola o un pipe lleno). En un bucle
+cerrado el hilo escritor comparte el GIL con el que registra, por eso se
+mide también la cola con el escritor arrancado al final. Después mide
+el costo por petición de MiddlewareBitacora con una línea por petición.
+
+Uso: python benchmarks/bench_bitacora.py [llamadas] [peticiones]
+"""
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORIO = tempfile.mkdtemp()
+os.environ["STOREVISION_DB"] = f"sqlite:///{os.path.join(DIRECTORIO, 'bench.db')}"
+os.environ["STOREVISION_MANTENIMIENTO"] = "0"
+os.environ["STOREVISION_LOG_ARCHIVO"] = os.path.join(DIRECTORIO, "bitacora.log")
+
+from controllers.bitacora_controller import FormateadorJSON, ManejadorCola, bitacora
+
+LATENCIA_DESTINO = 0.0002
+
+
+class DestinoLento(io.TextIOBase):
+    def write(self, texto):
+        time.sleep(LATENCIA_DESTINO)
+        return len(texto)
+
+
+def medir_llamadas(manejador, llamadas, nivel=logging.INFO):
+    registro = logging.getLogger("bench.bitacora")
+    registro.handlers[:] = [manejador]
+    registro.propagate = False
+    registro.setLevel(nivel)
+    inicio = time.perf_counter()
+    for i in range(llamadas):
+        registro.info("Venta %s registrada exitosamente", i, extra={"total": i * 100})
+    return (time.perf_counter() - inicio) / llamadas
+
+
+def con_cola(destino, llamadas, diferido=False):
+    cola = queue.SimpleQueue()
+    destino.setFormatter(FormateadorJSON())
+    oyente = logging.handlers.QueueListener(cola, destino)
+    if not diferido:
+        oyente.start()
+    por_llamada = medir_llamadas(ManejadorCola(cola), llamadas)
+    inicio = time.perf_counter()
+    if diferido:
+        oyente.start()
+    oyente.stop()
+    return por_llamada, time.perf_counter() - inicio
+
+
+def sincrono(destino, llamadas):
+    destino.setFormatter(FormateadorJSON())
+    return medir_llamadas(destino, llamadas)
+
+
+def medir_peticiones(peticiones):
+    import main
+    from fastapi.testclient import TestClient
+
+    main.crear_tablas()
+    tiempos = {}
+    for nombre, nivel_peticiones in (("sin línea por petición", "WARNING"), ("con línea por petición", "INFO")):
+        with TestClient(main.app) as cliente:
+            bitacora.fijar_nivel("peticiones", nivel_peticiones)
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+            for _ in range(200):
+                cliente.get("/health")
+            muestras = []
+            for _ in range(peticiones):
+                inicio = time.perf_counter()
+                cliente.get("/health")
+                muestras.append(time.perf_counter() - inicio)
+            tiempos[nombre] = statistics.median(muestras)
+    return tiempos
+
+
+def main_bench():
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    peticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    archivo = os.path.join(DIRECTORIO, "micro.log")
+
+    print(f"{llamadas} llamadas a logger.info por configuración (µs por llamada en el hilo que registra)")
+    # Lo mismo que hace bitacora.configurar: sin datos de hilo ni proceso
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+    filtrado = medir_llamadas(logging.StreamHandler(io.StringIO()), llamadas, logging.WARNING)
+    print(f"  nivel filtrado                      {filtrado * 1e6:7.2f}")
+    # Piso: crear el LogRecord sin hacer nada con él
+    print(f"  NullHandler                         {medir_llamadas(logging.NullHandler(), llamadas) * 1e6:7.2f}")
+    print(f"  síncrono, archivo                   {sincrono(logging.FileHandler(archivo), llamadas) * 1e6:7.2f}")
+    por_llamada, vaciado = con_cola(logging.FileHandler(archivo), llamadas)
+    print(f"  cola, archivo                       {por_llamada * 1e6:7.2f}  (vaciado al final {vaciado * 1000:.0f} ms)")
+    # En un bucle cerrado el hilo escritor compite por el GIL; sin él queda
+    # solo lo que paga el hilo que registra
+    por_llamada, vaciado = con_cola(logging.FileHandler(archivo), llamadas, diferido=True)
+    print(f"  cola, escritor después              {por_llamada * 1e6:7.2f}  (vaciado {vaciado * 1000:.0f} ms)")
+
+    lentas = max(1, llamadas // 50)
+    print(f"{lentas} llamadas con un destino de {LATENCIA_DESTINO * 1e6:.0f} µs por escritura")
+    print(f"  síncrono, destino lento             {sincrono(logging.StreamHandler(DestinoLento()), lentas) * 1e6:7.2f}")
+    por_llamada, vaciado = con_cola(logging.StreamHandler(DestinoLento()), lentas)
+    print(f"  cola, destino lento                 {por_llamada * 1e6:7.2f}  (vaciado al final {vaciado * 1000:.0f} ms)")
+
+    print(f"{peticiones} peticiones GET /health con MiddlewareBitacora (mediana, µs)")
+    tiempos = medir_peticiones(peticiones)
+    for nombre, mediana in tiempos.items():
+        print(f"  {nombre:<35} {mediana * 1e6:7.1f}")
+    print(f"  costo de la línea por petición      {(tiempos['con línea por petición'] - tiempos['sin línea por petición']) * 1e6:7.1f}")
+
+
+if __name__ == "__main__":
+    main_bench()
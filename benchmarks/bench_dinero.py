@@ -0,0 +1,74 @@
+"""Benchmark de agregación de montos: Float (pesos) contra Dinero (centavos enteros).
+
+Suma subtotales con centavos en dos tablas SQLite idénticas salvo el tipo de
+la columna y compara tiempo, tamaño en disco y error frente a la suma exacta.
+
+Uso: python benchmarks/bench_dinero.py [filas]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_engine, func, insert, select, type_coerce
+
+from models.modelos import Dinero
+
+
+def medir(conexion, consulta, repeticiones: int = 5):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        valor = conexion.execute(consulta).scalar()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), valor
+
+
+def main():
+    num_filas = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rng = random.Random(42)
+    centavos = [rng.randint(50_00, 250_000_00) for _ in range(num_filas)]
+    exacto = sum(Decimal(c) / 100 for c in centavos)
+
+    esquema = MetaData()
+    tabla_float = Table("montos_float", esquema, Column("id", Integer, primary_key=True), Column("monto", Float))
+    tabla_dinero = Table("montos_dinero", esquema, Column("id", Integer, primary_key=True), Column("monto", Dinero))
+
+    with tempfile.TemporaryDirectory() as directorio:
+        motor = create_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}")
+        esquema.create_all(motor)
+        with motor.begin() as conexion:
+            filas = [{"monto": c / 100} for c in centavos]
+            conexion.execute(insert(tabla_float), filas)
+            conexion.execute(insert(tabla_dinero), filas)
+
+        with motor.connect() as conexion:
+            t_float, suma_float = medir(conexion, select(func.sum(tabla_float.c.monto)))
+            t_dinero, suma_dinero = medir(conexion, select(type_coerce(func.sum(tabla_dinero.c.monto), Integer)))
+            paginas = dict(conexion.exec_driver_sql(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE 'montos_%' GROUP BY name"
+            ).all()) if _tiene_dbstat(conexion) else {}
+        motor.dispose()
+
+    print(f"{num_filas} montos")
+    print(f"  Float  SUM : {t_float * 1000:8.1f} ms  error {abs(Decimal(repr(suma_float)) - exacto)}")
+    print(f"  Dinero SUM : {t_dinero * 1000:8.1f} ms  error {abs(Decimal(suma_dinero) / 100 - exacto)}")
+    if paginas:
+        print(f"  tamaño Float  : {paginas['montos_float'] / 1024:8.0f} KB")
+        print(f"  tamaño Dinero : {paginas['montos_dinero'] / 1024:8.0f} KB")
+
+
+def _tiene_dbstat(conexion):
+    try:
+        conexion.exec_driver_sql("SELECT 1 FROM dbstat LIMIT 1").all()
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark de la importación de ventas históricas.
+
+Genera una exportación sintética (CSV, una línea por item, ventas de 1 a 6
+items sobre ``NUM_PRODUCTOS`` productos a lo largo de tres años) y la importa
+con ``python main.py importar`` sobre copias de una base recién sembrada: con
+validación en el mismo proceso y con procesos de validación. Repite la
+última importación para medir la omisión de ventas ya cargadas y, como
+referencia, mide ``registrar_venta`` (la única vía anterior) venta por venta.
+
+Uso: python benchmarks/bench_importacion.py [ventas] [procesos]
+"""
+import csv
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+DIRECTORIO = tempfile.mkdtemp()
+PLANTILLA = os.path.join(DIRECTORIO, "plantilla.db")
+os.environ["STOREVISION_DB"] = f"sqlite:///{PLANTILLA}"
+os.environ["STOREVISION_MANTENIMIENTO"] = "0"
+
+from sqlalchemy.orm import Session
+
+import main
+from controllers.importacion_controller import PROCESOS_POR_DEFECTO
+from controllers.ventas_controller import ControladorVentas
+from models.database import motor
+from models.modelos import Producto
+
+NUM_PRODUCTOS = 2000
+VENTAS_REFERENCIA = 300
+
+
+def preparar_plantilla():
+    main.crear_tablas()
+    main.sembrar_datos_ejemplo()
+    aleatorio = random.Random(3)
+    with Session(bind=motor) as db:
+        db.add_all(
+            Producto(codigo=f"HIS{i:05d}", nombre=f"Producto {i}", precio_venta=aleatorio.randint(10, 500) * 100,
+                     costo=1000, stock_actual=10 ** 9, categoria=f"Categoría {i % 40}")
+            for i in range(NUM_PRODUCTOS)
+        )
+        db.commit()
+    motor.dispose()
+
+
+def generar_exportacion(ruta, ventas):
+    aleatorio = random.Random(5)
+    inicio = datetime(2021, 1, 1, 8)
+    segundos = int(timedelta(days=3 * 365).total_seconds())
+    lineas = 0
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(["venta", "fecha", "codigo", "cantidad", "precio_unitario", "descuento"])
+        for numero in range(ventas):
+            fecha = (inicio + timedelta(seconds=numero * segundos // ventas)).isoformat(timespec="seconds")
+            for _ in range(aleatorio.randint(1, 6)):
+                precio = aleatorio.randint(10, 500) * 100
+                escritor.writerow([f"POS-{numero:08d}", fecha, f"HIS{aleatorio.randrange(NUM_PRODUCTOS):05d}",
+                                   aleatorio.randint(1, 4), precio, 0 if aleatorio.random() < 0.9 else precio // 10])
+                lineas += 1
+    return lineas
+
+
+def importar(base, exportacion, procesos):
+    entorno = dict(os.environ, STOREVISION_DB=f"sqlite:///{base}", STOREVISION_LOG_FORMATO="texto")
+    inicio = time.perf_counter()
+    salida = subprocess.run(
+        [sys.executable, "main.py", "importar", exportacion, "--procesos", str(procesos)],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True
+    )
+    duracion = time.perf_counter() - inicio
+    if salida.returncode != 0:
+        raise RuntimeError(salida.stderr)
+    resumen = [linea for linea in salida.stderr.splitlines() if "terminada" in linea]
+    return duracion, resumen[-1].split("] ", 1)[-1] if resumen else ""
+
+
+def medir_registrar_venta():
+    aleatorio = random.Random(9)
+    with Session(bind=motor) as db:
+        ids = [fila[0] for fila in db.query(Producto.id).filter(Producto.codigo.like("HIS%"))]
+        controlador = ControladorVentas(db)
+        inicio = time.perf_counter()
+        for _ in range(VENTAS_REFERENCIA):
+            items = [{"producto_id": producto_id, "cantidad": aleatorio.randint(1, 4)}
+                     for producto_id in aleatorio.sample(ids, aleatorio.randint(1, 6))]
+            resultado = controlador.registrar_venta({"items": items}, 1)
+            if "error" in resultado:
+                raise RuntimeError(resultado["error"])
+        return VENTAS_REFERENCIA / (time.perf_counter() - inicio)
+
+
+def main_bench():
+    ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    procesos = int(sys.argv[2]) if len(sys.argv) > 2 else max(PROCESOS_POR_DEFECTO, 2)
+
+    preparar_plantilla()
+    exportacion = os.path.join(DIRECTORIO, "exportacion.csv")
+    lineas = generar_exportacion(exportacion, ventas)
+    print(f"{ventas:,} ventas, {lineas:,} líneas ({os.path.getsize(exportacion) / 2 ** 20:.1f} MB), "
+          f"{NUM_PRODUCTOS} productos, {os.cpu_count()} CPU")
+
+    for nombre, numero_procesos in (("1 proceso", 1), (f"{procesos} procesos", procesos)):
+        base = os.path.join(DIRECTORIO, f"importacion_{numero_procesos}.db")
+        shutil.copyfile(PLANTILLA, base)
+        duracion, resumen = importar(base, exportacion, numero_procesos)
+        print(f"  importar, {nombre:<12} {duracion:7.2f} s  {lineas / duracion:9,.0f} líneas/s  {ventas / duracion:8,.0f} ventas/s")
+        print(f"      {resumen}")
+
+    duracion, resumen = importar(base, exportacion, procesos)
+    print(f"  repetir (todo omitido) {duracion:7.2f} s  {lineas / duracion:9,.0f} líneas/s")
+
+    por_segundo = medir_registrar_venta()
+    print(f"  registrar_venta        {por_segundo:8,.0f} ventas/s  (~{ventas / por_segundo:,.0f} s para el mismo archivo)")
+
+    motor.dispose()
+    shutil.rmtree(DIRECTORIO, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_bench()
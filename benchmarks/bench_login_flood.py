@@ -0,0 +1,123 @@
+"""Benchmark de latencia de caja durante una ráfaga de logins fallidos.
+
+Levanta la aplicación con uvicorn sobre una base temporal, inunda /api/login
+con contraseñas incorrectas desde varios hilos y mide p50/p95 de POST
+/api/ventas: sin ráfaga, con ráfaga y el limitador apagado, y con ráfaga y
+el limitador encendido.
+
+Uso: python benchmarks/bench_login_flood.py [ventas] [hilos_ataque]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORIO = tempfile.mkdtemp()
+os.environ["STOREVISION_DB"] = f"sqlite:///{os.path.join(DIRECTORIO, 'bench.db')}"
+os.environ["STOREVISION_MANTENIMIENTO"] = "0"
+
+import httpx
+import uvicorn
+
+import main
+from controllers.limitador_controller import LimitadorLogin, limitador_login
+from models.database import motor
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def inundar(url, detener, contador):
+    with httpx.Client(base_url=url, timeout=30) as cliente:
+        while not detener.is_set():
+            # Email existente: sin limitador cada intento paga una verificación bcrypt
+            cliente.post("/api/login", json={"email": "admin@storevision.com", "password": "incorrecta"})
+            contador.append(1)
+
+
+def medir_caja(url, sesion, num_ventas):
+    tiempos = []
+    with httpx.Client(base_url=url, timeout=30, headers={"session-id": sesion}) as cliente:
+        for i in range(num_ventas):
+            inicio = time.perf_counter()
+            respuesta = cliente.post("/api/ventas", json={
+                "items": [{"producto_id": i % 12 + 1, "cantidad": 1}],
+                "metodo_pago": "efectivo"
+            })
+            tiempos.append(time.perf_counter() - inicio)
+            respuesta.raise_for_status()
+    return tiempos
+
+
+def escenario(nombre, url, sesion, num_ventas, hilos_ataque, limitador_activo):
+    # Estado limpio del limitador en cada escenario
+    limitador_login.__dict__.update(LimitadorLogin().__dict__)
+    limitador_login.activo = limitador_activo
+
+    detener = threading.Event()
+    intentos = []
+    hilos = [threading.Thread(target=inundar, args=(url, detener, intentos)) for _ in range(hilos_ataque)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.5 if hilos else 0)
+
+    inicio = time.perf_counter()
+    tiempos = medir_caja(url, sesion, num_ventas)
+    duracion = time.perf_counter() - inicio
+
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+
+    print(
+        f"  {nombre:<28} p50 {percentil(tiempos, 0.5) * 1000:7.1f} ms  "
+        f"p95 {percentil(tiempos, 0.95) * 1000:7.1f} ms  "
+        f"logins atendidos {len(intentos) / duracion if hilos else 0:6.0f}/s"
+    )
+
+
+def main_bench():
+    num_ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    hilos_ataque = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    main.crear_tablas()
+    main.sembrar_datos_ejemplo()
+
+    puerto = puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=puerto, log_level="warning"))
+    hilo_servidor = threading.Thread(target=servidor.run, daemon=True)
+    hilo_servidor.start()
+    while not servidor.started:
+        time.sleep(0.05)
+
+    url = f"http://127.0.0.1:{puerto}"
+    with motor.begin() as conexion:
+        conexion.exec_driver_sql("UPDATE productos SET stock_actual = 1000000")
+    sesion = httpx.post(f"{url}/api/login", json={
+        "email": "cajero@storevision.com", "password": "cajero123"
+    }).json()["session_id"]
+
+    print(f"{num_ventas} ventas, {hilos_ataque} hilos de ataque")
+    escenario("sin ráfaga", url, sesion, num_ventas, 0, True)
+    escenario("ráfaga, limitador apagado", url, sesion, num_ventas, hilos_ataque, False)
+    escenario("ráfaga, limitador encendido", url, sesion, num_ventas, hilos_ataque, True)
+
+    servidor.should_exit = True
+    hilo_servidor.join()
+    motor.dispose()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,172 @@
+"""Benchmark del motor de promociones en caja.
+
+Sobre una base temporal con muchos productos y miles de promociones activas
+mide: el tiempo de compilar los índices, la evaluación de una canasta contra
+los índices comparada con recorrer todas las reglas por item, y la latencia de
+``registrar_venta`` sin promociones, con promociones y con recargas
+periódicas de las reglas en otro hilo.
+
+Uso: python benchmarks/bench_promociones.py [promociones] [ventas] [items_por_venta]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORIO = tempfile.mkdtemp()
+os.environ["STOREVISION_DB"] = f"sqlite:///{os.path.join(DIRECTORIO, 'bench.db')}"
+os.environ["STOREVISION_MANTENIMIENTO"] = "0"
+
+from sqlalchemy.orm import Session
+
+import main
+from controllers.promociones_controller import MotorPromociones, ReglaCompilada, motor_promociones
+from controllers.ventas_controller import ControladorVentas
+from models.database import motor
+from models.modelos import Producto, Promocion, a_centavos
+
+NUM_PRODUCTOS = 2000
+CATEGORIAS = [f"Categoría {i}" for i in range(40)]
+INTERVALO_RECARGA = 0.5
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def preparar(num_promociones):
+    main.crear_tablas()
+    main.sembrar_datos_ejemplo()
+    aleatorio = random.Random(7)
+    with Session(bind=motor) as db:
+        db.add_all(
+            Producto(codigo=f"BEN{i:05d}", nombre=f"Producto {i}", precio_venta=aleatorio.randint(10, 500) * 100,
+                     costo=1000, stock_actual=10 ** 9, categoria=aleatorio.choice(CATEGORIAS))
+            for i in range(NUM_PRODUCTOS)
+        )
+        db.flush()
+        ids = [fila[0] for fila in db.query(Producto.id).filter(Producto.codigo.like("BEN%"))]
+        for i in range(num_promociones):
+            tipo = ("porcentaje", "lleve_pague", "precio_especial")[i % 3]
+            por_categoria = tipo == "porcentaje" and i % 10 == 0
+            db.add(Promocion(
+                nombre=f"Promoción {i}", tipo=tipo,
+                producto_id=None if por_categoria else aleatorio.choice(ids),
+                categoria=aleatorio.choice(CATEGORIAS) if por_categoria else None,
+                porcentaje=aleatorio.choice((5, 10, 15, 20)) if tipo == "porcentaje" else None,
+                lleve=3 if tipo == "lleve_pague" else None,
+                pague=2 if tipo == "lleve_pague" else None,
+                precio_especial=900 if tipo == "precio_especial" else None,
+                # Un tercio con franja horaria para ejercitar la vigencia
+                hora_inicio="06:00" if i % 3 == 0 else None,
+                hora_fin="22:00" if i % 3 == 0 else None
+            ))
+        db.commit()
+    return ids
+
+
+def canastas(ids, cantidad, items_por_venta):
+    aleatorio = random.Random(11)
+    return [
+        [{"producto_id": producto_id, "cantidad": aleatorio.randint(1, 4)}
+         for producto_id in aleatorio.sample(ids, items_por_venta)]
+        for _ in range(cantidad)
+    ]
+
+
+def medir_evaluacion(db, ids, items_por_venta, repeticiones=2000):
+    productos = {p.id: p for p in db.query(Producto).filter(Producto.id.in_(ids))}
+    lineas = [
+        [(item["producto_id"], productos[item["producto_id"]].categoria, item["cantidad"],
+          a_centavos(productos[item["producto_id"]].precio_venta)) for item in canasta]
+        for canasta in canastas(ids, 200, items_por_venta)
+    ]
+
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        motor_promociones.evaluar(lineas[i % len(lineas)])
+    indexado = (time.perf_counter() - inicio) / repeticiones
+
+    # Referencia: recorrer todas las reglas por cada item de la canasta
+    reglas = [(p.producto_id, p.categoria, ReglaCompilada(p)) for p in db.query(Promocion).filter(Promocion.activa == True)]
+    ahora = main.modelos.datetime.now()
+    minuto = ahora.hour * 60 + ahora.minute
+    inicio = time.perf_counter()
+    for i in range(repeticiones // 20):
+        for producto_id, categoria, cantidad, precio in lineas[i % len(lineas)]:
+            max((regla.descuento(cantidad, precio) for pid, cat, regla in reglas
+                 if (pid == producto_id or cat == categoria) and regla.vigente(ahora, minuto)), default=0)
+    recorrido = (time.perf_counter() - inicio) / (repeticiones // 20)
+    return indexado, recorrido
+
+
+def medir_caja(canastas_venta):
+    tiempos = []
+    with Session(bind=motor) as db:
+        controlador = ControladorVentas(db)
+        for canasta in canastas_venta:
+            inicio = time.perf_counter()
+            resultado = controlador.registrar_venta({"items": canasta}, 2)
+            tiempos.append(time.perf_counter() - inicio)
+            if "error" in resultado:
+                raise RuntimeError(resultado["error"])
+    return tiempos
+
+
+def imprimir(nombre, tiempos):
+    print(f"  {nombre:<34} p50 {percentil(tiempos, 0.5) * 1000:6.2f} ms  p95 {percentil(tiempos, 0.95) * 1000:6.2f} ms")
+
+
+def main_bench():
+    num_promociones = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_ventas = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    items_por_venta = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+
+    ids = preparar(num_promociones)
+    lote = canastas(ids, num_ventas, items_por_venta)
+
+    print(f"{num_promociones} promociones, {NUM_PRODUCTOS} productos, {num_ventas} ventas de {items_por_venta} items")
+
+    with Session(bind=motor) as db:
+        inicio = time.perf_counter()
+        motor_promociones.recargar(db)
+        print(f"  compilar índices                   {(time.perf_counter() - inicio) * 1000:6.1f} ms ({motor_promociones.reglas} reglas)")
+        indexado, recorrido = medir_evaluacion(db, ids, items_por_venta)
+        print(f"  evaluar canasta con índices        {indexado * 1e6:6.1f} µs")
+        print(f"  evaluar recorriendo todas          {recorrido * 1e6:6.1f} µs")
+
+    activo = motor_promociones.__dict__.copy()
+    motor_promociones.__dict__.update(MotorPromociones().__dict__)
+    imprimir("registrar_venta sin promociones", medir_caja(lote))
+    motor_promociones.__dict__.update(activo)
+    imprimir("registrar_venta con promociones", medir_caja(lote))
+
+    # Recargas periódicas en otro hilo (mucho más seguidas que las ediciones
+    # reales): la caja sigue con los índices anteriores mientras se compilan
+    detener = threading.Event()
+    recargas = []
+
+    def recargar():
+        with Session(bind=motor) as db:
+            while not detener.wait(INTERVALO_RECARGA):
+                motor_promociones.recargar(db)
+                db.rollback()
+                recargas.append(1)
+
+    hilo = threading.Thread(target=recargar)
+    hilo.start()
+    tiempos = medir_caja(lote)
+    detener.set()
+    hilo.join()
+    imprimir(f"con {len(recargas)} recargas en paralelo", tiempos)
+
+    motor.dispose()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,133 @@
+"""Micro-benchmark del costo por llamada de las consultas frecuentes.
+
+Compara, sobre una base temporal con ventas de ejemplo, la forma anterior de
+cada consulta (``db.query`` construido en cada llamada) con la sentencia
+precompilada de ``models.consultas``. Lo medido es sobre todo el costo en
+Python de construir, compilar y materializar cada consulta.
+
+Uso: python benchmarks/bench_sentencias.py [llamadas] [ventas]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORIO = tempfile.mkdtemp()
+os.environ["STOREVISION_DB"] = f"sqlite:///{os.path.join(DIRECTORIO, 'bench.db')}"
+os.environ["STOREVISION_MANTENIMIENTO"] = "0"
+
+from sqlalchemy import and_, func, type_coerce, Integer
+from sqlalchemy.orm import Session
+
+import main
+from controllers.ventas_controller import ControladorVentas
+from models import consultas
+from models.database import motor
+from models.modelos import Producto, Usuario, Venta, ItemVenta
+
+
+def medir(funcion, llamadas):
+    funcion(0)
+    inicio = time.perf_counter()
+    for i in range(llamadas):
+        funcion(i)
+    return (time.perf_counter() - inicio) / llamadas * 1e6
+
+
+def preparar(num_ventas):
+    main.crear_tablas()
+    main.sembrar_datos_ejemplo()
+    with motor.begin() as conexion:
+        conexion.exec_driver_sql("UPDATE productos SET stock_actual = 1000000")
+    with Session(bind=motor) as db:
+        controlador = ControladorVentas(db)
+        for i in range(num_ventas):
+            controlador.registrar_venta({"items": [
+                {"producto_id": i % 12 + 1, "cantidad": 1},
+                {"producto_id": (i + 5) % 12 + 1, "cantidad": 2}
+            ]}, 1)
+
+
+def main_bench():
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_ventas = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    preparar(num_ventas)
+
+    fin = datetime.now() + timedelta(days=1)
+    inicio = fin - timedelta(days=2)
+    periodo = {"fecha_inicio": inicio, "fecha_fin": fin}
+    filtro = and_(Venta.fecha_venta >= inicio, Venta.fecha_venta <= fin, Venta.estado == "completada")
+    ids_venta = [1, 4, 7, 9, 12]
+
+    db = Session(bind=motor)
+    casos = [
+        (
+            "producto por id",
+            lambda i: db.query(Producto).filter(Producto.id == i % 12 + 1).first(),
+            lambda i: db.execute(consultas.PRODUCTO_POR_ID, {"producto_id": i % 12 + 1}).scalar()
+        ),
+        (
+            "productos de una venta (5)",
+            lambda i: [db.query(Producto).filter(Producto.id == pid).first() for pid in ids_venta],
+            lambda i: db.execute(consultas.PRODUCTOS_POR_IDS, {"ids": ids_venta}).scalars().all()
+        ),
+        (
+            "usuario por email",
+            lambda i: db.query(Usuario).filter(Usuario.email == "cajero@storevision.com").first(),
+            lambda i: db.execute(consultas.USUARIO_POR_EMAIL, {"email": "cajero@storevision.com"}).scalar()
+        ),
+        (
+            "ventas por periodo",
+            lambda i: db.query(Venta).filter(filtro).order_by(Venta.fecha_venta.desc()).all(),
+            lambda i: db.execute(consultas.VENTAS_PERIODO, periodo).scalars().all()
+        ),
+        (
+            "detalle de ventas (2 consultas)",
+            lambda i: (
+                db.query(Venta.id, Venta.fecha_venta, Venta.total, Usuario.nombre)
+                .join(Usuario, Venta.usuario_id == Usuario.id).filter(filtro)
+                .order_by(Venta.fecha_venta.desc()).all(),
+                db.query(ItemVenta.venta_id, ItemVenta.cantidad, Producto.nombre,
+                         ItemVenta.precio_unitario, ItemVenta.subtotal)
+                .join(Venta, ItemVenta.venta_id == Venta.id)
+                .join(Producto, ItemVenta.producto_id == Producto.id)
+                .filter(filtro).order_by(ItemVenta.id).all()
+            ),
+            lambda i: (
+                db.execute(consultas.VENTAS_DETALLE_PERIODO, periodo).all(),
+                db.execute(consultas.ITEMS_DETALLE_PERIODO, periodo).all()
+            )
+        ),
+        (
+            "consolidado del día",
+            lambda i: sum(v.total for v in db.query(Venta).filter(filtro).all()),
+            lambda i: db.execute(consultas.TOTALES_VENTAS, periodo).one()
+        ),
+        (
+            "agregado de reportes por día",
+            lambda i: db.query(
+                func.date(Venta.fecha_venta), ItemVenta.producto_id, func.sum(ItemVenta.cantidad),
+                type_coerce(func.sum(ItemVenta.subtotal), Integer),
+                type_coerce(func.sum(ItemVenta.cantidad * ItemVenta.costo_unitario), Integer)
+            ).join(Venta, ItemVenta.venta_id == Venta.id).filter(filtro)
+             .group_by(func.date(Venta.fecha_venta), ItemVenta.producto_id).all(),
+            lambda i: db.execute(consultas.TOTALES_ITEMS_POR_DIA, periodo).all()
+        ),
+    ]
+
+    print(f"{llamadas} llamadas por caso, {num_ventas} ventas en la base")
+    print(f"  {'consulta':<32} {'antes':>10} {'después':>10}")
+    for nombre, antes, despues in casos:
+        t_antes = medir(antes, llamadas)
+        t_despues = medir(despues, llamadas)
+        print(f"  {nombre:<32} {t_antes:7.0f} µs {t_despues:7.0f} µs  ({t_antes / t_despues:4.1f}x)")
+
+    db.close()
+    motor.dispose()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,84 @@
+"""Benchmark de serialización y compresión de respuestas grandes.
+
+Compara el camino por defecto de FastAPI (jsonable_encoder + json.dumps)
+con orjson, y el tamaño en la red sin comprimir, con gzip y con brotli.
+
+Uso: python benchmarks/bench_serializacion.py [ventas]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from views.respuestas import RespuestaJSON, comprimir, brotli
+
+
+def generar_ventas(cantidad: int):
+    inicio = datetime(2025, 1, 1, 8, 0, 0)
+    return [
+        {
+            "id": i,
+            "fecha_venta": inicio + timedelta(seconds=37 * i),
+            "total": 26100.0,
+            "usuario": {"nombre": "Carlos Rodríguez"},
+            "items": [
+                {
+                    "cantidad": 2,
+                    "producto": {"nombre": "Leche Entera Alpina 1L"},
+                    "precio_unitario": 3800.0,
+                    "subtotal": 7600.0
+                },
+                {
+                    "cantidad": 1,
+                    "producto": {"nombre": "Huevos AA x30"},
+                    "precio_unitario": 18500.0,
+                    "subtotal": 18500.0
+                }
+            ]
+        }
+        for i in range(cantidad)
+    ]
+
+
+def medir(funcion, repeticiones: int = 5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    ventas = generar_ventas(cantidad)
+
+    t_fastapi, cuerpo_fastapi = medir(
+        lambda: json.dumps(jsonable_encoder(ventas), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+    t_orjson, cuerpo_orjson = medir(lambda: RespuestaJSON(ventas).body)
+
+    print(f"Ventas: {cantidad:,} (2 items cada una)")
+    print(f"jsonable_encoder + json.dumps: {t_fastapi * 1000:8.1f} ms")
+    print(f"orjson (RespuestaJSON):        {t_orjson * 1000:8.1f} ms  ({t_fastapi / t_orjson:.1f}x)")
+    print()
+
+    t_gzip, cuerpo_gzip = medir(lambda: comprimir(cuerpo_orjson, "gzip"), 3)
+    print(f"Sin comprimir: {len(cuerpo_orjson):>12,} bytes")
+    print(f"gzip:          {len(cuerpo_gzip):>12,} bytes  ({t_gzip * 1000:.1f} ms)")
+    if brotli is not None:
+        t_br, cuerpo_br = medir(lambda: comprimir(cuerpo_orjson, "br"), 3)
+        print(f"brotli:        {len(cuerpo_br):>12,} bytes  ({t_br * 1000:.1f} ms)")
+    else:
+        print("brotli:        no instalado")
+
+    assert json.loads(cuerpo_fastapi) == json.loads(cuerpo_orjson)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Repetición determinista de una captura de tráfico y comparación de latencias.
+
+Una captura (``capturas/captura_*.jsonl``, ver ``controllers/captura_controller.py``)
+se repite contra una base nueva, a la velocidad original o escalada, y deja
+un archivo de resultados por petición. Dos resultados (por ejemplo del árbol
+antes y después de un cambio) se comparan por grupo de ruta.
+
+    python benchmarks/repetir_captura.py repetir captura.jsonl --arbol . --salida antes.jsonl
+    python benchmarks/repetir_captura.py repetir captura.jsonl --arbol ../otro --salida despues.jsonl
+    python benchmarks/repetir_captura.py comparar antes.jsonl despues.jsonl
+
+Con ``--arbol`` se arranca uvicorn en ese árbol sobre una copia de
+``--base`` (o sobre una base sembrada con ``main.py sembrar``) y sin
+mantenimiento en segundo plano; con ``--url`` se usa un servidor ya en
+marcha. Las contraseñas no están en la captura: los inicios de sesión se
+repiten con ``--credencial email:clave``. Los ids que generó el servidor
+original (sesiones, ventas, promociones...) se reemplazan por los que
+genera el servidor de la repetición; la petición que usa un id espera a
+la que lo creó. Las sesiones vienen como seudónimos (``session_<usuario>_p<n>``):
+una sesión creada antes de la captura se reemplaza por la del mismo usuario.
+"""
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import orjson
+
+CREDENCIALES = {
+    "admin@storevision.com": "admin123",
+    "cajero@storevision.com": "cajero123",
+}
+
+# Segmentos de ruta con ids generados: /api/ventas/{venta_id}/...
+RUTAS_CON_ID = (
+    (re.compile(r"^(/api/ventas/)(\d+)(/.*)?$"), "venta_id"),
+    (re.compile(r"^(/api/promociones/)(\d+)(/.*)?$"), "promocion_id"),
+)
+# Claves del cuerpo cuyo valor puede ser un id generado (o una lista de ellos)
+CLAVES_ID = {"venta_id": "venta_id", "venta_ids": "venta_id", "producto_id": "producto_id",
+             "promocion_id": "promocion_id", "turno_id": "turno_id"}
+SESION_ORIGINAL = re.compile(r"^session_(\d+)_")
+SEGMENTO_NUMERICO = re.compile(r"/\d+(?=/|$)")
+
+
+def leer_jsonl(ruta):
+    with open(ruta, "rb") as archivo:
+        lineas = [orjson.loads(linea) for linea in archivo if linea.strip()]
+    return lineas[0], lineas[1:]
+
+
+def grupo(registro):
+    return f"{registro['m']} {SEGMENTO_NUMERICO.sub('/{id}', registro['p'])}"
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def arrancar_servidor(arbol, directorio, base):
+    """Servidor uvicorn del árbol indicado sobre una base temporal nueva."""
+    ruta_db = os.path.join(directorio, "repeticion.db")
+    entorno = dict(os.environ, STOREVISION_DB=f"sqlite:///{ruta_db}", STOREVISION_MANTENIMIENTO="0",
+                   STOREVISION_CAPTURA="0")
+    if base:
+        shutil.copyfile(base, ruta_db)
+    else:
+        subprocess.run([sys.executable, "main.py", "sembrar"], cwd=arbol, env=entorno,
+                       stdout=subprocess.DEVNULL, check=True)
+    # Esquema al día (las migraciones son idempotentes) antes de medir
+    subprocess.run([sys.executable, "-c", "import main; main.crear_tablas()"], cwd=arbol, env=entorno,
+                   stdout=subprocess.DEVNULL, check=True)
+
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, "-c",
+         f"import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={puerto}, log_level='warning')"],
+        cwd=arbol, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    fin = time.perf_counter() + 60
+    while True:
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return proceso, url
+        except httpx.TransportError:
+            if proceso.poll() is not None or time.perf_counter() > fin:
+                proceso.kill()
+                raise RuntimeError(f"No arrancó el servidor en {arbol}")
+            time.sleep(0.05)
+
+
+class MapaIds:
+    """Ids del servidor original -> ids generados durante la repetición.
+
+    Antes de empezar se crea un futuro por cada id que aparece en las
+    respuestas capturadas; la petición que lo generó lo resuelve y las que lo
+    usan lo esperan. Los ids que no se generaron durante la captura (productos
+    existentes, por ejemplo) se envían tal cual.
+    """
+
+    def __init__(self, registros):
+        bucle = asyncio.get_running_loop()
+        self._futuros = {}
+        for registro in registros:
+            for clave, valor in registro.get("r", {}).items():
+                self._futuros[(clave, valor)] = bucle.create_future()
+
+    def conocido(self, clave, valor):
+        return (clave, valor) in self._futuros
+
+    async def nuevo(self, clave, valor):
+        futuro = self._futuros.get((clave, valor))
+        if futuro is None:
+            return valor
+        nuevo = await futuro
+        # Si la petición que lo generó falló se conserva el id original
+        return valor if nuevo is None else nuevo
+
+    def resolver(self, generados, respuesta):
+        for clave, valor in generados.items():
+            futuro = self._futuros.get((clave, valor))
+            if futuro is not None and not futuro.done():
+                futuro.set_result(respuesta.get(clave) if isinstance(respuesta, dict) else None)
+
+
+class Repeticion:
+    def __init__(self, cliente, registros, velocidad, concurrencia, credenciales):
+        self.cliente = cliente
+        self.registros = registros
+        self.velocidad = velocidad
+        self.semaforo = asyncio.Semaphore(concurrencia)
+        self.credenciales = credenciales
+        self.mapa = MapaIds(registros)
+        # Sesiones abiertas antes de la captura: una por usuario, al vuelo
+        self.sesiones_usuario = {}
+
+    async def iniciar_sesiones(self):
+        for email, clave in self.credenciales.items():
+            respuesta = await self.cliente.post("/api/login", json={"email": email, "password": clave})
+            if respuesta.status_code == 200:
+                datos = respuesta.json()
+                self.sesiones_usuario[datos["usuario"]["id"]] = datos["session_id"]
+
+    async def sesion(self, original):
+        if self.mapa.conocido("session_id", original):
+            return await self.mapa.nuevo("session_id", original)
+        coincidencia = SESION_ORIGINAL.match(original)
+        if coincidencia:
+            return self.sesiones_usuario.get(int(coincidencia.group(1)), original)
+        return original
+
+    async def cuerpo(self, valor):
+        if isinstance(valor, dict):
+            resultado = {}
+            for clave, contenido in valor.items():
+                familia = CLAVES_ID.get(clave)
+                if familia and isinstance(contenido, list):
+                    resultado[clave] = [await self.mapa.nuevo(familia, v) for v in contenido]
+                elif familia and isinstance(contenido, int):
+                    resultado[clave] = await self.mapa.nuevo(familia, contenido)
+                else:
+                    resultado[clave] = await self.cuerpo(contenido)
+            return resultado
+        if isinstance(valor, list):
+            return [await self.cuerpo(elemento) for elemento in valor]
+        return valor
+
+    async def ruta(self, ruta):
+        for patron, familia in RUTAS_CON_ID:
+            coincidencia = patron.match(ruta)
+            if coincidencia:
+                nuevo = await self.mapa.nuevo(familia, int(coincidencia.group(2)))
+                return f"{coincidencia.group(1)}{nuevo}{coincidencia.group(3) or ''}"
+        return ruta
+
+    async def preparar(self, registro):
+        cabeceras = {}
+        if "s" in registro:
+            cabeceras["session-id"] = await self.sesion(registro["s"])
+        if "e" in registro:
+            cabeceras["accept-encoding"] = registro["e"]
+        contenido = None
+        if "b" in registro:
+            cuerpo = await self.cuerpo(registro["b"])
+            if registro["p"] == "/api/login" and isinstance(cuerpo, dict):
+                cuerpo["password"] = self.credenciales.get(cuerpo.get("email"), "")
+            contenido = orjson.dumps(cuerpo)
+            cabeceras["content-type"] = "application/json"
+        elif "bx" in registro:
+            contenido = registro["bx"].encode()
+        # "bt": cuerpo no guardado (demasiado grande o sensible); se envía vacío
+        ruta = await self.ruta(registro["p"])
+        if "q" in registro:
+            ruta = f"{ruta}?{registro['q']}"
+        return ruta, cabeceras, contenido
+
+    async def una(self, indice, registro, origen):
+        programado = origen + (registro["t"] / self.velocidad if self.velocidad > 0 else 0)
+        await asyncio.sleep(max(0.0, programado - time.perf_counter()))
+        # Las dependencias se esperan antes de ocupar un lugar del semáforo
+        ruta, cabeceras, contenido = await self.preparar(registro)
+
+        async with self.semaforo:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await self.cliente.request(registro["m"], ruta, headers=cabeceras, content=contenido)
+                estado = respuesta.status_code
+                cuerpo = await respuesta.aread()
+            except httpx.HTTPError:
+                estado, cuerpo = 0, b""
+            duracion = time.perf_counter() - inicio
+
+        if "r" in registro:
+            try:
+                datos = orjson.loads(cuerpo) if estado == 200 else None
+            except orjson.JSONDecodeError:
+                datos = None
+            self.mapa.resolver(registro["r"], datos)
+
+        return {
+            "i": indice, "g": grupo(registro), "st": estado, "st0": registro["st"],
+            "ms": round(duracion * 1000, 3), "d0": registro["d"],
+            "retraso_ms": round(max(0.0, inicio - programado) * 1000, 3)
+        }
+
+    async def ejecutar(self):
+        await self.iniciar_sesiones()
+        origen = time.perf_counter() + 0.1
+        return await asyncio.gather(*(
+            self.una(indice, registro, origen) for indice, registro in enumerate(self.registros)
+        ))
+
+
+async def repetir_contra(url, registros, argumentos, credenciales):
+    limites = httpx.Limits(max_connections=argumentos.concurrencia, max_keepalive_connections=argumentos.concurrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as cliente:
+        repeticion = Repeticion(cliente, registros, argumentos.velocidad, argumentos.concurrencia, credenciales)
+        inicio = time.perf_counter()
+        resultados = await repeticion.ejecutar()
+        return resultados, time.perf_counter() - inicio
+
+
+def repetir(argumentos):
+    encabezado, registros = leer_jsonl(argumentos.captura)
+    if encabezado.get("formato") != 1:
+        sys.exit(f"Formato de captura no soportado: {encabezado.get('formato')}")
+
+    credenciales = dict(CREDENCIALES)
+    for credencial in argumentos.credencial:
+        email, _, clave = credencial.partition(":")
+        credenciales[email] = clave
+
+    proceso = None
+    directorio = tempfile.mkdtemp()
+    try:
+        if argumentos.url:
+            url = argumentos.url.rstrip("/")
+        else:
+            proceso, url = arrancar_servidor(os.path.abspath(argumentos.arbol), directorio, argumentos.base)
+        resultados, duracion = asyncio.run(repetir_contra(url, registros, argumentos, credenciales))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    with open(argumentos.salida, "wb") as salida:
+        salida.write(orjson.dumps({
+            "captura": os.path.abspath(argumentos.captura), "arbol": argumentos.arbol and os.path.abspath(argumentos.arbol),
+            "url": argumentos.url, "velocidad": argumentos.velocidad, "concurrencia": argumentos.concurrencia,
+            "duracion_segundos": round(duracion, 3)
+        }) + b"\n")
+        for resultado in resultados:
+            salida.write(orjson.dumps(resultado) + b"\n")
+
+    distintos = sum(1 for resultado in resultados if resultado["st"] != resultado["st0"])
+    latencias = [resultado["ms"] for resultado in resultados] or [0]
+    print(f"{len(resultados)} peticiones en {duracion:.2f} s; p50 {percentil(latencias, 0.5):.2f} ms, "
+          f"p99 {percentil(latencias, 0.99):.2f} ms; {distintos} con estado distinto al capturado")
+    print(f"Resultados en {argumentos.salida}")
+
+
+def resumir(resultados):
+    grupos = {}
+    for resultado in resultados:
+        grupos.setdefault(resultado["g"], []).append(resultado["ms"])
+    return {
+        nombre: (len(tiempos), percentil(tiempos, 0.5), percentil(tiempos, 0.95), percentil(tiempos, 0.99))
+        for nombre, tiempos in grupos.items()
+    }
+
+
+def comparar(argumentos):
+    encabezado_a, resultados_a = leer_jsonl(argumentos.a)
+    encabezado_b, resultados_b = leer_jsonl(argumentos.b)
+    if encabezado_a["captura"] != encabezado_b["captura"]:
+        print("Aviso: los resultados vienen de capturas distintas")
+
+    resumen_a, resumen_b = resumir(resultados_a), resumir(resultados_b)
+    print(f"A: {argumentos.a} ({encabezado_a['duracion_segundos']} s)")
+    print(f"B: {argumentos.b} ({encabezado_b['duracion_segundos']} s)")
+    print(f"{'grupo':<46} {'n':>6} {'p50 A':>8} {'p50 B':>8} {'p95 A':>8} {'p95 B':>8} "
+          f"{'p99 A':>8} {'p99 B':>8} {'Δp50':>8} {'B/A p95':>8}")
+    for nombre in sorted(set(resumen_a) | set(resumen_b), key=lambda g: -resumen_a.get(g, resumen_b.get(g))[0]):
+        n, p50_a, p95_a, p99_a = resumen_a.get(nombre, (0, 0, 0, 0))
+        n_b, p50_b, p95_b, p99_b = resumen_b.get(nombre, (0, 0, 0, 0))
+        razon = f"{p95_b / p95_a:8.2f}" if p95_a else f"{'-':>8}"
+        print(f"{nombre[:46]:<46} {max(n, n_b):>6} {p50_a:8.2f} {p50_b:8.2f} {p95_a:8.2f} {p95_b:8.2f} "
+              f"{p99_a:8.2f} {p99_b:8.2f} {p50_b - p50_a:+8.2f} {razon}")
+
+    total_a = [resultado["ms"] for resultado in resultados_a] or [0]
+    total_b = [resultado["ms"] for resultado in resultados_b] or [0]
+    print(f"{'total':<46} {len(total_a):>6} {percentil(total_a, 0.5):8.2f} {percentil(total_b, 0.5):8.2f} "
+          f"{percentil(total_a, 0.95):8.2f} {percentil(total_b, 0.95):8.2f} "
+          f"{percentil(total_a, 0.99):8.2f} {percentil(total_b, 0.99):8.2f} "
+          f"{statistics.median(total_b) - statistics.median(total_a):+8.2f}")
+
+    # La misma petición con distinto estado en A y B suele indicar un cambio de comportamiento
+    estados_b = {resultado["i"]: resultado for resultado in resultados_b}
+    distintos = [
+        (resultado, estados_b[resultado["i"]]) for resultado in resultados_a
+        if resultado["i"] in estados_b and estados_b[resultado["i"]]["st"] != resultado["st"]
+    ]
+    print(f"{len(distintos)} peticiones con estado distinto entre A y B")
+    for a, b in distintos[:argumentos.mostrar]:
+        print(f"  #{a['i']:<6} {a['g']:<46} A {a['st']}  B {b['st']}")
+
+
+def principal():
+    analizador = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subcomandos = analizador.add_subparsers(dest="comando", required=True)
+
+    sub = subcomandos.add_parser("repetir", help="repite una captura y guarda las latencias")
+    sub.add_argument("captura")
+    destino = sub.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--arbol", help="árbol del proyecto a arrancar con uvicorn")
+    destino.add_argument("--url", help="servidor ya en marcha")
+    sub.add_argument("--salida", required=True)
+    sub.add_argument("--velocidad", type=float, default=1.0,
+                     help="1 = ritmo original, 2 = el doble de rápido, 0 = sin esperas")
+    sub.add_argument("--concurrencia", type=int, default=32)
+    sub.add_argument("--base", help="base SQLite de partida (por defecto, datos de ejemplo)")
+    sub.add_argument("--credencial", action="append", default=[], metavar="EMAIL:CLAVE")
+    sub.set_defaults(funcion=repetir)
+
+    sub = subcomandos.add_parser("comparar", help="compara dos resultados por grupo de ruta")
+    sub.add_argument("a")
+    sub.add_argument("b")
+    sub.add_argument("--mostrar", type=int, default=20, help="peticiones con estado distinto a listar")
+    sub.set_defaults(funcion=comparar)
+
+    argumentos = analizador.parse_args()
+    argumentos.funcion(argumentos)
+
+
+if __name__ == "__main__":
+    principal()
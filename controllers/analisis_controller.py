@@ -0,0 +1,277 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, type_coerce, Integer
+from models.modelos import Producto, a_pesos
+from models import consultas
+from controllers.cache_reportes_controller import cache_reportes
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+CLASES_ABC = ('A', 'B', 'C')
+SIN_CATEGORIA = 'Sin categoría'
+
+# Vigencia de un análisis en caché: corta si el rango incluye el día en curso
+TTL_RANGO_VIVO = 60
+TTL_RANGO_CERRADO = 600
+MAX_ANALISIS = 32
+
+
+def clasificar_abc(ingresos: np.ndarray, umbral_a: float = 0.8, umbral_b: float = 0.95):
+    """Clase ABC (0=A, 1=B, 2=C) y participación acumulada de cada producto.
+
+    Los productos se ordenan por ingresos de mayor a menor; un producto es A
+    mientras la participación acumulada *antes* de él sea menor que
+    ``umbral_a`` (así el que cruza el umbral también es A), B hasta
+    ``umbral_b`` y C el resto. Los productos sin ingresos son siempre C.
+    """
+    orden = np.argsort(-ingresos, kind='stable')
+    ordenados = ingresos[orden]
+    total = ordenados.sum()
+
+    acumulado = np.cumsum(ordenados, dtype=np.float64)
+    if total > 0:
+        acumulado /= total
+        previo = acumulado - ordenados / total
+    else:
+        previo = np.ones_like(acumulado)
+
+    clase_ordenada = np.searchsorted(np.array([umbral_a, umbral_b]), previo, side='right')
+    clase_ordenada[ordenados <= 0] = 2
+
+    clase = np.empty_like(clase_ordenada)
+    clase[orden] = clase_ordenada
+    participacion_acumulada = np.empty_like(acumulado)
+    participacion_acumulada[orden] = acumulado
+    return clase, participacion_acumulada, orden
+
+
+def resumir_categorias(categorias: np.ndarray, clase: np.ndarray, ingresos: np.ndarray,
+                       unidades: np.ndarray, margen: np.ndarray):
+    """Totales por categoría y conteo de productos por clase, con ``bincount`` sobre índices."""
+    nombres, indice = np.unique(categorias, return_inverse=True)
+    cantidad = len(nombres)
+    return {
+        'nombres': nombres,
+        'ingresos': np.bincount(indice, weights=ingresos, minlength=cantidad),
+        'unidades': np.bincount(indice, weights=unidades, minlength=cantidad),
+        'margen': np.bincount(indice, weights=margen, minlength=cantidad),
+        'por_clase': np.bincount(indice * 3 + clase, minlength=cantidad * 3).reshape(cantidad, 3)
+    }
+
+
+def detectar_lentos(unidades: np.ndarray, stock: np.ndarray, activo: np.ndarray, dias: int,
+                    dias_cobertura: float = 90):
+    """Productos activos con stock cuya venta diaria del periodo no lo agota en ``dias_cobertura``.
+
+    Devuelve la máscara y los días de cobertura (``inf`` si no hubo ventas).
+    """
+    velocidad = unidades / max(dias, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cobertura = np.where(velocidad > 0, stock / velocidad, np.inf)
+    return activo & (stock > 0) & (cobertura > dias_cobertura), cobertura
+
+
+class AnalisisVentas:
+    """Arreglos por producto de un rango con su clasificación ya calculada."""
+
+    def __init__(self, productos: list, ventas: list, dias: int, umbral_a: float, umbral_b: float,
+                 dias_cobertura: float):
+        cantidad = len(productos)
+        # Filas (id, codigo, nombre, categoria, stock_actual, costo, activo) a columnas en una pasada
+        ids, self.codigos, self.nombres, categorias, stock, costo_unitario, activo = (
+            zip(*productos) if productos else ((),) * 7
+        )
+        self.ids = np.array(ids, dtype=np.int64)
+        self.categorias = np.array([categoria or SIN_CATEGORIA for categoria in categorias], dtype=object)
+        self.stock = np.array([valor or 0 for valor in stock], dtype=np.float64)
+        self.costo_unitario = np.array([valor or 0 for valor in costo_unitario], dtype=np.float64)
+        activo = np.array([valor is not False for valor in activo], dtype=bool)
+
+        # Ventas agregadas (centavos) alineadas con los productos por id
+        self.unidades = np.zeros(cantidad, dtype=np.float64)
+        self.ingresos = np.zeros(cantidad, dtype=np.float64)
+        self.costo = np.zeros(cantidad, dtype=np.float64)
+        if ventas:
+            producto_ids, unidades, ingresos, costo = (np.asarray(columna, dtype=np.float64) for columna in zip(*ventas))
+            filas = np.searchsorted(self.ids, producto_ids.astype(np.int64))
+            validas = (filas < cantidad)
+            validas[validas] &= self.ids[filas[validas]] == producto_ids[validas]
+            self.unidades[filas[validas]] = unidades[validas]
+            self.ingresos[filas[validas]] = np.nan_to_num(ingresos[validas])
+            self.costo[filas[validas]] = np.nan_to_num(costo[validas])
+        self.margen = self.ingresos - self.costo
+
+        self.clase, self.participacion_acumulada, self.orden = clasificar_abc(self.ingresos, umbral_a, umbral_b)
+        self.categorias_resumen = resumir_categorias(
+            self.categorias, self.clase, self.ingresos, self.unidades, self.margen
+        )
+        self.lento, self.cobertura = detectar_lentos(self.unidades, self.stock, activo, dias, dias_cobertura)
+
+    def producto(self, i: int):
+        cobertura = self.cobertura[i]
+        return {
+            'producto_id': int(self.ids[i]),
+            'codigo': self.codigos[i],
+            'nombre': self.nombres[i],
+            'categoria': self.categorias[i],
+            'clase': CLASES_ABC[self.clase[i]],
+            'unidades': int(self.unidades[i]),
+            'ingresos': a_pesos(int(self.ingresos[i])),
+            'margen': a_pesos(int(self.margen[i])),
+            'participacion_acumulada': round(float(self.participacion_acumulada[i]) * 100, 2),
+            'stock_actual': int(self.stock[i]),
+            'dias_cobertura': None if np.isinf(cobertura) else round(float(cobertura), 1)
+        }
+
+    def resultado(self, limite: int = 200, clase: str = None):
+        total_ingresos = float(self.ingresos.sum())
+        total_margen = float(self.margen.sum())
+
+        resumen_abc = {}
+        for numero, nombre in enumerate(CLASES_ABC):
+            mascara = self.clase == numero
+            ingresos = float(self.ingresos[mascara].sum())
+            resumen_abc[nombre] = {
+                'productos': int(mascara.sum()),
+                'ingresos': a_pesos(int(ingresos)),
+                'participacion': round(ingresos / total_ingresos * 100, 2) if total_ingresos else 0
+            }
+
+        categorias = self.categorias_resumen
+        orden_categorias = np.argsort(-categorias['ingresos'], kind='stable')
+        resumen_categorias = []
+        for i in orden_categorias:
+            ingresos = float(categorias['ingresos'][i])
+            margen = float(categorias['margen'][i])
+            resumen_categorias.append({
+                'categoria': categorias['nombres'][i],
+                'ingresos': a_pesos(int(ingresos)),
+                'unidades': int(categorias['unidades'][i]),
+                'margen': a_pesos(int(margen)),
+                'participacion': round(ingresos / total_ingresos * 100, 2) if total_ingresos else 0,
+                'margen_porcentaje': round(margen / ingresos * 100, 2) if ingresos else 0,
+                'productos': {nombre: int(categorias['por_clase'][i][numero]) for numero, nombre in enumerate(CLASES_ABC)}
+            })
+
+        # Productos de mayor a menor ingreso, opcionalmente de una sola clase
+        orden = self.orden
+        if clase in CLASES_ABC:
+            orden = orden[self.clase[orden] == CLASES_ABC.index(clase)]
+
+        # Lentos: primero los que más capital inmovilizan (stock x costo)
+        indices_lentos = np.flatnonzero(self.lento)
+        valor_inmovilizado = self.stock[indices_lentos] * self.costo_unitario[indices_lentos]
+        indices_lentos = indices_lentos[np.argsort(-valor_inmovilizado, kind='stable')]
+        lentos = []
+        for i in indices_lentos[:limite]:
+            detalle = self.producto(i)
+            detalle['valor_inmovilizado'] = a_pesos(int(self.stock[i] * self.costo_unitario[i]))
+            lentos.append(detalle)
+
+        return {
+            'total_ingresos': a_pesos(int(total_ingresos)),
+            'total_margen': a_pesos(int(total_margen)),
+            'productos_analizados': len(self.ids),
+            'resumen_abc': resumen_abc,
+            'categorias': resumen_categorias,
+            'productos': [self.producto(i) for i in orden[:limite]],
+            'productos_lentos': {'cantidad': len(indices_lentos), 'detalle': lentos}
+        }
+
+
+class CacheAnalisis:
+    """Análisis ya calculados por rango y parámetros, en orden LRU.
+
+    Cada entrada guarda la versión de ``cache_reportes`` con que se calculó
+    (una anulación la invalida) y vence antes si el rango incluye el día en
+    curso, que sigue recibiendo ventas.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ANALISIS):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+
+    def obtener(self, clave: tuple):
+        with self._lock:
+            guardado = self._entradas.get(clave)
+            if guardado is None:
+                return None
+            version, vence, analisis = guardado
+            if version != cache_reportes.version or vence <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return analisis
+
+    def guardar(self, clave: tuple, version: int, vivo: bool, analisis: 'AnalisisVentas'):
+        vence = time.monotonic() + (TTL_RANGO_VIVO if vivo else TTL_RANGO_CERRADO)
+        with self._lock:
+            self._entradas[clave] = (version, vence, analisis)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+class ControladorAnalisis:
+    """Análisis ABC, aporte por categoría y productos lentos de un rango de fechas.
+
+    Los agregados por producto salen de una sola consulta agrupada y los
+    cálculos son operaciones vectorizadas de NumPy sobre todo el catálogo.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _calcular(self, fecha_inicio: datetime, fecha_fin: datetime, umbral_a: float, umbral_b: float,
+                  dias_cobertura: float):
+        # Costo en centavos: el valor inmovilizado se calcula como los ingresos
+        productos = self.db.execute(
+            select(
+                Producto.id, Producto.codigo, Producto.nombre, Producto.categoria, Producto.stock_actual,
+                type_coerce(Producto.costo, Integer).label('costo'), Producto.activo
+            ).order_by(Producto.id)
+        ).all()
+        ventas = self.db.execute(consultas.TOTALES_ITEMS, {
+            "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin
+        }).all()
+        dias = (fecha_fin.date() - fecha_inicio.date()).days + 1
+        return AnalisisVentas(productos, ventas, dias, umbral_a, umbral_b, dias_cobertura)
+
+    def analizar(self, fecha_inicio: datetime, fecha_fin: datetime, umbral_a: float = 0.8, umbral_b: float = 0.95,
+                 dias_cobertura: float = 90, limite: int = 200, clase: str = None):
+        try:
+            if not 0 < umbral_a < umbral_b <= 1:
+                return {"error": "Los umbrales deben cumplir 0 < umbral_a < umbral_b <= 1"}
+            if fecha_fin < fecha_inicio:
+                return {"error": "La fecha final es anterior a la inicial"}
+            if clase is not None and clase not in CLASES_ABC:
+                return {"error": "La clase debe ser A, B o C"}
+
+            clave = (fecha_inicio, fecha_fin, umbral_a, umbral_b, dias_cobertura)
+            analisis = cache_analisis.obtener(clave)
+            if analisis is None:
+                # Versión leída antes de consultar: una anulación durante el cálculo lo invalida
+                version = cache_reportes.version
+                analisis = self._calcular(fecha_inicio, fecha_fin, umbral_a, umbral_b, dias_cobertura)
+                fin_local = fecha_fin.astimezone(ZONA_HORARIA).replace(tzinfo=None) if fecha_fin.tzinfo else fecha_fin
+                cache_analisis.guardar(clave, version, fin_local.date() >= datetime.now(ZONA_HORARIA).date(), analisis)
+
+            resultado = analisis.resultado(limite, clase)
+            resultado['periodo'] = {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin}
+            resultado['umbrales'] = {'umbral_a': umbral_a, 'umbral_b': umbral_b, 'dias_cobertura': dias_cobertura}
+            return resultado
+
+        except Exception as e:
+            logger.error("Error en análisis de ventas: %s", e)
+            return {"error": f"Error en análisis de ventas: {str(e)}"}
+
+
+# Instancia compartida por la aplicación (una por proceso)
+cache_analisis = CacheAnalisis()
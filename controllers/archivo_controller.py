@@ -0,0 +1,226 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from models.modelos import MovimientoInventario, RegistroAuditoria, Producto, Usuario
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import glob
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Directorio de los archivos históricos (un archivo .jsonl.gz por mes y ejecución)
+DIRECTORIO_ARCHIVO = os.environ.get("STOREVISION_ARCHIVO", "archivo")
+DIAS_RETENCION = 365
+
+# Movimiento sintético que conserva el stock de apertura de cada producto
+TIPO_SALDO_INICIAL = "saldo_inicial"
+
+
+class ControladorArchivo:
+    def __init__(self, db: Session, directorio: str = None):
+        self.db = db
+        self.directorio = directorio or DIRECTORIO_ARCHIVO
+
+    def _ruta(self, prefijo: str, mes: str, sello: str):
+        return os.path.join(self.directorio, f"{prefijo}_{mes}.{sello}.jsonl.gz")
+
+    def _escribir_por_mes(self, prefijo: str, filas, campo_fecha: str, sello: str, al_escribir=None):
+        """Escribe las filas en archivos comprimidos particionados por mes."""
+        abiertos = {}
+        rutas = []
+        try:
+            for fila in filas:
+                registro = dict(fila._mapping)
+                if al_escribir and al_escribir(registro) is False:
+                    continue
+                fecha = registro[campo_fecha]
+                mes = fecha.strftime("%Y-%m")
+                archivo = abiertos.get(mes)
+                if archivo is None:
+                    ruta = self._ruta(prefijo, mes, sello)
+                    archivo = gzip.open(ruta, "wt", encoding="utf-8")
+                    abiertos[mes] = archivo
+                    rutas.append(ruta)
+                registro[campo_fecha] = fecha.isoformat()
+                archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        finally:
+            for archivo in abiertos.values():
+                archivo.close()
+        return rutas
+
+    def archivar(self, dias_retencion: int = DIAS_RETENCION, usuario_id: int = None):
+        """Mueve al archivo los movimientos y registros de auditoría anteriores al horizonte.
+
+        Por cada producto con movimientos archivados se deja un movimiento
+        ``saldo_inicial`` con el stock al cierre de lo archivado, de modo que
+        la tabla activa sigue explicando el stock actual.
+        """
+        rutas = []
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            fecha_corte = datetime.now(timezone(timedelta(hours=-5))) - timedelta(days=dias_retencion)
+            sello = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+            # Movimientos de inventario con nombres desnormalizados
+            consulta_movimientos = (
+                select(
+                    MovimientoInventario.id,
+                    MovimientoInventario.producto_id,
+                    Producto.nombre.label("producto_nombre"),
+                    MovimientoInventario.tipo_movimiento,
+                    MovimientoInventario.cantidad,
+                    MovimientoInventario.stock_anterior,
+                    MovimientoInventario.stock_nuevo,
+                    MovimientoInventario.motivo,
+                    MovimientoInventario.usuario_id,
+                    Usuario.nombre.label("usuario_nombre"),
+                    MovimientoInventario.fecha_movimiento
+                )
+                # outerjoin: el borrado alcanza todo movimiento anterior al corte, también
+                # los de productos o usuarios ya inexistentes (SQLite no exige las FK)
+                .outerjoin(Producto, MovimientoInventario.producto_id == Producto.id)
+                .outerjoin(Usuario, MovimientoInventario.usuario_id == Usuario.id)
+                .where(MovimientoInventario.fecha_movimiento < fecha_corte)
+                .order_by(MovimientoInventario.fecha_movimiento, MovimientoInventario.id)
+            )
+
+            saldos = {}
+            ultimo_movimiento = {"id": 0}
+
+            def registrar_saldo(registro):
+                saldos[registro["producto_id"]] = (
+                    registro["stock_nuevo"], registro["fecha_movimiento"], registro["usuario_id"]
+                )
+                ultimo_movimiento["id"] = max(ultimo_movimiento["id"], registro["id"])
+                # Los saldos de archivados anteriores se recalculan, no se vuelven a archivar
+                return registro["tipo_movimiento"] != TIPO_SALDO_INICIAL
+
+            filas = self.db.execute(consulta_movimientos.execution_options(yield_per=1000))
+            rutas += self._escribir_por_mes(
+                "movimientos", filas, "fecha_movimiento", sello, registrar_saldo
+            )
+
+            # Registros de auditoría
+            consulta_auditoria = (
+                select(
+                    RegistroAuditoria.id,
+                    RegistroAuditoria.usuario_id,
+                    Usuario.nombre.label("usuario_nombre"),
+                    RegistroAuditoria.tipo_accion,
+                    RegistroAuditoria.descripcion,
+                    RegistroAuditoria.fecha_accion,
+                    RegistroAuditoria.ip_address
+                )
+                .outerjoin(Usuario, RegistroAuditoria.usuario_id == Usuario.id)
+                .where(RegistroAuditoria.fecha_accion < fecha_corte)
+                .order_by(RegistroAuditoria.fecha_accion, RegistroAuditoria.id)
+            )
+
+            ultimo_registro = {"id": 0, "total": 0}
+
+            def contar_registro(registro):
+                ultimo_registro["id"] = max(ultimo_registro["id"], registro["id"])
+                ultimo_registro["total"] += 1
+
+            filas = self.db.execute(consulta_auditoria.execution_options(yield_per=1000))
+            rutas += self._escribir_por_mes("auditoria", filas, "fecha_accion", sello, contar_registro)
+
+            # Borrar lo archivado (acotado al último id leído) y dejar los saldos de apertura
+            self.db.execute(
+                delete(MovimientoInventario).where(
+                    MovimientoInventario.fecha_movimiento < fecha_corte,
+                    MovimientoInventario.id <= ultimo_movimiento["id"]
+                )
+            )
+            self.db.execute(
+                delete(RegistroAuditoria).where(
+                    RegistroAuditoria.fecha_accion < fecha_corte,
+                    RegistroAuditoria.id <= ultimo_registro["id"]
+                )
+            )
+
+            for producto_id, (stock, fecha, ultimo_usuario_id) in saldos.items():
+                self.db.add(MovimientoInventario(
+                    producto_id=producto_id,
+                    tipo_movimiento=TIPO_SALDO_INICIAL,
+                    cantidad=stock,
+                    stock_anterior=0,
+                    stock_nuevo=stock,
+                    motivo="Saldo de apertura (archivo histórico)",
+                    usuario_id=usuario_id or ultimo_usuario_id,
+                    fecha_movimiento=fecha
+                ))
+
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="archivo_historico",
+                descripcion=(
+                    f"Archivados registros anteriores a {fecha_corte.date()}: "
+                    f"{len(saldos)} productos con saldo de apertura, "
+                    f"{ultimo_registro['total']} registros de auditoría"
+                ),
+                fecha_accion=datetime.now(timezone(timedelta(hours=-5)))
+            ))
+
+            self.db.commit()
+
+            logger.info("Archivo histórico generado en %d archivos", len(rutas))
+            return {
+                "mensaje": "Archivo histórico generado exitosamente",
+                "fecha_corte": fecha_corte,
+                "productos_con_saldo": len(saldos),
+                "registros_auditoria": ultimo_registro["total"],
+                "archivos": [os.path.basename(ruta) for ruta in rutas]
+            }
+
+        except Exception as e:
+            self.db.rollback()
+            # Sin commit los archivos escritos en esta ejecución sobrarían
+            for ruta in rutas:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            logger.error("Error archivando históricos: %s", e)
+            return {"error": f"Error archivando históricos: {str(e)}"}
+
+    def _leer(self, prefijo: str, campo_fecha: str, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+        """Recorre los registros archivados, saltando los meses fuera del rango."""
+        mes_inicio = fecha_inicio.strftime("%Y-%m") if fecha_inicio else None
+        mes_fin = fecha_fin.strftime("%Y-%m") if fecha_fin else None
+        if fecha_inicio and fecha_inicio.tzinfo is not None:
+            fecha_inicio = fecha_inicio.replace(tzinfo=None)
+        if fecha_fin and fecha_fin.tzinfo is not None:
+            fecha_fin = fecha_fin.replace(tzinfo=None)
+
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, f"{prefijo}_*.jsonl.gz"))):
+            mes = os.path.basename(ruta)[len(prefijo) + 1:len(prefijo) + 8]
+            if (mes_inicio and mes < mes_inicio) or (mes_fin and mes > mes_fin):
+                continue
+            with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+                for linea in archivo:
+                    registro = json.loads(linea)
+                    fecha = datetime.fromisoformat(registro[campo_fecha])
+                    if fecha.tzinfo is not None:
+                        fecha = fecha.replace(tzinfo=None)
+                    if (fecha_inicio and fecha < fecha_inicio) or (fecha_fin and fecha > fecha_fin):
+                        continue
+                    registro[campo_fecha] = fecha
+                    yield registro
+
+    def leer_movimientos_archivados(self, producto_id: int = None, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+        # Objetos con la misma forma que MovimientoInventario para reutilizar las vistas
+        movimientos = []
+        for registro in self._leer("movimientos", "fecha_movimiento", fecha_inicio, fecha_fin):
+            if producto_id and registro["producto_id"] != producto_id:
+                continue
+            movimientos.append(SimpleNamespace(
+                producto=SimpleNamespace(id=registro["producto_id"], nombre=registro.pop("producto_nombre")),
+                usuario=SimpleNamespace(id=registro["usuario_id"], nombre=registro.pop("usuario_nombre")),
+                **registro
+            ))
+        return movimientos
+
+    def leer_auditoria_archivada(self, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+        return list(self._leer("auditoria", "fecha_accion", fecha_inicio, fecha_fin))
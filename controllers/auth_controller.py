@@ -1,37 +1,43 @@
 from sqlalchemy.orm import Session
 from models.modelos import Usuario, RegistroAuditoria
-from passlib.context import CryptContext
+from models import consultas
+from controllers.limitador_controller import limitador_login
 from datetime import datetime, timezone, timedelta
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+
+def contexto_password():
+    # passlib y bcrypt se importan con el primer login, no al arrancar
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 class ControladorAutenticacion:
     def __init__(self, db: Session):
         self.db = db
     
     def verificar_password(self, password_plano: str, password_hashed: str):
-        return pwd_context.verify(password_plano, password_hashed)
+        return contexto_password().verify(password_plano, password_hashed)
     
     def obtener_hash_password(self, password: str):
-        return pwd_context.hash(password)
+        return contexto_password().hash(password)
     
     def autenticar_usuario(self, email: str, password: str, ip_address: str = None):
         try:
-            usuario = self.db.query(Usuario).filter(Usuario.email == email).first()
+            usuario = self.db.execute(consultas.USUARIO_POR_EMAIL, {"email": email}).scalar()
             if not usuario or not self.verificar_password(password, usuario.hashed_password):
-                auditoria = RegistroAuditoria(
-                    tipo_accion="login_fallido",
-                    descripcion=f"Intento de login fallido para email: {email}",
-                    fecha_accion=datetime.now(timezone(timedelta(hours=-5))),
-                    ip_address=ip_address
-                )
-                self.db.add(auditoria)
-                self.db.commit()
+                # Sin escritura por intento: el limitador acumula y audita un resumen periódico
+                limitador_login.registrar_fallo(email, ip_address)
                 return None
             
             if not usuario.activo:
                 return None
             
+            limitador_login.registrar_exito(email, ip_address)
+            
             auditoria = RegistroAuditoria(
                 usuario_id=usuario.id,
                 tipo_accion="login_exitoso",
@@ -0,0 +1,184 @@
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import orjson
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+# STOREVISION_LOG_NIVEL: nivel general; STOREVISION_LOG_NIVELES: por módulo,
+# por ejemplo "controllers.ventas_controller=WARNING,sqlalchemy.engine=INFO"
+NIVEL_GENERAL = os.environ.get("STOREVISION_LOG_NIVEL", "INFO")
+NIVELES_MODULO = os.environ.get("STOREVISION_LOG_NIVELES", "")
+# La línea por petición de MiddlewareBitacora repite el registro de acceso de
+# uvicorn: apagada salvo que STOREVISION_LOG_NIVELES pida peticiones=INFO
+NIVELES_POR_DEFECTO = {"peticiones": "WARNING"}
+# json (por defecto) o texto para leerlo en consola
+FORMATO = os.environ.get("STOREVISION_LOG_FORMATO", "json")
+# Sin archivo se escribe en stderr
+ARCHIVO = os.environ.get("STOREVISION_LOG_ARCHIVO")
+
+# Id de la petición HTTP en curso; lo fija MiddlewareBitacora y lo heredan
+# los hilos de run_in_threadpool
+peticion_actual = ContextVar("peticion_actual", default=None)
+
+# Atributos propios de LogRecord; el resto viene de extra={...}
+_ATRIBUTOS_REGISTRO = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "peticion_id"}
+
+_contador_peticiones = itertools.count(1)
+
+
+def nuevo_id_peticion():
+    """Id corto y único por proceso: pid y contador en hexadecimal."""
+    return f"{os.getpid():x}-{next(_contador_peticiones):x}"
+
+
+def parsear_niveles(texto: str):
+    """``"modulo=NIVEL,otro=NIVEL"`` -> ``{"modulo": "NIVEL", ...}``."""
+    niveles = {}
+    for par in texto.split(","):
+        modulo, _, nivel = par.partition("=")
+        if modulo.strip() and nivel.strip():
+            niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro: instante, nivel, módulo, mensaje, petición y extras."""
+
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, ZONA_HORARIA).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "mensaje": record.getMessage(),
+        }
+        peticion_id = getattr(record, "peticion_id", None)
+        if peticion_id is not None:
+            datos["peticion_id"] = peticion_id
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_REGISTRO:
+                datos[clave] = valor
+        if record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return orjson.dumps(datos, default=str).decode()
+
+
+class FormateadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(peticion_id)s] %(message)s")
+
+    def format(self, record):
+        if getattr(record, "peticion_id", None) is None:
+            record.peticion_id = "-"
+        return super().format(record)
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """Encola el registro sin formatearlo; el hilo de la bitácora hace el resto.
+
+    ``QueueHandler.prepare`` une mensaje y argumentos en el hilo que registra
+    (pensado para enviar registros entre procesos). Aquí solo se anota el id
+    de la petición y, si hay excepción, su traza, que no debe sobrevivir al
+    bloque ``except``; el ``%`` y el JSON se hacen en el hilo de escritura.
+    Los argumentos se formatean un poco después: no deben mutarse tras
+    registrarlos (en este código son ids, conteos y textos).
+    """
+
+    def prepare(self, record):
+        record.peticion_id = peticion_actual.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class Bitacora:
+    """Registro de la aplicación con cola y un hilo de escritura.
+
+    Los módulos siguen usando ``logging.getLogger(__name__)``; ``configurar``
+    deja en la raíz un solo ``ManejadorCola`` y un ``QueueListener`` que
+    escribe en stderr o en ``STOREVISION_LOG_ARCHIVO``. Así ninguna petición
+    espera a la consola ni al disco.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._oyente = None
+        self._manejador = None
+        self.niveles = {}
+
+    @property
+    def activa(self):
+        return self._oyente is not None
+
+    def configurar(self, nivel: str = NIVEL_GENERAL, niveles: dict = None, formato: str = FORMATO,
+                   archivo: str = ARCHIVO):
+        with self._lock:
+            if self._oyente is not None:
+                return
+            if archivo:
+                destino = logging.FileHandler(archivo, encoding="utf-8")
+            else:
+                destino = logging.StreamHandler(sys.stderr)
+            destino.setFormatter(FormateadorTexto() if formato == "texto" else FormateadorJSON())
+
+            cola = queue.SimpleQueue()
+            self._manejador = ManejadorCola(cola)
+            self._oyente = logging.handlers.QueueListener(cola, destino, respect_handler_level=False)
+
+            # Ningún formato usa hilo ni proceso: cada LogRecord se crea más barato
+            logging.logThreads = False
+            logging.logProcesses = False
+            logging.logMultiprocessing = False
+
+            raiz = logging.getLogger()
+            raiz.addHandler(self._manejador)
+            raiz.setLevel(nivel.upper())
+            self._oyente.start()
+
+        niveles = {**NIVELES_POR_DEFECTO, **(parsear_niveles(NIVELES_MODULO) if niveles is None else niveles)}
+        for modulo, nivel_modulo in niveles.items():
+            self.fijar_nivel(modulo, nivel_modulo)
+
+    def fijar_nivel(self, modulo: str, nivel: str):
+        """Nivel de un módulo (y sus submódulos); ``"NOTSET"`` vuelve al general."""
+        nivel = nivel.upper()
+        if not modulo:
+            return {"error": "Indique el módulo"}
+        if nivel not in logging.getLevelNamesMapping():
+            return {"error": f"Nivel no válido: {nivel}"}
+        logging.getLogger(modulo).setLevel(nivel)
+        if nivel == "NOTSET":
+            self.niveles.pop(modulo, None)
+        else:
+            self.niveles[modulo] = nivel
+        return self.estado()
+
+    def estado(self):
+        return {
+            "activa": self.activa,
+            "nivel": logging.getLevelName(logging.getLogger().level),
+            "niveles": dict(self.niveles)
+        }
+
+    def detener(self):
+        """Vacía la cola y quita el manejador (al cerrar la aplicación)."""
+        with self._lock:
+            if self._oyente is None:
+                return
+            logging.getLogger().removeHandler(self._manejador)
+            self._oyente.stop()
+            for destino in self._oyente.handlers:
+                destino.close()
+            self._oyente = None
+            self._manejador = None
+
+
+# Instancia compartida por la aplicación (una por proceso)
+bitacora = Bitacora()
@@ -0,0 +1,198 @@
+from sqlalchemy.orm import Session
+from models.modelos import Producto
+from bisect import bisect_left
+from collections import Counter
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Fracción mínima de trigramas del término presentes en el nombre
+UMBRAL_SIMILITUD = 0.5
+
+
+def normalizar(texto: str):
+    """Minúsculas y sin tildes: 'Fríol' -> 'friol'."""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str):
+    return "".join(c if c.isalnum() else " " for c in normalizar(texto)).split()
+
+
+def trigramas(texto: str):
+    resultado = set()
+    for palabra in tokenizar(texto):
+        palabra = f"  {palabra} "
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+
+class IndiceProductos:
+    """Índice en memoria para la búsqueda de productos en caja.
+
+    - Código de barras exacto: diccionario, O(1).
+    - Prefijo por palabra del nombre: lista ordenada de (palabra, id) con bisect.
+    - Aproximada: índice invertido de trigramas; se exige que el nombre contenga
+      buena parte de los trigramas del término y se desempata por Jaccard.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limpiar()
+
+    def _limpiar(self):
+        self._por_codigo = {}
+        self._nombres = {}
+        self._palabras = []
+        self._trigramas = {}
+        self._trigramas_producto = {}
+
+    def _agregar(self, producto_id: int, codigo: str, nombre: str):
+        if codigo:
+            self._por_codigo[codigo.strip().upper()] = producto_id
+        self._nombres[producto_id] = nombre
+        for palabra in set(tokenizar(nombre)):
+            self._palabras.append((palabra, producto_id))
+        tris = trigramas(nombre)
+        self._trigramas_producto[producto_id] = tris
+        for tri in tris:
+            self._trigramas.setdefault(tri, set()).add(producto_id)
+
+    def _quitar(self, producto_id: int):
+        self._por_codigo = {c: i for c, i in self._por_codigo.items() if i != producto_id}
+        self._palabras = [par for par in self._palabras if par[1] != producto_id]
+        for tri in self._trigramas_producto.pop(producto_id, ()):
+            ids = self._trigramas.get(tri)
+            if ids:
+                ids.discard(producto_id)
+        self._nombres.pop(producto_id, None)
+
+    def reconstruir(self, db: Session):
+        try:
+            productos = db.query(Producto.id, Producto.codigo, Producto.nombre).filter(
+                Producto.activo == True
+            ).all()
+            with self._lock:
+                self._limpiar()
+                for p in productos:
+                    self._agregar(p.id, p.codigo, p.nombre)
+                self._palabras.sort()
+            logger.info("Índice de productos reconstruido con %d productos", len(productos))
+            return True
+        except Exception as e:
+            logger.error("Error reconstruyendo índice de productos: %s", e)
+            return False
+
+    def actualizar(self, producto):
+        """Agrega o reemplaza un producto (llamar tras crearlo o editarlo)."""
+        with self._lock:
+            self._quitar(producto.id)
+            if producto.activo is not False:
+                self._agregar(producto.id, producto.codigo, producto.nombre)
+            self._palabras.sort()
+
+    def _por_prefijo(self, palabras: list):
+        encontrados = None
+        for palabra in palabras:
+            ids = set()
+            i = bisect_left(self._palabras, (palabra,))
+            while i < len(self._palabras) and self._palabras[i][0].startswith(palabra):
+                ids.add(self._palabras[i][1])
+                i += 1
+            encontrados = ids if encontrados is None else encontrados & ids
+            if not encontrados:
+                return set()
+        return encontrados or set()
+
+    def _aproximados(self, termino: str, excluir: set, limite: int):
+        tris = trigramas(termino)
+        if not tris:
+            return []
+        comunes = Counter()
+        for tri in tris:
+            comunes.update(self._trigramas.get(tri, ()))
+        puntuados = []
+        for producto_id, compartidos in comunes.items():
+            if producto_id in excluir:
+                continue
+            cobertura = compartidos / len(tris)
+            if cobertura < UMBRAL_SIMILITUD:
+                continue
+            jaccard = compartidos / (len(tris) + len(self._trigramas_producto[producto_id]) - compartidos)
+            puntuados.append((cobertura, jaccard, producto_id))
+        puntuados.sort(reverse=True)
+        return [producto_id for _, _, producto_id in puntuados[:limite]]
+
+    def buscar(self, termino: str, limite: int = 10):
+        """Devuelve [(producto_id, tipo_coincidencia)] ordenados por relevancia."""
+        termino = (termino or "").strip()
+        if not termino:
+            return []
+
+        with self._lock:
+            resultado = []
+            codigo = self._por_codigo.get(termino.upper())
+            if codigo is not None:
+                resultado.append((codigo, 'codigo'))
+
+            vistos = {producto_id for producto_id, _ in resultado}
+            prefijo = self._por_prefijo(tokenizar(termino)) - vistos
+            for producto_id in sorted(prefijo, key=lambda i: normalizar(self._nombres[i])):
+                resultado.append((producto_id, 'prefijo'))
+            vistos.update(prefijo)
+
+            if len(resultado) < limite:
+                for producto_id in self._aproximados(termino, vistos, limite - len(resultado)):
+                    resultado.append((producto_id, 'aproximada'))
+
+            return resultado[:limite]
+
+
+# Instancia compartida por la aplicación (una por proceso)
+indice_productos = IndiceProductos()
+
+
+class ControladorBusqueda:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def buscar_productos(self, termino: str, limite: int = 10):
+        try:
+            coincidencias = indice_productos.buscar(termino, limite)
+            if not coincidencias:
+                return []
+
+            # Precio y stock se leen de la base para no servir datos desactualizados
+            ids = [producto_id for producto_id, _ in coincidencias]
+            productos = {
+                p.id: p for p in self.db.query(
+                    Producto.id, Producto.codigo, Producto.nombre, Producto.categoria,
+                    Producto.precio_venta, Producto.stock_actual
+                ).filter(Producto.id.in_(ids), Producto.activo == True)
+            }
+
+            resultado = []
+            for producto_id, tipo in coincidencias:
+                p = productos.get(producto_id)
+                if p is None:
+                    continue
+                resultado.append({
+                    "id": p.id,
+                    "nombre": p.nombre,
+                    "precio_venta": p.precio_venta,
+                    "stock_actual": p.stock_actual,
+                    "categoria": p.categoria,
+                    "codigo": p.codigo,
+                    "coincidencia": tipo
+                })
+            
+            return resultado
+
+        except Exception as e:
+            logger.error("Error buscando productos: %s", e)
+            return {"error": f"Error buscando productos: {str(e)}"}
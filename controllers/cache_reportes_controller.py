@@ -0,0 +1,188 @@
+from sqlalchemy.orm import Session
+from models.modelos import a_pesos
+from models import consultas
+from collections import OrderedDict
+from datetime import datetime, date, time, timedelta, timezone
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+
+def _a_hora_local(fecha: datetime):
+    # Las fechas se guardan en hora local (-05:00) sin zona horaria
+    if fecha.tzinfo is not None:
+        return fecha.astimezone(ZONA_HORARIA).replace(tzinfo=None)
+    return fecha
+
+
+class ParcialVentas:
+    """Agregados de ventas completadas de un día (o de un tramo de día).
+
+    Los montos se acumulan en centavos enteros; ``total_ventas`` y
+    ``costo_total`` los devuelven en pesos.
+    """
+
+    __slots__ = ('total_centavos', 'cantidad_ventas', 'productos')
+
+    def __init__(self):
+        self.total_centavos = 0
+        self.cantidad_ventas = 0
+        # producto_id -> [unidades, ingresos, costo] (montos en centavos)
+        self.productos = {}
+
+    def sumar(self, otro: 'ParcialVentas'):
+        self.total_centavos += otro.total_centavos
+        self.cantidad_ventas += otro.cantidad_ventas
+        for producto_id, (unidades, ingresos, costo) in otro.productos.items():
+            acumulado = self.productos.get(producto_id)
+            if acumulado is None:
+                self.productos[producto_id] = [unidades, ingresos, costo]
+            else:
+                acumulado[0] += unidades
+                acumulado[1] += ingresos
+                acumulado[2] += costo
+
+    @property
+    def total_ventas(self):
+        return a_pesos(self.total_centavos)
+
+    @property
+    def costo_total(self):
+        return a_pesos(sum(costo for _, _, costo in self.productos.values()))
+
+
+class CacheReportes:
+    """Memoización por día de los agregados de ventas.
+
+    Un rango se divide en días cerrados completos (se calculan una vez con una
+    consulta agrupada por día y se guardan) y tramos vivos: el día actual y
+    los extremos que no cubren un día completo. Los días cerrados solo cambian
+    al anular una venta, por eso ``anular_venta`` invalida el día de la venta.
+    """
+
+    def __init__(self, max_dias: int = 400):
+        self.max_dias = max_dias
+        self._lock = threading.Lock()
+        self._dias = OrderedDict()
+        # Cambia con cada invalidación para no guardar cálculos que se cruzaron con una
+        self._version = 0
+
+    def invalidar_dia(self, fecha):
+        dia = _a_hora_local(fecha).date() if isinstance(fecha, datetime) else fecha
+        with self._lock:
+            self._dias.pop(dia, None)
+            self._version += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._dias.clear()
+            self._version += 1
+
+    @property
+    def version(self):
+        """Cambia con cada invalidación: los cálculos derivados la usan para caducar."""
+        return self._version
+
+    def _consultar(self, db: Session, inicio: datetime, fin: datetime, por_dia: bool):
+        """Agregados del rango [inicio, fin]; por día si ``por_dia``."""
+        parametros = {"fecha_inicio": inicio, "fecha_fin": fin}
+        if por_dia:
+            filas_ventas = db.execute(consultas.TOTALES_VENTAS_POR_DIA, parametros)
+            filas_items = db.execute(consultas.TOTALES_ITEMS_POR_DIA, parametros)
+        else:
+            filas_ventas = db.execute(consultas.TOTALES_VENTAS, parametros)
+            filas_items = db.execute(consultas.TOTALES_ITEMS, parametros)
+
+        parciales = {}
+
+        def parcial(fila):
+            clave = date.fromisoformat(fila[0]) if por_dia else None
+            if clave not in parciales:
+                parciales[clave] = ParcialVentas()
+            return parciales[clave], (fila[1:] if por_dia else fila)
+
+        for fila in filas_ventas:
+            destino, (total, cantidad) = parcial(fila)
+            destino.total_centavos += total or 0
+            destino.cantidad_ventas += cantidad or 0
+
+        for fila in filas_items:
+            destino, (producto_id, unidades, ingresos, costo) = parcial(fila)
+            destino.productos[producto_id] = [unidades or 0, ingresos or 0, costo or 0]
+
+        if por_dia:
+            return parciales
+        return parciales.get(None, ParcialVentas())
+
+    def _cerrados(self, db: Session, primer_dia: date, ultimo_dia: date):
+        """Parciales de días cerrados, consultando solo los que faltan en caché."""
+        dias = [primer_dia + timedelta(days=i) for i in range((ultimo_dia - primer_dia).days + 1)]
+        with self._lock:
+            version = self._version
+            encontrados = {}
+            for dia in dias:
+                if dia in self._dias:
+                    self._dias.move_to_end(dia)
+                    encontrados[dia] = self._dias[dia]
+        faltantes = [dia for dia in dias if dia not in encontrados]
+
+        if faltantes:
+            # Una sola consulta agrupada por día entre el primer y el último faltante
+            calculados = self._consultar(
+                db,
+                datetime.combine(faltantes[0], time.min),
+                datetime.combine(faltantes[-1], time.max),
+                por_dia=True
+            )
+            with self._lock:
+                guardar = version == self._version
+                for dia in faltantes:
+                    parcial = calculados.get(dia, ParcialVentas())
+                    encontrados[dia] = parcial
+                    if guardar:
+                        self._dias[dia] = parcial
+                while len(self._dias) > self.max_dias:
+                    self._dias.popitem(last=False)
+
+        return [encontrados[dia] for dia in dias]
+
+    def obtener(self, db: Session, fecha_inicio: datetime, fecha_fin: datetime):
+        """Agregados de ventas completadas en [fecha_inicio, fecha_fin]."""
+        inicio = _a_hora_local(fecha_inicio)
+        fin = _a_hora_local(fecha_fin)
+        resultado = ParcialVentas()
+        if fin < inicio:
+            return resultado
+
+        hoy = datetime.now(ZONA_HORARIA).date()
+
+        # Días completos contenidos en el rango y anteriores a hoy
+        primer_dia = inicio.date() if inicio.time() == time.min else inicio.date() + timedelta(days=1)
+        ultimo_dia = fin.date() if fin.time() == time.max else fin.date() - timedelta(days=1)
+        ultimo_dia = min(ultimo_dia, hoy - timedelta(days=1))
+
+        if primer_dia > ultimo_dia:
+            resultado.sumar(self._consultar(db, inicio, fin, por_dia=False))
+            return resultado
+
+        for parcial in self._cerrados(db, primer_dia, ultimo_dia):
+            resultado.sumar(parcial)
+
+        # Tramos vivos: antes del primer día cerrado y después del último
+        inicio_cerrado = datetime.combine(primer_dia, time.min)
+        fin_cerrado = datetime.combine(ultimo_dia + timedelta(days=1), time.min)
+        if inicio < inicio_cerrado:
+            resultado.sumar(self._consultar(
+                db, inicio, inicio_cerrado - timedelta(microseconds=1), por_dia=False
+            ))
+        if fin >= fin_cerrado:
+            resultado.sumar(self._consultar(db, fin_cerrado, fin, por_dia=False))
+
+        return resultado
+
+
+# Instancia compartida por la aplicación (una por proceso)
+cache_reportes = CacheReportes()
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import orjson
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+DIRECTORIO_CAPTURAS = os.environ.get("STOREVISION_DIR_CAPTURAS", "capturas")
+FORMATO_CAPTURA = 1
+
+# Campos cuyo valor nunca se escribe (se compara sin mayúsculas y por contenido)
+CAMPOS_SENSIBLES = ('password', 'contrasena', 'contraseña', 'clave', 'token', 'secret')
+REDACTADO = "***"
+
+# Cuerpos más grandes se anotan solo con su tamaño
+MAX_CUERPO = 64 * 1024
+# Respuestas de las que se extraen ids generados (solo POST JSON pequeños)
+MAX_RESPUESTA = 4096
+IDS_GENERADOS = ('session_id', 'venta_id', 'producto_id', 'promocion_id', 'turno_id')
+
+# Los ids de sesión son credenciales: en la captura solo queda el usuario y
+# un ordinal por captura ("session_3_p2"), suficiente para repetirla
+SESION_USUARIO = re.compile(r"^session_(\d+)_")
+
+# La captura se detiene sola al llegar a este tamaño
+MAX_BYTES_CAPTURA = 512 * 1024 * 1024
+
+# Rutas que no se capturan (el propio diagnóstico)
+PREFIJOS_EXCLUIDOS = ("/api/diagnostico",)
+
+
+def redactar(valor):
+    """Copia de ``valor`` con los campos sensibles reemplazados, a cualquier profundidad."""
+    if isinstance(valor, dict):
+        return {
+            clave: REDACTADO if any(campo in clave.lower() for campo in CAMPOS_SENSIBLES) else redactar(contenido)
+            for clave, contenido in valor.items()
+        }
+    if isinstance(valor, list):
+        return [redactar(elemento) for elemento in valor]
+    return valor
+
+
+def _cabecera(cabeceras, nombre: bytes):
+    for clave, valor in cabeceras:
+        if clave == nombre:
+            return valor.decode("latin-1")
+    return None
+
+
+class CapturaTrafico:
+    """Registro opcional de las peticiones HTTP en un archivo JSON Lines de solo agregado.
+
+    Cada línea guarda el instante relativo al inicio de la captura, método,
+    ruta, query, sesión (seudónimo), cuerpo (redactado), estado, duración y
+    los ids que generó la respuesta, para poder repetir la carga con
+    ``benchmarks/repetir_captura.py``. El middleware solo encola los datos
+    crudos; un hilo aparte los redacta, serializa y escribe.
+    """
+
+    def __init__(self):
+        self.activa = False
+        self._lock = threading.Lock()
+        self._cola = None
+        self._hilo = None
+        self._inicio = 0.0
+        # Id de sesión -> seudónimo; solo lo usa el hilo de escritura
+        self._seudonimos = {}
+        self.archivo = None
+        self.registros = 0
+        self.bytes_escritos = 0
+
+    def iniciar(self, directorio: str = DIRECTORIO_CAPTURAS):
+        with self._lock:
+            if self.activa:
+                return {"error": "Ya hay una captura en curso"}
+
+            os.makedirs(directorio, exist_ok=True)
+            ahora = datetime.now(ZONA_HORARIA)
+            self.archivo = os.path.join(directorio, f"captura_{ahora:%Y%m%d_%H%M%S}.jsonl")
+            salida = open(self.archivo, "ab")
+            encabezado = orjson.dumps({"formato": FORMATO_CAPTURA, "inicio": ahora}) + b"\n"
+            salida.write(encabezado)
+
+            self.registros = 0
+            self.bytes_escritos = len(encabezado)
+            self._seudonimos = {}
+            self._inicio = time.perf_counter()
+            self._cola = queue.SimpleQueue()
+            self._hilo = threading.Thread(
+                target=self._escribir, args=(self._cola, salida), name="captura-trafico", daemon=True
+            )
+            self._hilo.start()
+            self.activa = True
+
+        logger.info("Captura de tráfico iniciada en %s", self.archivo)
+        return self.estado()
+
+    def detener(self):
+        with self._lock:
+            if not self.activa:
+                return {"error": "No hay una captura en curso"}
+            self.activa = False
+            self._cola.put(None)
+            self._cola = None
+            hilo = self._hilo
+
+        hilo.join()
+        logger.info("Captura de tráfico detenida: %s peticiones en %s", self.registros, self.archivo)
+        return self.estado()
+
+    def estado(self):
+        return {
+            "activa": self.activa,
+            "archivo": self.archivo,
+            "peticiones": self.registros,
+            "bytes": self.bytes_escritos
+        }
+
+    def registrar(self, scope, inicio: float, cuerpo: bytes, estado: int, respuesta: bytes, duracion: float):
+        """Encola una petición terminada; llamado por el middleware en el event loop."""
+        cola = self._cola
+        if cola is not None:
+            cola.put((scope["method"], scope["path"], scope.get("query_string", b""), scope["headers"],
+                      inicio - self._inicio, cuerpo, estado, respuesta, duracion))
+
+    def _seudonimo(self, sesion: str):
+        seudonimo = self._seudonimos.get(sesion)
+        if seudonimo is None:
+            coincidencia = SESION_USUARIO.match(sesion)
+            usuario = coincidencia.group(1) if coincidencia else "x"
+            seudonimo = f"session_{usuario}_p{len(self._seudonimos) + 1}"
+            self._seudonimos[sesion] = seudonimo
+        return seudonimo
+
+    def _registro(self, metodo, ruta, query, cabeceras, instante, cuerpo, estado, respuesta, duracion):
+        registro = {"t": round(instante, 6), "m": metodo, "p": ruta}
+        if query:
+            registro["q"] = query.decode("latin-1")
+        sesion = _cabecera(cabeceras, b"session-id")
+        if sesion:
+            registro["s"] = self._seudonimo(sesion)
+        codificacion = _cabecera(cabeceras, b"accept-encoding")
+        if codificacion:
+            registro["e"] = codificacion
+
+        if len(cuerpo) > MAX_CUERPO:
+            registro["bt"] = len(cuerpo)
+        elif cuerpo:
+            try:
+                registro["b"] = redactar(orjson.loads(cuerpo))
+            except orjson.JSONDecodeError:
+                # Cuerpo no JSON: se guarda como texto solo si no menciona campos sensibles
+                texto = cuerpo.decode("utf-8", "replace")
+                if any(campo in texto.lower() for campo in CAMPOS_SENSIBLES):
+                    registro["bt"] = len(cuerpo)
+                else:
+                    registro["bx"] = texto
+
+        registro["st"] = estado
+        registro["d"] = round(duracion * 1000, 3)
+
+        if respuesta:
+            try:
+                datos = orjson.loads(respuesta)
+            except orjson.JSONDecodeError:
+                datos = None
+            if isinstance(datos, dict):
+                generados = {clave: datos[clave] for clave in IDS_GENERADOS if clave in datos}
+                if isinstance(generados.get("session_id"), str):
+                    generados["session_id"] = self._seudonimo(generados["session_id"])
+                if generados:
+                    registro["r"] = generados
+        return registro
+
+    def _escribir(self, cola, salida):
+        pendientes = 0
+        try:
+            while True:
+                try:
+                    elemento = cola.get(timeout=1.0)
+                except queue.Empty:
+                    # Sin tráfico: lo encolado ya queda en disco
+                    if pendientes:
+                        salida.flush()
+                        pendientes = 0
+                    continue
+                if elemento is None:
+                    break
+                try:
+                    linea = orjson.dumps(self._registro(*elemento)) + b"\n"
+                except Exception as e:
+                    logger.error("Error serializando petición capturada: %s", e)
+                    continue
+                salida.write(linea)
+                self.registros += 1
+                self.bytes_escritos += len(linea)
+                pendientes += 1
+                if self.bytes_escritos >= MAX_BYTES_CAPTURA:
+                    logger.warning("Captura de tráfico detenida al llegar a %s bytes", MAX_BYTES_CAPTURA)
+                    with self._lock:
+                        self.activa = False
+                        self._cola = None
+                    break
+        finally:
+            salida.close()
+
+
+# Instancia compartida por la aplicación (una por proceso)
+captura_trafico = CapturaTrafico()
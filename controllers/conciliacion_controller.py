@@ -0,0 +1,306 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, delete, insert, update, bindparam, or_, and_
+from models.modelos import Producto, MovimientoInventario, ConciliacionStock
+from controllers.instantaneas_controller import DELTA_MOVIMIENTO
+from controllers.archivo_controller import TIPO_SALDO_INICIAL
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rupturas de cadena detalladas por ejecución (el resto solo se cuenta)
+MAX_RUPTURAS_DETALLE = 500
+
+# Productos por sentencia al leer y guardar puntos de control
+LOTE_PRODUCTOS = 500
+
+
+def _lotes(valores: list, tamano: int = LOTE_PRODUCTOS):
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+class ControladorConciliacion:
+    """Verifica ``Producto.stock_actual`` contra el libro de movimientos.
+
+    Cada ejecución procesa solo los movimientos posteriores al último punto de
+    control, agrupados por producto en una pasada. Además del total se revisa
+    la cadena: el ``stock_anterior`` de cada movimiento debe ser el
+    ``stock_nuevo`` del anterior del mismo producto, y ``stock_nuevo`` debe
+    ser ``stock_anterior`` más la variación del movimiento.
+
+    Los ``saldo_inicial`` del archivo histórico abren la cadena de un producto
+    sin punto de control; si ya lo tiene, re-expresan historia ya verificada y
+    se ignoran. Un producto sin ningún movimiento se verifica contra 0: su
+    stock debería venir de una entrada (al crearlo se registra una).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _tramo(self, desde: int, hasta: int):
+        """Movimientos del tramo (sin saldos iniciales) con el eslabón anterior de cada uno."""
+        return select(
+            MovimientoInventario.id,
+            MovimientoInventario.producto_id,
+            MovimientoInventario.stock_anterior,
+            MovimientoInventario.stock_nuevo,
+            DELTA_MOVIMIENTO.label('delta'),
+            func.lag(MovimientoInventario.stock_nuevo).over(
+                partition_by=MovimientoInventario.producto_id,
+                order_by=MovimientoInventario.id
+            ).label('nuevo_previo'),
+            func.row_number().over(
+                partition_by=MovimientoInventario.producto_id,
+                order_by=MovimientoInventario.id.desc()
+            ).label('desde_el_final')
+        ).where(
+            MovimientoInventario.id > desde,
+            MovimientoInventario.id <= hasta,
+            MovimientoInventario.tipo_movimiento != TIPO_SALDO_INICIAL
+        ).subquery()
+
+    def _condicion_ruptura(self, tramo):
+        return or_(
+            and_(tramo.c.nuevo_previo.is_not(None), tramo.c.stock_anterior != tramo.c.nuevo_previo),
+            tramo.c.stock_nuevo != tramo.c.stock_anterior + tramo.c.delta
+        )
+
+    def conciliar(self, reiniciar: bool = False):
+        try:
+            fecha = datetime.now(timezone(timedelta(hours=-5)))
+            if reiniciar:
+                self.db.execute(delete(ConciliacionStock.__table__))
+
+            puntos = {
+                punto.producto_id: punto
+                for punto in self.db.execute(select(
+                    ConciliacionStock.producto_id,
+                    ConciliacionStock.ultimo_movimiento_id,
+                    ConciliacionStock.stock_esperado,
+                    ConciliacionStock.ultimo_stock_nuevo,
+                    ConciliacionStock.rupturas,
+                    ConciliacionStock.ultima_ruptura_id
+                ))
+            }
+            desde = max((punto.ultimo_movimiento_id for punto in puntos.values()), default=0)
+            # Con un solo escritor en SQLite, todo movimiento confirmado después tendrá id mayor
+            hasta = self.db.query(func.max(MovimientoInventario.id)).scalar() or 0
+
+            tramo = self._tramo(desde, hasta)
+            ruptura = self._condicion_ruptura(tramo)
+
+            # Una pasada agrupada por producto sobre el tramo nuevo
+            agregados = {
+                fila.producto_id: fila
+                for fila in self.db.execute(select(
+                    tramo.c.producto_id,
+                    func.count().label('movimientos'),
+                    func.sum(tramo.c.delta).label('delta'),
+                    func.max(case((tramo.c.nuevo_previo.is_(None), tramo.c.stock_anterior))).label('primer_anterior'),
+                    func.max(case((tramo.c.nuevo_previo.is_(None), tramo.c.id))).label('primer_id'),
+                    func.max(case((tramo.c.desde_el_final == 1, tramo.c.stock_nuevo))).label('ultimo_nuevo'),
+                    func.sum(case((ruptura, 1), else_=0)).label('rupturas'),
+                    func.max(case((ruptura, tramo.c.id))).label('ultima_ruptura_id')
+                ).group_by(tramo.c.producto_id))
+            }
+
+            # El detalle vuelve a recorrer el tramo: solo si la pasada agrupada encontró rupturas
+            hay_rupturas = any(agregado.rupturas for agregado in agregados.values())
+            detalle_rupturas = [
+                {
+                    'movimiento_id': fila.id,
+                    'producto_id': fila.producto_id,
+                    'stock_anterior': fila.stock_anterior,
+                    'stock_nuevo': fila.stock_nuevo,
+                    'esperado_anterior': fila.nuevo_previo,
+                    'esperado_nuevo': fila.stock_anterior + fila.delta
+                }
+                for fila in self.db.execute(
+                    select(tramo).where(ruptura).order_by(tramo.c.id).limit(MAX_RUPTURAS_DETALLE)
+                )
+            ] if hay_rupturas else []
+
+            saldos = {
+                fila.producto_id: fila
+                for fila in self.db.execute(select(
+                    MovimientoInventario.producto_id,
+                    func.max(MovimientoInventario.id).label('id'),
+                    MovimientoInventario.stock_nuevo
+                ).where(
+                    MovimientoInventario.id > desde,
+                    MovimientoInventario.id <= hasta,
+                    MovimientoInventario.tipo_movimiento == TIPO_SALDO_INICIAL
+                ).group_by(MovimientoInventario.producto_id))
+            }
+
+            nuevos_puntos = {}
+            for producto_id in set(agregados) | set(saldos):
+                agregado = agregados.get(producto_id)
+                punto = puntos.get(producto_id)
+                saldo = saldos.get(producto_id)
+
+                if punto is not None:
+                    base, eslabon = punto.stock_esperado, punto.ultimo_stock_nuevo
+                    rupturas, ultima_ruptura_id = punto.rupturas, punto.ultima_ruptura_id
+                elif saldo is not None:
+                    base = eslabon = saldo.stock_nuevo
+                    rupturas, ultima_ruptura_id = 0, None
+                else:
+                    # Sin historia verificada: el primer movimiento abre la cadena
+                    base = eslabon = agregado.primer_anterior
+                    rupturas, ultima_ruptura_id = 0, None
+
+                esperado = base
+                if agregado is not None:
+                    esperado += agregado.delta or 0
+                    if agregado.primer_anterior != eslabon:
+                        rupturas += 1
+                        ultima_ruptura_id = max(ultima_ruptura_id or 0, agregado.primer_id)
+                        if len(detalle_rupturas) < MAX_RUPTURAS_DETALLE:
+                            detalle_rupturas.append({
+                                'movimiento_id': agregado.primer_id,
+                                'producto_id': producto_id,
+                                'stock_anterior': agregado.primer_anterior,
+                                'stock_nuevo': None,
+                                'esperado_anterior': eslabon,
+                                'esperado_nuevo': None
+                            })
+                    if agregado.rupturas:
+                        rupturas += agregado.rupturas
+                        ultima_ruptura_id = max(ultima_ruptura_id or 0, agregado.ultima_ruptura_id)
+                    eslabon = agregado.ultimo_nuevo
+
+                nuevos_puntos[producto_id] = {
+                    'producto_id': producto_id,
+                    # El punto de control de todo producto tocado avanza hasta el final del tramo
+                    'ultimo_movimiento_id': hasta,
+                    'stock_esperado': esperado,
+                    'ultimo_stock_nuevo': eslabon,
+                    'rupturas': rupturas,
+                    'ultima_ruptura_id': ultima_ruptura_id,
+                    'fecha_conciliacion': fecha
+                }
+
+            # Productos sin punto de control ni movimientos hasta ``hasta``: esperado 0
+            for (producto_id,) in self.db.execute(select(Producto.id)):
+                if producto_id not in puntos and producto_id not in nuevos_puntos:
+                    nuevos_puntos[producto_id] = {
+                        'producto_id': producto_id,
+                        'ultimo_movimiento_id': hasta,
+                        'stock_esperado': 0,
+                        'ultimo_stock_nuevo': 0,
+                        'rupturas': 0,
+                        'ultima_ruptura_id': None,
+                        'fecha_conciliacion': fecha
+                    }
+
+            esperados = {producto_id: punto.stock_esperado for producto_id, punto in puntos.items()}
+            esperados.update({producto_id: punto['stock_esperado'] for producto_id, punto in nuevos_puntos.items()})
+
+            # Candidatos: stock_actual distinto del esperado hasta el movimiento ``hasta``
+            candidatos = {
+                fila.id: fila.stock_actual or 0
+                for fila in self.db.execute(select(Producto.id, Producto.stock_actual))
+                if fila.id in esperados and (fila.stock_actual or 0) != esperados[fila.id]
+            }
+
+            # Una venta confirmada durante la conciliación cambia stock_actual y deja un
+            # movimiento posterior a ``hasta``: se releen ambos en una sola sentencia
+            diferencias = {}
+            for lote in _lotes(list(candidatos)):
+                posteriores = (
+                    select(func.coalesce(func.sum(DELTA_MOVIMIENTO), 0))
+                    .where(
+                        MovimientoInventario.producto_id == Producto.id,
+                        MovimientoInventario.id > hasta
+                    )
+                    .scalar_subquery()
+                )
+                for fila in self.db.execute(
+                    select(Producto.id, Producto.stock_actual, posteriores.label('posteriores'))
+                    .where(Producto.id.in_(lote))
+                ):
+                    diferencia = (fila.stock_actual or 0) - fila.posteriores - esperados[fila.id]
+                    if diferencia:
+                        diferencias[fila.id] = diferencia
+
+            tabla = ConciliacionStock.__table__
+            for producto_id, punto in nuevos_puntos.items():
+                punto['diferencia'] = diferencias.get(producto_id, 0)
+
+            for lote in _lotes(list(nuevos_puntos)):
+                self.db.execute(delete(tabla).where(tabla.c.producto_id.in_(lote)))
+                self.db.execute(insert(tabla), [nuevos_puntos[producto_id] for producto_id in lote])
+
+            # Productos sin movimientos nuevos: solo se actualiza la diferencia
+            self.db.execute(update(tabla).where(tabla.c.diferencia != 0).values(diferencia=0))
+            if diferencias:
+                self.db.execute(
+                    update(tabla).where(tabla.c.producto_id == bindparam('id_producto'))
+                    .values(diferencia=bindparam('valor'), fecha_conciliacion=fecha),
+                    [{'id_producto': producto_id, 'valor': valor} for producto_id, valor in diferencias.items()]
+                )
+
+            self.db.commit()
+
+            movimientos = sum(agregado.movimientos for agregado in agregados.values())
+            nuevas_rupturas = sum(
+                punto['rupturas'] - (puntos[producto_id].rupturas if producto_id in puntos else 0)
+                for producto_id, punto in nuevos_puntos.items()
+            )
+            logger.info(
+                "Conciliación de stock: %s movimientos (%s, %s], %s diferencias, %s rupturas nuevas",
+                movimientos, desde, hasta, len(diferencias), nuevas_rupturas
+            )
+
+            return {
+                'fecha_conciliacion': fecha,
+                'desde_movimiento_id': desde,
+                'hasta_movimiento_id': hasta,
+                'movimientos_procesados': movimientos,
+                'productos_verificados': len(esperados),
+                'diferencias': len(diferencias),
+                'rupturas_nuevas': nuevas_rupturas,
+                'detalle_rupturas': detalle_rupturas
+            }
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error conciliando stock: %s", e)
+            return {"error": f"Error conciliando stock: {str(e)}"}
+
+    def obtener_discrepancias(self):
+        """Productos con diferencia de stock o con la cadena de movimientos rota."""
+        try:
+            filas = self.db.query(
+                ConciliacionStock, Producto.codigo, Producto.nombre, Producto.stock_actual
+            ).join(
+                Producto, ConciliacionStock.producto_id == Producto.id
+            ).filter(
+                or_(ConciliacionStock.diferencia != 0, ConciliacionStock.rupturas > 0)
+            ).order_by(ConciliacionStock.producto_id).all()
+
+            ultima = self.db.query(func.max(ConciliacionStock.fecha_conciliacion)).scalar()
+            return {
+                'ultima_conciliacion': ultima,
+                'productos': [
+                    {
+                        'producto_id': punto.producto_id,
+                        'codigo': codigo,
+                        'nombre': nombre,
+                        'stock_actual': stock_actual,
+                        'stock_esperado': punto.stock_esperado,
+                        'diferencia': punto.diferencia,
+                        'rupturas': punto.rupturas,
+                        'ultima_ruptura_id': punto.ultima_ruptura_id,
+                        'ultimo_movimiento_id': punto.ultimo_movimiento_id,
+                        'fecha_conciliacion': punto.fecha_conciliacion
+                    }
+                    for punto, codigo, nombre, stock_actual in filas
+                ]
+            }
+
+        except Exception as e:
+            logger.error("Error obteniendo discrepancias de stock: %s", e)
+            return {"error": f"Error obteniendo discrepancias de stock: {str(e)}"}
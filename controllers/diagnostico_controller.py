@@ -0,0 +1,251 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Perfilado por muestreo: duración e intervalo permitidos
+MAX_SEGUNDOS_PERFIL = 60
+INTERVALO_MINIMO_MS = 1
+INTERVALO_MAXIMO_MS = 100
+
+# Hojas de pila de hilos en espera (event loop sin trabajo, hilos del pool libres)
+HOJAS_INACTIVAS = {
+    ("selectors", "EpollSelector.select"),
+    ("selectors", "PollSelector.select"),
+    ("selectors", "KqueueSelector.select"),
+    ("selectors", "SelectSelector.select"),
+    ("threading", "Condition.wait"),
+    ("threading", "Thread._wait_for_tstate_lock"),
+    # Hilo de escritura de la bitácora esperando registros
+    ("handlers", "QueueListener.dequeue"),
+}
+
+# Trazado de memoria: marcos por asignación y apagado automático
+MARCOS_MEMORIA = 10
+MAX_SEGUNDOS_MEMORIA = 3600
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _modulo(ruta: str):
+    """Nombre corto del archivo de un marco: relativo al proyecto o solo el módulo."""
+    if ruta.startswith(_RAIZ):
+        return os.path.splitext(os.path.relpath(ruta, _RAIZ))[0].replace(os.sep, ".")
+    return os.path.splitext(os.path.basename(ruta))[0]
+
+
+class PerfiladorMuestreo:
+    """Perfilador de pilas por muestreo, solo mientras dura una petición de perfilado.
+
+    Cada ``intervalo`` lee las pilas de todos los hilos con
+    ``sys._current_frames()`` y cuenta las pilas plegadas, en el formato de
+    texto que aceptan flamegraph.pl y speedscope (``marco;marco;marco N``).
+    Fuera de esa ventana no hay ningún gancho instalado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nombres = {}
+
+    def _marco(self, codigo):
+        # Nombres por objeto de código: cada función se formatea una sola vez
+        nombre = self._nombres.get(codigo)
+        if nombre is None:
+            nombre = self._nombres[codigo] = (_modulo(codigo.co_filename), codigo.co_qualname)
+        return nombre
+
+    def _pila(self, marco):
+        pila = []
+        while marco is not None:
+            pila.append(self._marco(marco.f_code))
+            marco = marco.f_back
+        pila.reverse()
+        return pila
+
+    def perfilar(self, segundos: float = 10, intervalo_ms: float = 5, inactivos: bool = False):
+        """Muestrea durante ``segundos`` y devuelve las pilas plegadas con sus conteos."""
+        segundos = min(max(segundos, 0.1), MAX_SEGUNDOS_PERFIL)
+        intervalo = min(max(intervalo_ms, INTERVALO_MINIMO_MS), INTERVALO_MAXIMO_MS) / 1000
+
+        if not self._lock.acquire(blocking=False):
+            return {"error": "Ya hay un perfilado en curso"}
+
+        try:
+            propio = threading.get_ident()
+            conteos = Counter()
+            muestras = 0
+            inicio = time.perf_counter()
+            fin = inicio + segundos
+            siguiente = inicio
+
+            while True:
+                ahora = time.perf_counter()
+                if ahora >= fin:
+                    break
+                nombres_hilos = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+                for ident, marco in sys._current_frames().items():
+                    if ident == propio:
+                        continue
+                    pila = self._pila(marco)
+                    if not inactivos and pila and pila[-1] in HOJAS_INACTIVAS:
+                        continue
+                    conteos[(nombres_hilos.get(ident, str(ident)), *pila)] += 1
+                muestras += 1
+                siguiente += intervalo
+                # Si una muestra tarda más que el intervalo no se acumulan atrasos
+                siguiente = max(siguiente, time.perf_counter())
+                time.sleep(max(0.0, min(siguiente, fin) - time.perf_counter()))
+
+            duracion = time.perf_counter() - inicio
+        finally:
+            self._lock.release()
+
+        lineas = [
+            ";".join([hilo] + [f"{modulo}:{funcion}" for modulo, funcion in pila]) + f" {cantidad}"
+            for (hilo, *pila), cantidad in conteos.most_common()
+        ]
+        logger.info("Perfilado de %.1f s: %s muestras, %s pilas distintas", duracion, muestras, len(lineas))
+        return {
+            "duracion_segundos": round(duracion, 3),
+            "intervalo_ms": intervalo * 1000,
+            "muestras": muestras,
+            "pilas": "\n".join(lineas) + ("\n" if lineas else "")
+        }
+
+
+class TrazadorMemoria:
+    """Instantáneas de ``tracemalloc`` bajo demanda.
+
+    ``tracemalloc`` solo se activa entre ``iniciar`` y ``detener`` (o hasta
+    el apagado automático); mientras está apagado no cuesta nada. Cada
+    instantánea devuelve los principales sitios de asignación y la diferencia
+    con la instantánea anterior.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._anterior = None
+        self._apagado = None
+        self._iniciado = None
+
+    def _estado(self):
+        actual, pico = tracemalloc.get_traced_memory()
+        return {
+            "activo": tracemalloc.is_tracing(),
+            "iniciado": self._iniciado,
+            "memoria_trazada_kb": round(actual / 1024, 1),
+            "pico_kb": round(pico / 1024, 1)
+        }
+
+    def iniciar(self, marcos: int = MARCOS_MEMORIA, limite_segundos: int = 600):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                return {"error": "El trazado de memoria ya está activo"}
+            limite_segundos = min(max(limite_segundos, 1), MAX_SEGUNDOS_MEMORIA)
+            tracemalloc.start(min(max(marcos, 1), 50))
+            self._anterior = None
+            self._iniciado = datetime.now(timezone(timedelta(hours=-5)))
+            # Si nadie lo detiene, el trazado no queda encendido indefinidamente
+            self._apagado = threading.Timer(limite_segundos, self.detener)
+            self._apagado.daemon = True
+            self._apagado.start()
+            logger.info("Trazado de memoria iniciado por %s s", limite_segundos)
+            return self._estado()
+
+    def instantanea(self, top: int = 20, agrupar: str = "lineno"):
+        if agrupar not in ("lineno", "traceback", "filename"):
+            return {"error": "agrupar debe ser lineno, traceback o filename"}
+
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return {"error": "El trazado de memoria no está activo"}
+            instantanea = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ))
+            anterior, self._anterior = self._anterior, instantanea
+            resultado = self._estado()
+
+        def sitio(traza):
+            return [f"{_modulo(marco.filename)}:{marco.lineno}" for marco in traza]
+
+        resultado["principales"] = [
+            {"sitio": sitio(estadistica.traceback), "kb": round(estadistica.size / 1024, 1),
+             "bloques": estadistica.count}
+            for estadistica in instantanea.statistics(agrupar)[:top]
+        ]
+        resultado["diferencias"] = None if anterior is None else [
+            {"sitio": sitio(diferencia.traceback), "kb": round(diferencia.size / 1024, 1),
+             "diferencia_kb": round(diferencia.size_diff / 1024, 1),
+             "diferencia_bloques": diferencia.count_diff}
+            for diferencia in instantanea.compare_to(anterior, agrupar)[:top]
+        ]
+        return resultado
+
+    def detener(self):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return {"error": "El trazado de memoria no está activo"}
+            resultado = self._estado()
+            tracemalloc.stop()
+            self._anterior = None
+            self._iniciado = None
+            if self._apagado is not None:
+                self._apagado.cancel()
+                self._apagado = None
+            logger.info("Trazado de memoria detenido")
+            resultado["activo"] = False
+            return resultado
+
+
+class RegistroPeticiones:
+    """Peticiones HTTP en curso, para ver cuáles están atascadas y desde cuándo.
+
+    El registro lo alimenta ``MiddlewarePeticiones`` solo mientras ``activo``
+    es verdadero (STOREVISION_DIAGNOSTICO=1 o el endpoint de diagnóstico);
+    apagado, el middleware se limita a consultar ese atributo.
+    """
+
+    def __init__(self):
+        self.activo = os.environ.get("STOREVISION_DIAGNOSTICO", "0") == "1"
+        self._en_curso = {}
+        self._ids = itertools.count(1)
+
+    def activar(self, activo: bool):
+        self.activo = activo
+        if not activo:
+            self._en_curso.clear()
+        return {"activo": self.activo}
+
+    def entrar(self, metodo: str, ruta: str):
+        peticion_id = next(self._ids)
+        self._en_curso[peticion_id] = (metodo, ruta, time.perf_counter(), datetime.now(timezone(timedelta(hours=-5))))
+        return peticion_id
+
+    def salir(self, peticion_id: int):
+        self._en_curso.pop(peticion_id, None)
+
+    def en_curso(self):
+        ahora = time.perf_counter()
+        peticiones = [
+            {"id": peticion_id, "metodo": metodo, "ruta": ruta, "inicio": fecha,
+             "transcurrido_ms": round((ahora - inicio) * 1000, 1)}
+            for peticion_id, (metodo, ruta, inicio, fecha) in list(self._en_curso.items())
+        ]
+        peticiones.sort(key=lambda peticion: peticion["transcurrido_ms"], reverse=True)
+        return {"activo": self.activo, "peticiones": peticiones}
+
+
+# Instancias compartidas por la aplicación (una por proceso)
+perfilador_muestreo = PerfiladorMuestreo()
+trazador_memoria = TrazadorMemoria()
+registro_peticiones = RegistroPeticiones()
@@ -0,0 +1,111 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, case, distinct, type_coerce, Float, Integer
+from models.modelos import Venta, ItemVenta, Producto, MovimientoInventario, Usuario
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Filas que se traen del cursor por cada lote
+FILAS_POR_LOTE = 1000
+
+AGRUPACIONES_BALANCE = ('dia', 'categoria')
+
+
+class ControladorExportacion:
+    """Filas para exportar reportes grandes.
+
+    Cada método devuelve ``(encabezados, filas)`` donde ``filas`` es un
+    generador que lee el cursor por lotes, así la memoria no depende del rango.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _filas(self, consulta):
+        resultado = self.db.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+        try:
+            for fila in resultado:
+                yield tuple(fila)
+        finally:
+            resultado.close()
+
+    def exportar_ventas(self, fecha_inicio: datetime, fecha_fin: datetime):
+        """Una fila por item vendido, con los datos de su venta."""
+        encabezados = [
+            'venta_id', 'fecha_venta', 'cajero', 'total_venta', 'codigo', 'producto',
+            'categoria', 'cantidad', 'precio_unitario', 'subtotal'
+        ]
+        consulta = (select(
+                Venta.id, Venta.fecha_venta, Usuario.nombre, Venta.total, Producto.codigo,
+                Producto.nombre, ItemVenta.categoria, ItemVenta.cantidad,
+                ItemVenta.precio_unitario, ItemVenta.subtotal
+            )
+            .join(Venta, ItemVenta.venta_id == Venta.id)
+            .join(Usuario, Venta.usuario_id == Usuario.id)
+            .join(Producto, ItemVenta.producto_id == Producto.id)
+            .where(
+                Venta.fecha_venta >= fecha_inicio,
+                Venta.fecha_venta <= fecha_fin,
+                Venta.estado == 'completada'
+            )
+            .order_by(Venta.fecha_venta, Venta.id, ItemVenta.id))
+        return encabezados, self._filas(consulta)
+
+    def exportar_movimientos(self, fecha_inicio: datetime, fecha_fin: datetime, producto_id: int = None):
+        encabezados = [
+            'fecha_movimiento', 'codigo', 'producto', 'tipo_movimiento', 'cantidad',
+            'stock_anterior', 'stock_nuevo', 'motivo', 'usuario'
+        ]
+        consulta = (select(
+                MovimientoInventario.fecha_movimiento, Producto.codigo, Producto.nombre,
+                MovimientoInventario.tipo_movimiento, MovimientoInventario.cantidad,
+                MovimientoInventario.stock_anterior, MovimientoInventario.stock_nuevo,
+                MovimientoInventario.motivo, Usuario.nombre
+            )
+            .join(Producto, MovimientoInventario.producto_id == Producto.id)
+            .join(Usuario, MovimientoInventario.usuario_id == Usuario.id)
+            .where(
+                MovimientoInventario.fecha_movimiento >= fecha_inicio,
+                MovimientoInventario.fecha_movimiento <= fecha_fin
+            )
+            .order_by(MovimientoInventario.fecha_movimiento, MovimientoInventario.id))
+        if producto_id:
+            consulta = consulta.where(MovimientoInventario.producto_id == producto_id)
+        return encabezados, self._filas(consulta)
+
+    def exportar_balance(self, fecha_inicio: datetime, fecha_fin: datetime, agrupar: str = 'dia'):
+        """Ventas, costo y utilidad por día o por categoría."""
+        if agrupar not in AGRUPACIONES_BALANCE:
+            return {"error": f"Agrupación no soportada: {agrupar}. Opciones: {', '.join(AGRUPACIONES_BALANCE)}"}
+
+        # Categoría y costo guardados en el item al vender: no hace falta unir con productos
+        grupo = func.date(Venta.fecha_venta) if agrupar == 'dia' else func.coalesce(ItemVenta.categoria, 'Sin categoría')
+        total_ventas = func.sum(ItemVenta.subtotal)
+        costo_ventas = func.sum(ItemVenta.cantidad * ItemVenta.costo_unitario)
+        utilidad = total_ventas - costo_ventas
+        # El margen es un cociente de centavos: sin Dinero para que 100.0 no se tome como monto
+        margen = func.round(
+            type_coerce(utilidad, Integer) * 100.0 / type_coerce(total_ventas, Integer), 2
+        )
+
+        encabezados = [agrupar, 'cantidad_ventas', 'unidades', 'total_ventas', 'costo_ventas',
+                       'utilidad_bruta', 'margen_utilidad']
+        consulta = (select(
+                grupo,
+                func.count(distinct(Venta.id)),
+                func.sum(ItemVenta.cantidad),
+                total_ventas,
+                costo_ventas,
+                utilidad,
+                type_coerce(case((total_ventas > 0, margen), else_=0), Float)
+            )
+            .join(Venta, ItemVenta.venta_id == Venta.id)
+            .where(
+                Venta.fecha_venta >= fecha_inicio,
+                Venta.fecha_venta <= fecha_fin,
+                Venta.estado == 'completada'
+            )
+            .group_by(grupo)
+            .order_by(grupo))
+        return encabezados, self._filas(consulta)
@@ -0,0 +1,595 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+import threading
+import time
+import orjson
+from sqlalchemy.orm import Session
+from sqlalchemy import type_coerce, Integer
+from models.modelos import Producto, Usuario, RegistroAuditoria, a_centavos
+from models.database import SesionLocal
+from models import consultas
+from controllers.ranking_controller import ranking_ventas
+from controllers.cache_reportes_controller import cache_reportes
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+# Directorio del que la API toma los archivos a importar (la consola acepta cualquier ruta)
+DIRECTORIO_IMPORTACION = os.environ.get("STOREVISION_DIR_IMPORTACION", "importaciones")
+
+# Cada lote se valida en un proceso y se carga en una transacción
+LINEAS_POR_LOTE = 5000
+MAX_LINEAS_POR_LOTE = 20000
+PROCESOS_POR_DEFECTO = min(4, os.cpu_count() or 1)
+# Errores que se detallan en el resultado; el resto solo se cuenta
+MAX_ERRORES = 200
+# Segundos entre avisos de progreso
+INTERVALO_PROGRESO = 2.0
+
+# Una línea por item: venta (número de ticket), fecha, codigo, cantidad,
+# precio_unitario y opcionalmente descuento, costo_unitario, usuario (email) y estado
+COLUMNAS_OBLIGATORIAS = ('venta', 'fecha', 'codigo', 'cantidad', 'precio_unitario')
+# Nombres habituales en exportaciones de otros sistemas de caja
+ALIAS_COLUMNAS = {
+    'ticket': 'venta', 'factura': 'venta', 'referencia': 'venta',
+    'fecha_venta': 'fecha', 'sku': 'codigo', 'codigo_producto': 'codigo',
+    'precio': 'precio_unitario', 'costo': 'costo_unitario',
+    'cajero': 'usuario', 'email': 'usuario',
+}
+ESTADOS = ('completada', 'anulada')
+MAX_REFERENCIA = 64
+# Montos con separador de miles: 4.500, 1,234,567
+MILES = re.compile(r"-?\d{1,3}(?:([.,])\d{3})(?:\1\d{3})*")
+
+
+def _columna(nombre: str):
+    nombre = nombre.strip().lower()
+    return ALIAS_COLUMNAS.get(nombre, nombre)
+
+
+def _formato(ruta: str):
+    nombre = ruta.lower()
+    if nombre.endswith(".gz"):
+        nombre = nombre[:-3]
+    if nombre.endswith((".csv", ".txt")):
+        return "csv"
+    if nombre.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return None
+
+
+# Validación (en los procesos de trabajo). No usa la base ni el registro:
+# recibe una vez por proceso los catálogos y devuelve ventas listas para insertar
+
+_productos = {}
+_usuarios = {}
+_usuario_defecto = None
+_ahora = None
+
+
+def iniciar_validacion(productos: dict, usuarios: dict, usuario_defecto: int, ahora: datetime):
+    """Catálogos del proceso: código -> (id, categoría, costo en centavos) y email -> id."""
+    global _productos, _usuarios, _usuario_defecto, _ahora
+    _productos, _usuarios, _usuario_defecto, _ahora = productos, usuarios, usuario_defecto, ahora
+
+
+class LineaInvalida(ValueError):
+    pass
+
+
+def _centavos(valor):
+    """Monto en pesos a centavos. En texto acepta "$4.500", "4.500,50" y "4,500.50".
+
+    Con un solo tipo de separador seguido de grupos de tres dígitos
+    ("4.500", "1,234,567") se toma como separador de miles, como en los
+    precios en pesos colombianos.
+    """
+    if isinstance(valor, (int, float)):
+        return a_centavos(valor)
+    if isinstance(valor, str) and valor.isdecimal():
+        # Lo más común en las exportaciones: pesos enteros sin separadores
+        return int(valor) * 100
+    texto = str(valor).strip().replace("$", "").replace(" ", "")
+    if "," in texto and "." in texto:
+        miles = "," if texto.rfind(".") > texto.rfind(",") else "."
+        texto = texto.replace(miles, "").replace(",", ".")
+    elif MILES.fullmatch(texto):
+        texto = texto.replace(",", "").replace(".", "")
+    else:
+        texto = texto.replace(",", ".")
+    return a_centavos(Decimal(texto))
+
+
+def _fecha(valor):
+    fecha = datetime.fromisoformat(str(valor).strip())
+    if fecha.tzinfo is None:
+        return fecha.replace(tzinfo=ZONA_HORARIA)
+    return fecha.astimezone(ZONA_HORARIA)
+
+
+def _filas(texto: str, formato: str, encabezado: list, delimitador: str, primera_linea: int):
+    """(número de línea, fila normalizada o None si no se pudo leer)."""
+    if formato == "csv":
+        lector = csv.reader(io.StringIO(texto, newline=""), delimiter=delimitador)
+        for valores in lector:
+            if valores:
+                yield primera_linea + lector.line_num - 1, dict(zip(encabezado, valores))
+        return
+
+    for desplazamiento, linea in enumerate(texto.splitlines()):
+        if not linea.strip():
+            continue
+        numero = primera_linea + desplazamiento
+        try:
+            dato = orjson.loads(linea)
+        except orjson.JSONDecodeError:
+            yield numero, None
+            continue
+        if not isinstance(dato, dict):
+            yield numero, None
+            continue
+        fila = {_columna(clave): valor for clave, valor in dato.items() if clave != "items"}
+        items = dato.get("items")
+        if not isinstance(items, list):
+            yield numero, fila
+            continue
+        # Una venta por línea con sus items anidados
+        for item in items:
+            if isinstance(item, dict):
+                yield numero, {**fila, **{_columna(clave): valor for clave, valor in item.items()}}
+            else:
+                yield numero, None
+
+
+def validar_lote(primera_linea: int, texto: str, formato: str, encabezado: list = None, delimitador: str = ","):
+    """Valida un lote de líneas y agrupa los items por venta.
+
+    Devuelve ``(ventas, errores, rechazadas)``: ventas como tuplas
+    ``(referencia, fecha, usuario_id, estado, total, items, línea)`` con
+    montos en centavos, los errores como ``(línea, referencia, mensaje)`` y
+    el número de ventas descartadas. Una venta con cualquier línea inválida
+    se descarta completa. Las líneas de una venta deben ser contiguas y con
+    la misma fecha: un número de venta que reaparece después de otro es un
+    error, no una continuación.
+    """
+    ventas = {}
+    fechas = {}
+    invalidas = set()
+    errores = []
+    anterior = None
+
+    for numero, fila in _filas(texto, formato, encabezado, delimitador, primera_linea):
+        if fila is None:
+            errores.append((numero, None, "Línea ilegible"))
+            continue
+        referencia = str(fila.get('venta') or "").strip()
+        if not referencia or len(referencia) > MAX_REFERENCIA:
+            errores.append((numero, None, "Falta el número de venta o es demasiado largo"))
+            continue
+        contigua, anterior = referencia == anterior, referencia
+        if referencia in invalidas:
+            continue
+
+        try:
+            producto = _productos.get(str(fila.get('codigo') or "").strip())
+            if producto is None:
+                raise LineaInvalida(f"Producto {fila.get('codigo')!r} no existe")
+            cantidad = int(fila['cantidad'])
+            if cantidad <= 0:
+                raise LineaInvalida("La cantidad debe ser positiva")
+            precio = _centavos(fila['precio_unitario'])
+            descuento = _centavos(fila.get('descuento') or 0)
+            costo = _centavos(fila['costo_unitario']) if fila.get('costo_unitario') not in (None, "") else producto[2]
+            if precio < 0 or costo < 0 or not 0 <= descuento <= cantidad * precio:
+                raise LineaInvalida("Montos fuera de rango")
+
+            venta = ventas.get(referencia)
+            if venta is not None and not contigua:
+                raise LineaInvalida("La venta reaparece después de otra: sus líneas deben ser contiguas")
+            if venta is not None and fila['fecha'] != fechas[referencia] and _fecha(fila['fecha']) != venta[1]:
+                raise LineaInvalida("Fecha distinta a la de las otras líneas de la venta")
+            if venta is None:
+                fecha = _fecha(fila['fecha'])
+                if fecha > _ahora:
+                    raise LineaInvalida("Fecha futura")
+                usuario = fila.get('usuario')
+                usuario_id = _usuarios.get(str(usuario).strip().lower()) if usuario else _usuario_defecto
+                if usuario_id is None:
+                    raise LineaInvalida(f"Usuario {usuario!r} no existe")
+                estado = str(fila.get('estado') or 'completada').strip().lower()
+                if estado not in ESTADOS:
+                    raise LineaInvalida(f"Estado {estado!r} no válido")
+                venta = ventas[referencia] = [referencia, fecha, usuario_id, estado, 0, [], numero]
+                fechas[referencia] = fila['fecha']
+
+            subtotal = cantidad * precio - descuento
+            venta[4] += subtotal
+            venta[5].append((producto[0], cantidad, precio, subtotal, costo, producto[1], descuento))
+
+        except (KeyError, ValueError, TypeError, InvalidOperation) as e:
+            if isinstance(e, LineaInvalida):
+                mensaje = str(e)
+            elif isinstance(e, KeyError):
+                mensaje = f"Falta la columna {e.args[0]}"
+            else:
+                mensaje = "Cantidad, monto o fecha con formato no válido"
+            errores.append((numero, referencia, mensaje))
+            invalidas.add(referencia)
+            ventas.pop(referencia, None)
+
+    return [tuple(venta) for venta in ventas.values()], errores, len(invalidas)
+
+
+class LectorLotes:
+    """Lee el archivo en lotes de líneas completas sin partir ninguna venta.
+
+    Las líneas no se interpretan aquí salvo en el borde de cada lote, donde se
+    lee el número de venta para seguir agregando líneas mientras sea el mismo.
+    El avance se mide en bytes del archivo (comprimidos si es .gz).
+    """
+
+    def __init__(self, ruta: str, lineas_por_lote: int):
+        self.ruta = ruta
+        self.formato = _formato(ruta)
+        self.lineas_por_lote = lineas_por_lote
+        self.bytes_totales = os.path.getsize(ruta)
+        self.encabezado = None
+        self.delimitador = ","
+        self._crudo = open(ruta, "rb")
+        flujo = gzip.GzipFile(fileobj=self._crudo) if ruta.lower().endswith(".gz") else self._crudo
+        self._texto = io.TextIOWrapper(flujo, encoding="utf-8-sig", newline="")
+        self.linea = 0
+
+        if self.formato == "csv":
+            primera = self._texto.readline()
+            self.linea = 1
+            # Exportaciones de hojas de cálculo en español suelen usar punto y coma
+            self.delimitador = ";" if primera.count(";") > primera.count(",") else ","
+            self.encabezado = [_columna(nombre) for nombre in next(csv.reader([primera], delimiter=self.delimitador))]
+            self._indice_venta = self.encabezado.index('venta') if 'venta' in self.encabezado else None
+
+    @property
+    def bytes_leidos(self):
+        return self._crudo.tell()
+
+    def faltantes(self):
+        if self.encabezado is None:
+            return []
+        return [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in self.encabezado]
+
+    def _referencia(self, registro: str):
+        """Número de venta del registro como lo lee validar_lote; None si no tiene."""
+        if self.formato == "csv":
+            if '"' in registro:
+                valores = next(csv.reader([registro], delimiter=self.delimitador), [])
+            else:
+                valores = registro.rstrip("\r\n").split(self.delimitador)
+            referencia = valores[self._indice_venta] if self._indice_venta < len(valores) else None
+        else:
+            try:
+                dato = orjson.loads(registro)
+            except orjson.JSONDecodeError:
+                return None
+            if not isinstance(dato, dict):
+                return None
+            referencia = next((valor for clave, valor in dato.items() if _columna(clave) == 'venta'), None)
+        if referencia is None:
+            return None
+        return str(referencia).strip() or None
+
+    def _registros(self):
+        """(primera línea, registro): en CSV un campo entre comillas puede ocupar varias líneas."""
+        if self.formato != "csv":
+            for linea in self._texto:
+                self.linea += 1
+                yield self.linea, linea
+            return
+
+        pendiente = []
+        comillas = 0
+        for linea in self._texto:
+            self.linea += 1
+            comillas += linea.count('"')
+            pendiente.append(linea)
+            if comillas % 2 == 0:
+                yield self.linea - len(pendiente) + 1, "".join(pendiente)
+                pendiente, comillas = [], 0
+        if pendiente:
+            yield self.linea - len(pendiente) + 1, "".join(pendiente)
+
+    def lotes(self):
+        """(primera línea, texto del lote, registros del lote)."""
+        lote = []
+        primera = None
+        borde = None
+        for numero, registro in self._registros():
+            if borde is not None:
+                if self._referencia(registro) == borde:
+                    lote.append(registro)
+                    continue
+                yield primera, "".join(lote), len(lote)
+                lote, borde = [], None
+            if not lote:
+                primera = numero
+            lote.append(registro)
+            if len(lote) >= self.lineas_por_lote:
+                borde = self._referencia(registro)
+                if borde is None:
+                    # Sin número de venta no hay venta que completar: el lote se cierra aquí
+                    yield primera, "".join(lote), len(lote)
+                    lote = []
+        if lote:
+            yield primera, "".join(lote), len(lote)
+
+    def cerrar(self):
+        self._texto.close()
+        self._crudo.close()
+
+
+class ControladorImportacion:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _catalogos(self):
+        """Código -> (id, categoría, costo en centavos) y email -> id, en una consulta cada uno."""
+        productos = {
+            codigo: (producto_id, categoria, costo or 0)
+            for producto_id, codigo, categoria, costo in self.db.query(
+                Producto.id, Producto.codigo, Producto.categoria, type_coerce(Producto.costo, Integer)
+            )
+            if codigo
+        }
+        usuarios = {email.lower(): usuario_id for usuario_id, email in self.db.query(Usuario.id, Usuario.email)}
+        return productos, usuarios
+
+    def _cargar(self, ventas):
+        """Inserta un lote de ventas en una transacción.
+
+        Devuelve ``(insertadas, items, omitidas, conflictos)``. Una venta cuya
+        referencia ya existe con el mismo total y fecha se omite (importación
+        repetida); con otro contenido es un conflicto, por ejemplo otra fuente
+        que reutiliza números de ticket o un ticket con líneas no contiguas
+        en el archivo, y se informa como error de su primera línea.
+        """
+        if not ventas:
+            return 0, 0, 0, []
+        existentes = {
+            referencia: (total, fecha)
+            for referencia, total, fecha in self.db.execute(
+                consultas.VENTAS_POR_REFERENCIA, {"referencias": [venta[0] for venta in ventas]}
+            )
+        }
+        nuevas = []
+        omitidas = 0
+        conflictos = []
+        for venta in ventas:
+            existente = existentes.get(venta[0])
+            if existente is None:
+                nuevas.append(venta)
+            elif existente == (venta[4], venta[1].replace(tzinfo=None)):
+                omitidas += 1
+            else:
+                conflictos.append((venta[6], venta[0], "La venta ya existe con otro total o fecha"))
+        items = 0
+        if nuevas:
+            conexion = self.db.connection()
+            ids = conexion.execute(consultas.INSERTAR_VENTAS_HISTORICAS, [
+                {"sucursal_id": 1, "usuario_id": usuario_id, "total": total, "fecha_venta": fecha,
+                 "estado": estado, "referencia_externa": referencia}
+                for referencia, fecha, usuario_id, estado, total, _, _ in nuevas
+            ]).scalars().all()
+            filas_items = [
+                {"venta_id": venta_id, "producto_id": producto_id, "cantidad": cantidad,
+                 "precio_unitario": precio, "subtotal": subtotal, "costo_unitario": costo,
+                 "categoria": categoria, "descuento": descuento}
+                for venta_id, venta in zip(ids, nuevas)
+                for producto_id, cantidad, precio, subtotal, costo, categoria, descuento in venta[5]
+            ]
+            conexion.execute(consultas.INSERTAR_ITEMS_HISTORICOS, filas_items)
+            items = len(filas_items)
+        self.db.commit()
+        return len(nuevas), items, omitidas, conflictos
+
+    def importar(self, ruta: str, usuario_id: int, procesos: int = PROCESOS_POR_DEFECTO,
+                 lineas_por_lote: int = LINEAS_POR_LOTE, al_avanzar=None):
+        """Importa ventas históricas de un CSV o JSON Lines (opcionalmente .gz).
+
+        Las ventas se cargan con su fecha original y sin efectos sobre el stock
+        actual (ni movimientos, ni turnos, ni auditoría por venta). Es
+        reanudable: las ventas ya importadas se omiten. Si se cargó algún lote,
+        al terminar (o al fallar) se reconstruyen el ranking y la caché de
+        reportes.
+        """
+        if _formato(ruta) is None:
+            return {"error": "Formato no soportado: use .csv o .jsonl (opcionalmente .gz)"}
+        if not os.path.isfile(ruta):
+            return {"error": f"No existe el archivo {ruta}"}
+        lineas_por_lote = min(max(lineas_por_lote, 100), MAX_LINEAS_POR_LOTE)
+
+        try:
+            lector = LectorLotes(ruta, lineas_por_lote)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            return {"error": f"No se pudo leer {ruta}: {str(e)}"}
+
+        progreso = {
+            "archivo": os.path.basename(ruta), "estado": "en_curso", "porcentaje": 0.0,
+            "lineas": 0, "ventas": 0, "items": 0, "omitidas": 0, "rechazadas": 0, "errores": 0,
+            "segundos": 0.0, "lineas_por_segundo": 0, "ventas_por_segundo": 0
+        }
+        errores = []
+        inicio = time.perf_counter()
+        ultimo_aviso = inicio
+
+        def registrar(resultado, lineas_lote):
+            nonlocal ultimo_aviso
+            ventas, errores_lote, rechazadas = resultado
+            insertadas, items, omitidas, conflictos = self._cargar(ventas)
+            errores_lote = sorted(errores_lote + conflictos, key=lambda error: error[0]) if conflictos else errores_lote
+            progreso["ventas"] += insertadas
+            progreso["items"] += items
+            progreso["omitidas"] += omitidas
+            progreso["rechazadas"] += rechazadas + len(conflictos)
+            progreso["errores"] += len(errores_lote)
+            errores.extend(errores_lote[:MAX_ERRORES - len(errores)])
+            progreso["lineas"] += lineas_lote
+
+            ahora = time.perf_counter()
+            segundos = ahora - inicio
+            progreso["segundos"] = round(segundos, 1)
+            progreso["porcentaje"] = round(100 * lector.bytes_leidos / max(lector.bytes_totales, 1), 1)
+            progreso["lineas_por_segundo"] = round(progreso["lineas"] / segundos) if segundos else 0
+            progreso["ventas_por_segundo"] = round(progreso["ventas"] / segundos) if segundos else 0
+            if al_avanzar is not None:
+                al_avanzar(dict(progreso))
+            if ahora - ultimo_aviso >= INTERVALO_PROGRESO:
+                ultimo_aviso = ahora
+                logger.info(
+                    "Importación %s: %.1f%%, %s líneas, %s ventas (%s líneas/s)", progreso["archivo"],
+                    progreso["porcentaje"], progreso["lineas"], progreso["ventas"], progreso["lineas_por_segundo"]
+                )
+
+        try:
+            faltantes = lector.faltantes()
+            if faltantes:
+                return {"error": f"Faltan columnas en el encabezado: {', '.join(faltantes)}"}
+
+            productos, usuarios = self._catalogos()
+            ahora = datetime.now(ZONA_HORARIA)
+            parametros = (lector.formato, lector.encabezado, lector.delimitador)
+
+            if procesos <= 1:
+                iniciar_validacion(productos, usuarios, usuario_id, ahora)
+                for primera, texto, lineas_lote in lector.lotes():
+                    registrar(validar_lote(primera, texto, *parametros), lineas_lote)
+            else:
+                # El catálogo viaja una vez por proceso; la carga en SQLite (un
+                # solo escritor) ocurre aquí mientras los procesos validan los
+                # lotes siguientes. Los lotes se cargan en el orden del archivo
+                with ProcessPoolExecutor(
+                    procesos, initializer=iniciar_validacion, initargs=(productos, usuarios, usuario_id, ahora)
+                ) as procesos_validacion:
+                    en_vuelo = deque()
+                    for primera, texto, lineas_lote in lector.lotes():
+                        en_vuelo.append((procesos_validacion.submit(validar_lote, primera, texto, *parametros),
+                                         lineas_lote))
+                        if len(en_vuelo) >= procesos * 2:
+                            futuro, lineas_lote = en_vuelo.popleft()
+                            registrar(futuro.result(), lineas_lote)
+                    while en_vuelo:
+                        futuro, lineas_lote = en_vuelo.popleft()
+                        registrar(futuro.result(), lineas_lote)
+
+            progreso["estado"] = "terminada"
+            progreso["porcentaje"] = 100.0
+            progreso["segundos"] = round(time.perf_counter() - inicio, 1)
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="importacion_ventas",
+                descripcion=(
+                    f"Importadas {progreso['ventas']} ventas históricas ({progreso['items']} items) "
+                    f"de {progreso['archivo']}; {progreso['omitidas']} ya existían, "
+                    f"{progreso['rechazadas']} rechazadas"
+                ),
+                fecha_accion=datetime.now(timezone.utc)
+            ))
+            self.db.commit()
+            logger.info(
+                "Importación %s terminada en %s s: %s ventas, %s items, %s omitidas, %s rechazadas",
+                progreso["archivo"], progreso["segundos"], progreso["ventas"], progreso["items"],
+                progreso["omitidas"], progreso["rechazadas"]
+            )
+            progreso["detalle_errores"] = [
+                {"linea": linea, "venta": referencia, "error": mensaje} for linea, referencia, mensaje in errores
+            ]
+            return progreso
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error importando ventas de %s: %s", ruta, e)
+            # Los lotes ya cargados quedan: repetir la importación los omite
+            return {"error": f"Error importando ventas: {str(e)}", "progreso": progreso}
+        finally:
+            lector.cerrar()
+            if progreso["ventas"]:
+                self._refrescar_agregados()
+
+    def _refrescar_agregados(self):
+        """Ranking en memoria y caché de reportes (el análisis ABC caduca con la versión de la caché)."""
+        try:
+            ranking_ventas.reconstruir(self.db)
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error reconstruyendo el ranking tras la importación: %s", e)
+        cache_reportes.limpiar()
+
+
+class ImportacionEnSegundoPlano:
+    """Una importación a la vez desde la API, con su progreso consultable.
+
+    Corre en un hilo propio con su sesión; al terminar deja el resultado (o el
+    error) en ``estado()``. Los archivos se toman de ``DIRECTORIO_IMPORTACION``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._estado = None
+
+    @property
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, archivo: str, usuario_id: int, procesos: int = PROCESOS_POR_DEFECTO,
+                lineas_por_lote: int = LINEAS_POR_LOTE):
+        directorio = os.path.realpath(DIRECTORIO_IMPORTACION)
+        ruta = os.path.realpath(os.path.join(directorio, archivo))
+        if os.path.dirname(ruta) != directorio:
+            return {"error": f"El archivo debe estar directamente en {DIRECTORIO_IMPORTACION}"}
+        if _formato(ruta) is None:
+            return {"error": "Formato no soportado: use .csv o .jsonl (opcionalmente .gz)"}
+        if not os.path.isfile(ruta):
+            return {"error": f"No existe el archivo {archivo} en {DIRECTORIO_IMPORTACION}"}
+
+        with self._lock:
+            if self.en_curso:
+                return {"error": "Ya hay una importación en curso"}
+            self._estado = {"archivo": archivo, "estado": "en_curso", "porcentaje": 0.0}
+            self._hilo = threading.Thread(
+                target=self._ejecutar, args=(ruta, usuario_id, max(procesos, 1), lineas_por_lote),
+                name="importacion-ventas", daemon=True
+            )
+            self._hilo.start()
+            return dict(self._estado)
+
+    def _ejecutar(self, ruta, usuario_id, procesos, lineas_por_lote):
+        db = SesionLocal()
+        try:
+            resultado = ControladorImportacion(db).importar(
+                ruta, usuario_id, procesos, lineas_por_lote, al_avanzar=self._avanzar
+            )
+            if "error" in resultado:
+                resultado = {**resultado.get("progreso", self._estado), "estado": "error", "error": resultado["error"]}
+            self._estado = resultado
+        finally:
+            db.close()
+
+    def _avanzar(self, progreso):
+        self._estado = progreso
+
+    def estado(self):
+        if self._estado is None:
+            return {"estado": "sin_importaciones"}
+        return dict(self._estado)
+
+
+# Instancia compartida por la aplicación (una por proceso)
+importacion_ventas = ImportacionEnSegundoPlano()
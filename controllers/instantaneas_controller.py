@@ -0,0 +1,192 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, insert, select, literal, DateTime
+from models.modelos import Producto, MovimientoInventario, InstantaneaStock, a_centavos, a_pesos
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Variación de stock de cada movimiento (los saldos de apertura del archivo no mueven stock)
+DELTA_MOVIMIENTO = case(
+    (MovimientoInventario.tipo_movimiento == 'entrada', MovimientoInventario.cantidad),
+    (MovimientoInventario.tipo_movimiento == 'salida', -MovimientoInventario.cantidad),
+    else_=0
+)
+
+
+class ControladorInstantaneas:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def tomar_instantanea(self):
+        try:
+            fecha = datetime.now(timezone(timedelta(hours=-5)))
+            # El último movimiento se lee en la misma sentencia que el stock: leído
+            # antes, un movimiento confirmado entre ambas quedaría en el stock de la
+            # instantánea y obtener_stock_a_fecha lo volvería a sumar
+            ultimo_movimiento = select(func.coalesce(func.max(MovimientoInventario.id), 0)).scalar_subquery()
+
+            # Un solo INSERT ... SELECT sobre todo el catálogo
+            self.db.execute(
+                insert(InstantaneaStock).from_select(
+                    ['producto_id', 'stock', 'costo', 'ultimo_movimiento_id', 'fecha_instantanea'],
+                    select(
+                        Producto.id,
+                        func.coalesce(Producto.stock_actual, 0),
+                        Producto.costo,
+                        ultimo_movimiento,
+                        literal(fecha, DateTime(timezone=True))
+                    )
+                )
+            )
+            # Misma transacción y ya con el bloqueo de escritura: el valor que usó el INSERT
+            ultimo_movimiento_id = self.db.execute(select(ultimo_movimiento)).scalar()
+            self.db.commit()
+
+            logger.info("Instantánea de stock tomada (movimiento %d)", ultimo_movimiento_id)
+            return {"mensaje": "Instantánea de stock registrada", "fecha_instantanea": fecha}
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error tomando instantánea de stock: %s", e)
+            return {"error": f"Error tomando instantánea de stock: {str(e)}"}
+
+    def tomar_instantanea_si_corresponde(self, horas: int = 24):
+        ultima = self.db.query(func.max(InstantaneaStock.fecha_instantanea)).scalar()
+        limite = datetime.now(timezone(timedelta(hours=-5))).replace(tzinfo=None) - timedelta(hours=horas)
+        if ultima is None or ultima.replace(tzinfo=None) <= limite:
+            return self.tomar_instantanea()
+        return None
+
+    def _deltas(self, filtros: list, producto_id: int = None):
+        query = self.db.query(
+            MovimientoInventario.producto_id,
+            func.sum(DELTA_MOVIMIENTO).label('delta')
+        ).filter(*filtros)
+        if producto_id:
+            query = query.filter(MovimientoInventario.producto_id == producto_id)
+        return {fila.producto_id: fila.delta or 0 for fila in query.group_by(MovimientoInventario.producto_id)}
+
+    def obtener_stock_a_fecha(self, fecha: datetime, producto_id: int = None):
+        """Stock de cada producto en ``fecha``: instantánea más cercana más los movimientos posteriores.
+
+        Si no hay instantánea anterior a la fecha se parte de la siguiente (o del
+        stock actual) y se restan los movimientos ocurridos después de la fecha.
+        """
+        try:
+            siguiente = None
+            anterior = self.db.query(func.max(InstantaneaStock.fecha_instantanea)).filter(
+                InstantaneaStock.fecha_instantanea <= fecha
+            ).scalar()
+
+            if anterior is None:
+                siguiente = self.db.query(func.min(InstantaneaStock.fecha_instantanea)).filter(
+                    InstantaneaStock.fecha_instantanea > fecha
+                ).scalar()
+
+            productos = self.db.query(
+                Producto.id, Producto.codigo, Producto.nombre, Producto.categoria,
+                Producto.stock_actual, Producto.costo
+            )
+            if producto_id:
+                productos = productos.filter(Producto.id == producto_id)
+            productos = productos.all()
+
+            if anterior is not None or siguiente is not None:
+                base = self.db.query(
+                    InstantaneaStock.producto_id,
+                    InstantaneaStock.stock,
+                    InstantaneaStock.costo,
+                    InstantaneaStock.ultimo_movimiento_id
+                ).filter(InstantaneaStock.fecha_instantanea == (anterior or siguiente))
+                if producto_id:
+                    base = base.filter(InstantaneaStock.producto_id == producto_id)
+                base = {fila.producto_id: fila for fila in base}
+                ultimo_movimiento_id = max((fila.ultimo_movimiento_id for fila in base.values()), default=0)
+                origen = 'instantanea'
+            else:
+                # Sin instantáneas: el stock actual es la referencia
+                base = {}
+                ultimo_movimiento_id = self.db.query(func.max(MovimientoInventario.id)).scalar() or 0
+                origen = 'stock_actual'
+
+            if anterior is not None:
+                # Hacia adelante: movimientos posteriores a la instantánea hasta la fecha
+                deltas = self._deltas([
+                    MovimientoInventario.id > ultimo_movimiento_id,
+                    MovimientoInventario.fecha_movimiento <= fecha
+                ], producto_id)
+                signo = 1
+            else:
+                # Hacia atrás: movimientos después de la fecha ya incluidos en la referencia
+                deltas = self._deltas([
+                    MovimientoInventario.id <= ultimo_movimiento_id,
+                    MovimientoInventario.fecha_movimiento > fecha
+                ], producto_id)
+                signo = -1
+
+            resultado = []
+            valor_total = 0
+            for p in productos:
+                fila = base.get(p.id)
+                if fila is not None:
+                    stock_base, costo = fila.stock, fila.costo
+                elif origen == 'stock_actual':
+                    stock_base, costo = p.stock_actual or 0, p.costo
+                else:
+                    # Producto creado después de la instantánea
+                    stock_base, costo = 0, p.costo
+                stock = stock_base + signo * deltas.get(p.id, 0)
+                valor = stock * a_centavos(costo)
+                valor_total += valor
+                resultado.append({
+                    'producto_id': p.id,
+                    'codigo': p.codigo,
+                    'nombre': p.nombre,
+                    'categoria': p.categoria,
+                    'stock': stock,
+                    'costo': costo,
+                    'valor': a_pesos(valor)
+                })
+
+            return {
+                'fecha': fecha,
+                'origen': origen,
+                'fecha_instantanea': anterior or siguiente,
+                'valor_total': a_pesos(valor_total),
+                'productos': resultado
+            }
+
+        except Exception as e:
+            logger.error("Error calculando stock a fecha: %s", e)
+            return {"error": f"Error calculando stock a fecha: {str(e)}"}
+
+    def obtener_serie_stock(self, producto_id: int, fecha_inicio: datetime, fecha_fin: datetime):
+        """Stock de cierre diario de un producto entre dos fechas."""
+        try:
+            inicial = self.obtener_stock_a_fecha(fecha_inicio, producto_id)
+            if 'error' in inicial:
+                return inicial
+            if not inicial['productos']:
+                return {"error": "Producto no encontrado"}
+
+            dia = func.date(MovimientoInventario.fecha_movimiento)
+            variaciones = dict(self.db.query(dia, func.sum(DELTA_MOVIMIENTO)).filter(
+                MovimientoInventario.producto_id == producto_id,
+                MovimientoInventario.fecha_movimiento > fecha_inicio,
+                MovimientoInventario.fecha_movimiento <= fecha_fin
+            ).group_by(dia).all())
+
+            stock = inicial['productos'][0]['stock']
+            serie = []
+            actual = fecha_inicio.date()
+            while actual <= fecha_fin.date():
+                stock += variaciones.get(actual.isoformat(), 0) or 0
+                serie.append({'fecha': actual, 'stock': stock})
+                actual += timedelta(days=1)
+
+            return serie
+
+        except Exception as e:
+            logger.error("Error calculando serie de stock: %s", e)
+            return {"error": f"Error calculando serie de stock: {str(e)}"}
@@ -1,18 +1,54 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from models.modelos import Producto, MovimientoInventario, RegistroAuditoria
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import case, func, literal, select, tuple_, DateTime
+from models.modelos import Producto, MovimientoInventario, RegistroAuditoria, Usuario
+from models import consultas
+from controllers.ranking_controller import ranking_ventas
+from controllers.archivo_controller import TIPO_SALDO_INICIAL
 from datetime import datetime, timedelta, timezone
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tipos que registrar_movimiento acepta; el resto de los cálculos (DELTA_LIBRO,
+# conciliación, stock a fecha) solo sabe sumar o restar estos dos
+TIPOS_MOVIMIENTO = ('entrada', 'salida')
+
+# Variación de stock de cada asiento del libro; el saldo inicial del archivo abre la cadena desde 0
+DELTA_LIBRO = case(
+    (MovimientoInventario.tipo_movimiento == 'entrada', MovimientoInventario.cantidad),
+    (MovimientoInventario.tipo_movimiento == 'salida', -MovimientoInventario.cantidad),
+    (MovimientoInventario.tipo_movimiento == TIPO_SALDO_INICIAL, MovimientoInventario.cantidad),
+    else_=0
+)
+
+
+def _escribir_cursor(estado: dict):
+    return base64.urlsafe_b64encode(json.dumps(estado, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def _leer_cursor(cursor: str):
+    try:
+        estado = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        datetime.fromisoformat(estado['fecha'])
+        int(estado['id'])
+        return estado
+    except Exception:
+        raise ValueError("Cursor inválido")
+
 class ControladorInventario:
     def __init__(self, db: Session):
         self.db = db
     
     def registrar_movimiento(self, datos_movimiento: dict, usuario_id: int):
         try:
-            producto = self.db.query(Producto).filter(Producto.id == datos_movimiento['producto_id']).first()
+            if datos_movimiento.get('tipo_movimiento') not in TIPOS_MOVIMIENTO:
+                return {"error": "Tipo de movimiento no válido: use entrada o salida"}
+            
+            producto = self.db.execute(
+                consultas.PRODUCTO_POR_ID, {"producto_id": datos_movimiento['producto_id']}
+            ).scalar()
             if not producto:
                 return {"error": "Producto no encontrado"}
             
@@ -77,47 +113,189 @@ class ControladorInventario:
         except Exception as e:
             return {"error": f"Error verificando alertas: {str(e)}"}
     
-    def obtener_historial_movimientos(self, producto_id: int = None, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+    def obtener_historial_movimientos(self, producto_id: int = None, fecha_inicio: datetime = None, fecha_fin: datetime = None, incluir_archivo: bool = False):
         try:
-            query = self.db.query(MovimientoInventario)
+            query = self.db.query(MovimientoInventario).options(
+                joinedload(MovimientoInventario.producto),
+                joinedload(MovimientoInventario.usuario)
+            )
             
             if producto_id:
                 query = query.filter(MovimientoInventario.producto_id == producto_id)
             
-            if fecha_inicio and fecha_fin:
-                query = query.filter(and_(
-                    MovimientoInventario.fecha_movimiento >= fecha_inicio,
-                    MovimientoInventario.fecha_movimiento <= fecha_fin
-                ))
+            if fecha_inicio:
+                query = query.filter(MovimientoInventario.fecha_movimiento >= fecha_inicio)
+            if fecha_fin:
+                query = query.filter(MovimientoInventario.fecha_movimiento <= fecha_fin)
             
             movimientos = query.order_by(MovimientoInventario.fecha_movimiento.desc()).all()
+            
+            if incluir_archivo:
+                from controllers.archivo_controller import ControladorArchivo
+                
+                archivados = ControladorArchivo(self.db).leer_movimientos_archivados(
+                    producto_id, fecha_inicio, fecha_fin
+                )
+                archivados.sort(key=lambda m: m.fecha_movimiento, reverse=True)
+                movimientos = movimientos + archivados
+            
             return movimientos
             
         except Exception as e:
             return {"error": f"Error obteniendo historial: {str(e)}"}
     
-    def obtener_productos_mas_vendidos(self, limite: int = 10, dias: int = 7):
+    def _stock_apertura(self, producto_id: int, fecha_inicio: datetime = None):
+        """Stock del producto antes del periodo según la cadena de movimientos.
+
+        Es el ``stock_nuevo`` del último movimiento anterior al periodo o, si
+        no lo hay, el ``stock_anterior`` del primero (stock inicial del producto,
+        0 para un ``saldo_inicial``). Ambos son una búsqueda en el índice.
+        """
+        if fecha_inicio:
+            anterior = self.db.execute(
+                select(MovimientoInventario.stock_nuevo)
+                .where(
+                    MovimientoInventario.producto_id == producto_id,
+                    MovimientoInventario.fecha_movimiento < fecha_inicio
+                )
+                .order_by(MovimientoInventario.fecha_movimiento.desc(), MovimientoInventario.id.desc())
+                .limit(1)
+            ).scalar()
+            if anterior is not None:
+                return anterior
+        
+        primero = select(MovimientoInventario.stock_anterior).where(MovimientoInventario.producto_id == producto_id)
+        if fecha_inicio:
+            primero = primero.where(MovimientoInventario.fecha_movimiento >= fecha_inicio)
+        return self.db.execute(
+            primero.order_by(MovimientoInventario.fecha_movimiento, MovimientoInventario.id).limit(1)
+        ).scalar() or 0
+    
+    def obtener_libro_movimientos(self, producto_id: int = None, fecha_inicio: datetime = None,
+                                  fecha_fin: datetime = None, cursor: str = None, limite: int = 100):
+        """Página del libro de movimientos en orden cronológico con saldo acumulado.
+        
+        La paginación es por cursor sobre (fecha_movimiento, id), así cada
+        página cuesta lo mismo sin importar su posición. Con ``producto_id`` el
+        saldo se arrastra en el cursor junto con el stock de apertura y cierre
+        del periodo (calculados en la primera página); sin él, el saldo de cada
+        producto parte del ``stock_anterior`` de su primer movimiento en la página.
+        """
         try:
-            from sqlalchemy import func
-            from models.modelos import ItemVenta, Venta
+            estado = _leer_cursor(cursor) if cursor else None
             
-            fecha_limite = datetime.utcnow() - timedelta(days=dias)
+            filtros = []
+            if producto_id:
+                filtros.append(MovimientoInventario.producto_id == producto_id)
+            if fecha_inicio:
+                filtros.append(MovimientoInventario.fecha_movimiento >= fecha_inicio)
+            if fecha_fin:
+                filtros.append(MovimientoInventario.fecha_movimiento <= fecha_fin)
+            
+            if estado:
+                apertura, cierre, saldo_previo = estado['apertura'], estado['cierre'], estado['saldo']
+                filtros.append(tuple_(MovimientoInventario.fecha_movimiento, MovimientoInventario.id) > tuple_(
+                    literal(datetime.fromisoformat(estado['fecha']), DateTime(timezone=True)),
+                    literal(estado['id'])
+                ))
+            elif producto_id:
+                apertura = self._stock_apertura(producto_id, fecha_inicio)
+                variacion = self.db.execute(
+                    select(func.coalesce(func.sum(DELTA_LIBRO), 0)).where(*filtros)
+                ).scalar()
+                cierre = apertura + variacion
+                saldo_previo = apertura
+            else:
+                apertura = cierre = saldo_previo = None
             
-            productos_vendidos = (self.db.query(
-                    ItemVenta.producto_id,
-                    Producto.nombre,
-                    func.sum(ItemVenta.cantidad).label('total_vendido')
+            # La página se limita antes de calcular las ventanas
+            pagina = (
+                select(
+                    MovimientoInventario.id,
+                    MovimientoInventario.fecha_movimiento,
+                    MovimientoInventario.producto_id,
+                    Producto.nombre.label('producto'),
+                    MovimientoInventario.tipo_movimiento,
+                    MovimientoInventario.cantidad,
+                    MovimientoInventario.stock_anterior,
+                    MovimientoInventario.stock_nuevo,
+                    MovimientoInventario.motivo,
+                    Usuario.nombre.label('usuario'),
+                    DELTA_LIBRO.label('variacion')
                 )
-                .join(Producto)
-                .join(Venta)
-                .filter(Venta.fecha_venta >= fecha_limite)
-                .filter(Venta.estado == 'completada')
-                .group_by(ItemVenta.producto_id, Producto.nombre)
-                .order_by(func.sum(ItemVenta.cantidad).desc())
-                .limit(limite)
-                .all())
+                .join(Producto, MovimientoInventario.producto_id == Producto.id)
+                .join(Usuario, MovimientoInventario.usuario_id == Usuario.id)
+                .where(*filtros)
+                .order_by(MovimientoInventario.fecha_movimiento, MovimientoInventario.id)
+                .limit(limite + 1)
+                .subquery()
+            )
+            orden = (pagina.c.fecha_movimiento, pagina.c.id)
+            if producto_id:
+                saldo = literal(saldo_previo) + func.sum(pagina.c.variacion).over(order_by=orden, rows=(None, 0))
+            else:
+                saldo = func.first_value(pagina.c.stock_anterior).over(
+                    partition_by=pagina.c.producto_id, order_by=orden
+                ) + func.sum(pagina.c.variacion).over(
+                    partition_by=pagina.c.producto_id, order_by=orden, rows=(None, 0)
+                )
+            
+            filas = self.db.execute(select(pagina, saldo.label('saldo')).order_by(*orden)).all()
+            
+            siguiente = None
+            if len(filas) > limite:
+                filas = filas[:limite]
+                ultima = filas[-1]
+                siguiente = _escribir_cursor({
+                    'fecha': ultima.fecha_movimiento.isoformat(),
+                    'id': ultima.id,
+                    'saldo': ultima.saldo if producto_id else None,
+                    'apertura': apertura,
+                    'cierre': cierre
+                })
             
-            return productos_vendidos
+            return {
+                'producto_id': producto_id,
+                'stock_apertura': apertura,
+                'stock_cierre': cierre,
+                'movimientos': [
+                    {
+                        'id': fila.id,
+                        'fecha_movimiento': fila.fecha_movimiento,
+                        'producto_id': fila.producto_id,
+                        'producto': fila.producto,
+                        'tipo_movimiento': fila.tipo_movimiento,
+                        'cantidad': fila.cantidad,
+                        'stock_anterior': fila.stock_anterior,
+                        'stock_nuevo': fila.stock_nuevo,
+                        'saldo': fila.saldo,
+                        'motivo': fila.motivo,
+                        'usuario': fila.usuario
+                    }
+                    for fila in filas
+                ],
+                'siguiente_cursor': siguiente
+            }
+            
+        except Exception as e:
+            logger.error("Error obteniendo libro de movimientos: %s", e)
+            return {"error": f"Error obteniendo libro de movimientos: {str(e)}"}
+    
+    def obtener_productos_mas_vendidos(self, limite: int = 10, dias: int = 7):
+        try:
+            # Las ventanas recientes se responden desde el ranking en memoria
+            ventana = {1: 'hoy', 7: '7d', 30: '30d'}.get(dias)
+            if ventana:
+                return ranking_ventas.top(ventana, limite)
+            
+            from controllers.reportes_controller import ControladorReportes
+            
+            fecha_fin = datetime.now(timezone(timedelta(hours=-5)))
+            fecha_inicio = fecha_fin - timedelta(days=dias)
+            productos_vendidos = ControladorReportes(self.db).obtener_productos_mas_vendidos(
+                fecha_inicio, fecha_fin
+            )
+            return productos_vendidos[:limite]
             
         except Exception as e:
             return {"error": f"Error obteniendo productos más vendidos: {str(e)}"}
@@ -125,7 +303,7 @@ class ControladorInventario:
         
     def obtener_producto_por_id(self, producto_id: int):
         try:
-            producto = self.db.query(Producto).filter(Producto.id == producto_id).first()
+            producto = self.db.execute(consultas.PRODUCTO_POR_ID, {"producto_id": producto_id}).scalar()
             return producto
         except Exception as e:
             return {"error": f"Error obteniendo producto: {str(e)}"}
\ No newline at end of file
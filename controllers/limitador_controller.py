@@ -0,0 +1,206 @@
+from sqlalchemy.orm import Session
+from models.modelos import RegistroAuditoria
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cubetas: capacidad (ráfaga permitida) y tokens repuestos por segundo
+CAPACIDAD_EMAIL = 5
+REPOSICION_EMAIL = 1 / 30
+CAPACIDAD_IP = 20
+REPOSICION_IP = 1.0
+
+# Espera exponencial por (email, IP) a partir del tercer fallo consecutivo: 1, 2, 4... hasta 5 minutos
+FALLOS_SIN_ESPERA = 2
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 300.0
+
+# Verificaciones de bcrypt simultáneas; el resto espera su turno hasta
+# ESPERA_VERIFICACION segundos antes de rechazarse
+MAX_VERIFICACIONES = 2
+ESPERA_VERIFICACION = 2.0
+
+# Claves inactivas que se descartan cuando el diccionario crece
+MAX_CLAVES = 10000
+INACTIVIDAD_CLAVE = 3600
+
+
+class CubetaTokens:
+    __slots__ = ('capacidad', 'reposicion', 'tokens', 'actualizada')
+
+    def __init__(self, capacidad: float, reposicion: float, ahora: float):
+        self.capacidad = capacidad
+        self.reposicion = reposicion
+        self.tokens = capacidad
+        self.actualizada = ahora
+
+    def _reponer(self, ahora: float):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizada) * self.reposicion)
+        self.actualizada = ahora
+
+    def espera(self, ahora: float):
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)."""
+        self._reponer(ahora)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.reposicion
+
+    def consumir(self):
+        self.tokens -= 1
+
+
+class _EstadoClave:
+    __slots__ = ('cubeta', 'fallos', 'bloqueada_hasta', 'ultimo_uso')
+
+    def __init__(self, cubeta: CubetaTokens, ahora: float):
+        self.cubeta = cubeta
+        self.fallos = 0
+        self.bloqueada_hasta = 0.0
+        self.ultimo_uso = ahora
+
+
+class LimitadorLogin:
+    """Limita los intentos de login por email y por IP antes de tocar bcrypt o la base.
+
+    Todo intento paga un token de la cubeta de su IP. La cubeta del email
+    solo la pagan (y la esperan) los pares (email, IP) con fallos
+    recientes: frena a quien prueba contraseñas contra una cuenta desde
+    varias IP, pero una caja sin fallos entra aunque otra máquina la haya
+    agotado, y las cajas que comparten una cuenta no la gastan. Los fallos
+    consecutivos agregan además una espera exponencial al par. Los fallos y
+    rechazos se acumulan en memoria y se escriben como registros de
+    auditoría resumidos (``registrar_resumen``).
+    """
+
+    def __init__(self):
+        self.activo = True
+        self._lock = threading.Lock()
+        self._claves = {}
+        self._verificaciones = threading.BoundedSemaphore(MAX_VERIFICACIONES)
+        # (email, ip) -> [fallidos, rechazados]
+        self._pendientes = {}
+        self._desde = datetime.now(timezone(timedelta(hours=-5)))
+
+    def _estado(self, clave: str, ahora: float, capacidad: float = None, reposicion: float = None):
+        estado = self._claves.get(clave)
+        if estado is None:
+            if len(self._claves) >= MAX_CLAVES:
+                self._podar(ahora)
+            cubeta = CubetaTokens(capacidad, reposicion, ahora) if capacidad else None
+            estado = _EstadoClave(cubeta, ahora)
+            self._claves[clave] = estado
+        estado.ultimo_uso = ahora
+        return estado
+
+    def _podar(self, ahora: float):
+        self._claves = {
+            clave: estado for clave, estado in self._claves.items()
+            if ahora - estado.ultimo_uso < INACTIVIDAD_CLAVE or estado.bloqueada_hasta > ahora
+        }
+
+    def _estados(self, email: str, ip: str, ahora: float):
+        """Estados del email, de la IP y del par (este último sin cubeta, solo fallos)."""
+        email = (email or '').strip().lower()
+        return (
+            self._estado(f"email:{email}", ahora, CAPACIDAD_EMAIL, REPOSICION_EMAIL),
+            self._estado(f"ip:{ip}", ahora, CAPACIDAD_IP, REPOSICION_IP),
+            self._estado(f"par:{email}|{ip}", ahora)
+        )
+
+    def verificar(self, email: str, ip: str):
+        """Segundos que debe esperar el cliente; 0 si el intento puede continuar."""
+        if not self.activo:
+            return 0.0
+        ahora = time.monotonic()
+        with self._lock:
+            por_email, por_ip, par = self._estados(email, ip, ahora)
+            cubetas = (por_ip.cubeta, por_email.cubeta) if par.fallos else (por_ip.cubeta,)
+            espera = max(par.bloqueada_hasta - ahora, *(cubeta.espera(ahora) for cubeta in cubetas))
+            if espera > 0:
+                self._acumular(email, ip, 1)
+                return espera
+            for cubeta in cubetas:
+                cubeta.consumir()
+            return 0.0
+
+    def registrar_fallo(self, email: str, ip: str):
+        ahora = time.monotonic()
+        with self._lock:
+            # La espera se aplica al par: ni la cuenta ni la IP (quizá compartida
+            # por varias cajas) quedan bloqueadas para los demás
+            _, _, estado = self._estados(email, ip, ahora)
+            estado.fallos += 1
+            if estado.fallos > FALLOS_SIN_ESPERA:
+                espera = min(ESPERA_BASE * 2 ** (estado.fallos - FALLOS_SIN_ESPERA - 1), ESPERA_MAXIMA)
+                estado.bloqueada_hasta = ahora + espera
+            self._acumular(email, ip, 0)
+
+    def registrar_exito(self, email: str, ip: str):
+        ahora = time.monotonic()
+        with self._lock:
+            _, _, par = self._estados(email, ip, ahora)
+            par.fallos = 0
+            par.bloqueada_hasta = 0.0
+
+    def _acumular(self, email: str, ip: str, indice: int):
+        contador = self._pendientes.setdefault(((email or '').strip().lower(), ip), [0, 0])
+        contador[indice] += 1
+
+    def ocupar_verificacion(self, espera: float = ESPERA_VERIFICACION):
+        """Reserva un cupo de verificación de contraseña esperando hasta ``espera`` segundos.
+
+        Devuelve True si tomó un cupo, False si el limitador está apagado (no
+        hace falta) y None si no se liberó ninguno. El valor se pasa a
+        ``liberar_verificacion``: así apagar o encender el limitador con
+        peticiones en curso no desbalancea el semáforo. Bloquea: llamar
+        fuera del event loop.
+        """
+        if not self.activo:
+            return False
+        return True if self._verificaciones.acquire(timeout=espera) else None
+
+    def liberar_verificacion(self, cupo: bool):
+        if cupo:
+            self._verificaciones.release()
+
+    def registrar_resumen(self, db: Session):
+        """Escribe un registro de auditoría por (email, IP) con los fallos acumulados."""
+        ahora = datetime.now(timezone(timedelta(hours=-5)))
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            desde, self._desde = self._desde, ahora
+
+        if not pendientes:
+            return 0
+
+        try:
+            for (email, ip), (fallidos, rechazados) in pendientes.items():
+                db.add(RegistroAuditoria(
+                    tipo_accion="login_fallido",
+                    descripcion=(
+                        f"Intentos de login fallidos para email: {email} entre "
+                        f"{desde:%Y-%m-%d %H:%M:%S} y {ahora:%H:%M:%S}: "
+                        f"{fallidos} fallidos, {rechazados} rechazados por límite"
+                    ),
+                    fecha_accion=ahora,
+                    ip_address=ip
+                ))
+            db.commit()
+            return len(pendientes)
+        except Exception as e:
+            db.rollback()
+            # Se devuelven los contadores para el próximo resumen
+            with self._lock:
+                for clave, (fallidos, rechazados) in pendientes.items():
+                    contador = self._pendientes.setdefault(clave, [0, 0])
+                    contador[0] += fallidos
+                    contador[1] += rechazados
+            logger.error("Error registrando resumen de logins fallidos: %s", e)
+            return 0
+
+
+# Instancia compartida por la aplicación (una por proceso)
+limitador_login = LimitadorLogin()
@@ -0,0 +1,371 @@
+from sqlalchemy.orm import Session
+from controllers.ranking_controller import ranking_ventas
+from controllers.cache_reportes_controller import cache_reportes
+from controllers.instantaneas_controller import ControladorInstantaneas
+from controllers.archivo_controller import ControladorArchivo
+from controllers.limitador_controller import limitador_login
+from controllers.conciliacion_controller import ControladorConciliacion
+from controllers.promociones_controller import motor_promociones
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+# Horas locales de baja actividad para las tareas pesadas, "inicio-fin" (fin excluido)
+VENTANA_MANTENIMIENTO = os.environ.get("STOREVISION_VENTANA_MANTENIMIENTO", "0-6")
+
+# Cada cuántos segundos el planificador revisa qué tareas corresponden
+INTERVALO_REVISION = 60
+
+# Páginas liberadas por cada ejecución de VACUUM incremental
+PAGINAS_VACUUM = 2000
+
+MAX_HISTORIAL = 200
+
+
+class TiempoAgotado(Exception):
+    pass
+
+
+def _ventana(texto: str):
+    inicio, _, fin = texto.partition("-")
+    return int(inicio), int(fin)
+
+
+def en_ventana(hora: int, ventana: tuple):
+    inicio, fin = ventana
+    if inicio <= fin:
+        return inicio <= hora < fin
+    # Ventana que cruza la medianoche, p. ej. 22-5
+    return hora >= inicio or hora < fin
+
+
+# Tareas: reciben una conexión y devuelven un detalle para el historial
+
+def refrescar_agregados(conexion):
+    db = Session(bind=conexion)
+    try:
+        ranking_ventas.reconstruir(db)
+        # Recalcula y deja en caché los días cerrados del último mes
+        cache_reportes.limpiar()
+        ayer = datetime.now(ZONA_HORARIA).date() - timedelta(days=1)
+        cache_reportes.obtener(
+            db,
+            datetime.combine(ayer - timedelta(days=34), datetime.min.time()),
+            datetime.combine(ayer, datetime.max.time())
+        )
+        return "Ranking reconstruido y 35 días de reportes en caché"
+    finally:
+        db.close()
+
+
+def tomar_instantanea(conexion):
+    db = Session(bind=conexion)
+    try:
+        resultado = ControladorInstantaneas(db).tomar_instantanea_si_corresponde()
+        if resultado and 'error' in resultado:
+            raise RuntimeError(resultado['error'])
+        return "Instantánea tomada" if resultado else "Instantánea vigente"
+    finally:
+        db.close()
+
+
+def archivar_historicos(conexion):
+    db = Session(bind=conexion)
+    try:
+        resultado = ControladorArchivo(db).archivar()
+        if 'error' in resultado:
+            raise RuntimeError(resultado['error'])
+        return resultado.get('mensaje', 'Archivo actualizado')
+    finally:
+        db.close()
+
+
+def conciliar_stock(conexion):
+    db = Session(bind=conexion)
+    try:
+        resultado = ControladorConciliacion(db).conciliar()
+        if 'error' in resultado:
+            raise RuntimeError(resultado['error'])
+        return (
+            f"{resultado['movimientos_procesados']} movimientos, {resultado['diferencias']} diferencias, "
+            f"{resultado['rupturas_nuevas']} rupturas nuevas"
+        )
+    finally:
+        db.close()
+
+
+def resumir_logins_fallidos(conexion):
+    db = Session(bind=conexion)
+    try:
+        return f"{limitador_login.registrar_resumen(db)} resúmenes de login fallido"
+    finally:
+        db.close()
+
+
+def recargar_promociones(conexion):
+    # Cambios hechos desde otro proceso (varios workers) llegan aquí
+    db = Session(bind=conexion)
+    try:
+        if motor_promociones.recargar_si_cambio(db):
+            return f"Promociones recompiladas: {motor_promociones.reglas} reglas"
+        return "Promociones sin cambios"
+    finally:
+        db.close()
+
+
+def optimizar_estadisticas(conexion):
+    # Sin estadísticas previas se hace un ANALYZE completo; luego basta PRAGMA optimize
+    tiene_estadisticas = conexion.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).first()
+    if not tiene_estadisticas:
+        conexion.exec_driver_sql("ANALYZE")
+        return "ANALYZE completo"
+    conexion.exec_driver_sql("PRAGMA analysis_limit = 1000")
+    conexion.exec_driver_sql("PRAGMA optimize")
+    return "PRAGMA optimize"
+
+
+def _auto_vacuum(conexion):
+    # PRAGMA auto_vacuum responde con la cabecera que la conexión tenía en memoria;
+    # leer el esquema la refresca si otra conexión reconstruyó el archivo
+    conexion.exec_driver_sql("SELECT 1 FROM sqlite_master LIMIT 1").first()
+    return conexion.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+
+
+def activar_vacuum_incremental(conexion):
+    if _auto_vacuum(conexion) == 2:
+        return "auto_vacuum incremental ya estaba activo"
+    # El modo incremental solo se activa reconstruyendo el archivo una vez
+    conexion.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    conexion.exec_driver_sql("VACUUM")
+    return "auto_vacuum incremental activado (VACUUM completo)"
+
+
+def vacuum_incremental(conexion):
+    if _auto_vacuum(conexion) != 2:
+        # La reconstrucción completa no se intenta cada noche: es una tarea aparte
+        raise RuntimeError("auto_vacuum no es incremental: ejecute la tarea activar_vacuum_incremental")
+    libres = conexion.exec_driver_sql("PRAGMA freelist_count").scalar()
+    conexion.exec_driver_sql(f"PRAGMA incremental_vacuum({PAGINAS_VACUUM})")
+    return f"{min(libres, PAGINAS_VACUUM)} de {libres} páginas libres liberadas"
+
+
+def checkpoint_wal(conexion):
+    ocupado, paginas_wal, copiadas = conexion.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").first()
+    if paginas_wal < 0:
+        return "La base de datos no usa WAL"
+    return f"{copiadas} de {paginas_wal} páginas del WAL copiadas" + (" (base ocupada)" if ocupado else "")
+
+
+def verificar_integridad(conexion):
+    problemas = [fila[0] for fila in conexion.exec_driver_sql("PRAGMA quick_check")]
+    if problemas != ["ok"]:
+        raise RuntimeError("; ".join(problemas[:10]))
+    return "ok"
+
+
+class Tarea:
+    def __init__(self, nombre: str, funcion, intervalo: timedelta, tiempo_maximo: float,
+                 fuera_de_horario: bool = False, autocommit: bool = False,
+                 activa: bool = True, al_iniciar: bool = True):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = intervalo
+        # Segundos antes de interrumpir la consulta en curso; None, sin límite
+        self.tiempo_maximo = tiempo_maximo
+        # Solo dentro de la ventana de mantenimiento
+        self.fuera_de_horario = fuera_de_horario
+        # PRAGMA y VACUUM no pueden ejecutarse dentro de una transacción
+        self.autocommit = autocommit
+        self.activa = activa
+        self.al_iniciar = al_iniciar
+        self.ultima_ejecucion = None
+        self.ejecuciones = 0
+        self.errores = 0
+        self.duracion_total = 0.0
+        self.duracion_maxima = 0.0
+        self.ultimo_estado = None
+
+    def metricas(self):
+        return {
+            'nombre': self.nombre,
+            'activa': self.activa,
+            'intervalo_horas': self.intervalo.total_seconds() / 3600,
+            'tiempo_maximo_s': self.tiempo_maximo,
+            'fuera_de_horario': self.fuera_de_horario,
+            'ultima_ejecucion': self.ultima_ejecucion,
+            'ultimo_estado': self.ultimo_estado,
+            'ejecuciones': self.ejecuciones,
+            'errores': self.errores,
+            'duracion_promedio_ms': round(self.duracion_total / self.ejecuciones * 1000, 1) if self.ejecuciones else None,
+            'duracion_maxima_ms': round(self.duracion_maxima * 1000, 1)
+        }
+
+
+def tareas_por_defecto():
+    return [
+        Tarea('instantanea_stock', tomar_instantanea, timedelta(hours=1), 60, al_iniciar=False),
+        Tarea('resumen_logins_fallidos', resumir_logins_fallidos, timedelta(minutes=1), 30),
+        Tarea('recargar_promociones', recargar_promociones, timedelta(minutes=1), 30, al_iniciar=False),
+        Tarea('checkpoint_wal', checkpoint_wal, timedelta(minutes=15), 30, autocommit=True),
+        Tarea('refrescar_agregados', refrescar_agregados, timedelta(hours=24), 300,
+              fuera_de_horario=True, al_iniciar=False),
+        Tarea('conciliar_stock', conciliar_stock, timedelta(hours=24), 600,
+              fuera_de_horario=True),
+        Tarea('optimizar_estadisticas', optimizar_estadisticas, timedelta(hours=24), 120,
+              fuera_de_horario=True, autocommit=True),
+        Tarea('vacuum_incremental', vacuum_incremental, timedelta(hours=24), 300,
+              fuera_de_horario=True, autocommit=True),
+        # VACUUM completo de una sola vez: se ejecuta a mano y sin tiempo máximo,
+        # porque interrumpirlo descarta todo lo reconstruido
+        Tarea('activar_vacuum_incremental', activar_vacuum_incremental, timedelta(days=30), None,
+              autocommit=True, activa=False),
+        Tarea('verificar_integridad', verificar_integridad, timedelta(hours=24), 300,
+              fuera_de_horario=True, autocommit=True),
+        # Borra datos de la base: se habilita explícitamente
+        Tarea('archivar_historicos', archivar_historicos, timedelta(days=30), 600,
+              fuera_de_horario=True,
+              activa=os.environ.get("STOREVISION_ARCHIVAR_AUTOMATICO") == "1"),
+    ]
+
+
+class PlanificadorMantenimiento:
+    """Ejecuta tareas de mantenimiento en un hilo de fondo.
+
+    Las tareas pesadas solo corren dentro de la ventana de baja actividad.
+    Cada ejecución tiene un tiempo máximo: un manejador de progreso de SQLite
+    interrumpe la consulta en curso al vencer el plazo. Se guarda un historial
+    de ejecuciones y métricas de duración por tarea.
+    """
+
+    def __init__(self, motor=None, tareas: list = None, ventana: str = VENTANA_MANTENIMIENTO,
+                 intervalo_revision: float = INTERVALO_REVISION):
+        self.motor = motor
+        self.tareas = {tarea.nombre: tarea for tarea in (tareas if tareas is not None else tareas_por_defecto())}
+        self.ventana = _ventana(ventana)
+        self.intervalo_revision = intervalo_revision
+        self.historial = deque(maxlen=MAX_HISTORIAL)
+        self._lock = threading.Lock()
+        self._ejecutando = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self, motor=None):
+        if motor is not None:
+            self.motor = motor
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        ahora = datetime.now(ZONA_HORARIA)
+        for tarea in self.tareas.values():
+            if not tarea.al_iniciar and tarea.ultima_ejecucion is None:
+                # El arranque de la aplicación ya hizo este trabajo
+                tarea.ultima_ejecucion = ahora
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name="mantenimiento", daemon=True)
+        self._hilo.start()
+        logger.info("Planificador de mantenimiento iniciado (ventana %d-%d h)", *self.ventana)
+
+    def detener(self, espera: float = 5):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+            self._hilo = None
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            try:
+                for tarea in self._pendientes(datetime.now(ZONA_HORARIA)):
+                    if self._detener.is_set():
+                        break
+                    self.ejecutar(tarea.nombre)
+            except Exception as e:
+                logger.error("Error en el planificador de mantenimiento: %s", e)
+            self._detener.wait(self.intervalo_revision)
+
+    def _pendientes(self, ahora: datetime):
+        fuera_de_horario = en_ventana(ahora.hour, self.ventana)
+        return [
+            tarea for tarea in self.tareas.values()
+            if tarea.activa
+            and (fuera_de_horario or not tarea.fuera_de_horario)
+            and (tarea.ultima_ejecucion is None or ahora - tarea.ultima_ejecucion >= tarea.intervalo)
+        ]
+
+    def ejecutar(self, nombre: str):
+        """Ejecuta una tarea ahora, con su tiempo máximo. Devuelve el registro del historial."""
+        tarea = self.tareas.get(nombre)
+        if tarea is None:
+            return {"error": f"Tarea desconocida: {nombre}"}
+
+        # Una tarea a la vez: VACUUM y ANALYZE compiten por el mismo archivo
+        with self._ejecutando:
+            inicio = time.perf_counter()
+            fecha_inicio = datetime.now(ZONA_HORARIA)
+            limite = inicio + tarea.tiempo_maximo if tarea.tiempo_maximo is not None else float('inf')
+            estado, detalle = 'ok', None
+
+            def vencido():
+                # Un valor distinto de cero hace que SQLite interrumpa la consulta
+                return 1 if time.perf_counter() > limite else 0
+
+            try:
+                with self.motor.connect() as conexion:
+                    if tarea.autocommit:
+                        conexion = conexion.execution_options(isolation_level="AUTOCOMMIT")
+                    sqlite = conexion.connection.driver_connection
+                    sqlite.set_progress_handler(vencido, 10000)
+                    try:
+                        detalle = tarea.funcion(conexion)
+                        if time.perf_counter() > limite:
+                            raise TiempoAgotado()
+                        conexion.commit()
+                    finally:
+                        sqlite.set_progress_handler(None, 0)
+            except Exception as e:
+                if isinstance(e, TiempoAgotado) or time.perf_counter() > limite:
+                    estado, detalle = 'tiempo_agotado', f"Superó {tarea.tiempo_maximo} s"
+                else:
+                    estado, detalle = 'error', str(e)
+                logger.error("Tarea de mantenimiento %s falló (%s): %s", nombre, estado, detalle)
+
+            duracion = time.perf_counter() - inicio
+            registro = {
+                'tarea': nombre,
+                'inicio': fecha_inicio,
+                'duracion_ms': round(duracion * 1000, 1),
+                'estado': estado,
+                'detalle': detalle
+            }
+            with self._lock:
+                tarea.ultima_ejecucion = fecha_inicio
+                tarea.ultimo_estado = estado
+                tarea.ejecuciones += 1
+                tarea.errores += estado != 'ok'
+                tarea.duracion_total += duracion
+                tarea.duracion_maxima = max(tarea.duracion_maxima, duracion)
+                self.historial.append(registro)
+
+            if estado == 'ok':
+                logger.info("Tarea de mantenimiento %s: %s (%s ms)", nombre, detalle, registro['duracion_ms'])
+            return registro
+
+    def estado(self, limite: int = 50):
+        with self._lock:
+            return {
+                'activo': self._hilo is not None and self._hilo.is_alive(),
+                'ventana_horas': list(self.ventana),
+                'tareas': [tarea.metricas() for tarea in self.tareas.values()],
+                'historial': list(self.historial)[-limite:][::-1]
+            }
+
+
+# Instancia compartida por la aplicación (una por proceso)
+planificador_mantenimiento = PlanificadorMantenimiento()
@@ -0,0 +1,361 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, select
+from models.modelos import Promocion, Producto, RegistroAuditoria, a_centavos, a_pesos
+from models import consultas
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+TIPOS_PROMOCION = ('porcentaje', 'lleve_pague', 'precio_especial')
+
+
+def _a_hora_local(fecha: datetime):
+    # Las fechas se guardan en hora local (-05:00); SQLite las devuelve sin zona
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(ZONA_HORARIA).replace(tzinfo=None)
+    return fecha
+
+
+def _minutos(hora: str):
+    """"HH:MM" a minutos desde la medianoche (None si no hay franja)."""
+    if not hora:
+        return None
+    horas, _, minutos = hora.partition(":")
+    return int(horas) * 60 + int(minutos or 0)
+
+
+def consolidar_items(items: list):
+    """Suma las líneas repetidas de un mismo producto, en el orden de aparición.
+
+    Las promociones por cantidad (lleve N pague M) y la validación de stock
+    se evalúan sobre el total de unidades del producto en la canasta.
+    """
+    cantidades = {}
+    for item in items:
+        cantidades[item['producto_id']] = cantidades.get(item['producto_id'], 0) + item['cantidad']
+    return [{'producto_id': producto_id, 'cantidad': cantidad} for producto_id, cantidad in cantidades.items()]
+
+
+COLUMNAS_REGLA = (
+    Promocion.id, Promocion.tipo, Promocion.producto_id, Promocion.categoria, Promocion.porcentaje,
+    Promocion.lleve, Promocion.pague, Promocion.precio_especial, Promocion.fecha_inicio,
+    Promocion.fecha_fin, Promocion.hora_inicio, Promocion.hora_fin
+)
+
+
+class ReglaCompilada:
+    """Promoción lista para evaluar: montos en centavos y vigencia en hora local.
+
+    Se construye desde una fila con ``COLUMNAS_REGLA`` o desde un ``Promocion``.
+    """
+
+    __slots__ = ('id', 'tipo', 'puntos_base', 'lleve', 'pague', 'precio_centavos',
+                 'inicio', 'fin', 'minuto_inicio', 'minuto_fin')
+
+    def __init__(self, promocion):
+        self.id = promocion.id
+        self.tipo = promocion.tipo
+        # Porcentaje en centésimas de punto para calcular con enteros
+        self.puntos_base = int(round((promocion.porcentaje or 0) * 100))
+        self.lleve = promocion.lleve or 0
+        self.pague = promocion.pague or 0
+        self.precio_centavos = a_centavos(promocion.precio_especial) if promocion.precio_especial is not None else None
+        self.inicio = _a_hora_local(promocion.fecha_inicio)
+        self.fin = _a_hora_local(promocion.fecha_fin)
+        self.minuto_inicio = _minutos(promocion.hora_inicio)
+        self.minuto_fin = _minutos(promocion.hora_fin)
+
+    def vigente(self, ahora: datetime, minuto: int):
+        if self.inicio is not None and ahora < self.inicio:
+            return False
+        if self.fin is not None and ahora > self.fin:
+            return False
+        if self.minuto_inicio is None or self.minuto_fin is None:
+            return True
+        if self.minuto_inicio <= self.minuto_fin:
+            return self.minuto_inicio <= minuto < self.minuto_fin
+        # Franja que cruza la medianoche, p. ej. 22:00-02:00
+        return minuto >= self.minuto_inicio or minuto < self.minuto_fin
+
+    def descuento(self, cantidad: int, precio_centavos: int):
+        """Descuento en centavos para ``cantidad`` unidades a ``precio_centavos``."""
+        if self.tipo == 'porcentaje':
+            return (cantidad * precio_centavos * self.puntos_base + 5000) // 10000
+        if self.tipo == 'lleve_pague':
+            return (cantidad // self.lleve) * (self.lleve - self.pague) * precio_centavos
+        return max(0, precio_centavos - self.precio_centavos) * cantidad
+
+
+class MotorPromociones:
+    """Promociones activas compiladas en índices por producto y por categoría.
+
+    ``evaluar`` recorre la canasta una sola vez y por cada línea solo mira las
+    reglas de su producto y de su categoría; entre las vigentes aplica la de
+    mayor descuento (las promociones no se acumulan). ``recargar`` compila los
+    índices nuevos aparte y los reemplaza con una sola asignación, así las
+    ventas en curso siguen con los anteriores sin esperar ningún bloqueo.
+    """
+
+    def __init__(self):
+        # Solo serializa las recargas; la evaluación no toma el lock
+        self._lock = threading.Lock()
+        self._indices = ({}, {})
+        self._firma = None
+        self.reglas = 0
+
+    def _firma_actual(self, db: Session):
+        # Cambia con cualquier alta o modificación (las bajas son desactivaciones)
+        return tuple(db.query(func.count(Promocion.id), func.max(Promocion.fecha_modificacion)).one())
+
+    def recargar(self, db: Session):
+        try:
+            with self._lock:
+                firma = self._firma_actual(db)
+                ahora = datetime.now(ZONA_HORARIA)
+                # Solo las columnas que usa la regla: sin objetos del ORM ni identity map
+                promociones = db.execute(
+                    select(*COLUMNAS_REGLA).where(
+                        Promocion.activa == True,
+                        or_(Promocion.fecha_fin.is_(None), Promocion.fecha_fin >= ahora)
+                    )
+                ).all()
+
+                por_producto = {}
+                por_categoria = {}
+                for promocion in promociones:
+                    regla = ReglaCompilada(promocion)
+                    if promocion.producto_id is not None:
+                        por_producto.setdefault(promocion.producto_id, []).append(regla)
+                    else:
+                        por_categoria.setdefault(promocion.categoria, []).append(regla)
+
+                self._indices = (
+                    {clave: tuple(reglas) for clave, reglas in por_producto.items()},
+                    {clave: tuple(reglas) for clave, reglas in por_categoria.items()}
+                )
+                self._firma = firma
+                self.reglas = len(promociones)
+
+            logger.info("Promociones compiladas: %d reglas activas", len(promociones))
+            return True
+        except Exception as e:
+            logger.error("Error recargando promociones: %s", e)
+            return False
+
+    def recargar_si_cambio(self, db: Session):
+        """Recarga si otra instancia (u otro proceso) modificó las promociones."""
+        if self._firma_actual(db) == self._firma:
+            return False
+        return self.recargar(db)
+
+    def evaluar(self, lineas: list, ahora: datetime = None):
+        """Descuentos de una canasta en una pasada.
+
+        ``lineas`` son tuplas (producto_id, categoria, cantidad, precio en
+        centavos); devuelve por línea (descuento en centavos, promocion_id).
+        """
+        por_producto, por_categoria = self._indices
+        if not por_producto and not por_categoria:
+            return [(0, None)] * len(lineas)
+
+        ahora = _a_hora_local(ahora or datetime.now(ZONA_HORARIA))
+        minuto = ahora.hour * 60 + ahora.minute
+        vacio = ()
+
+        resultado = []
+        for producto_id, categoria, cantidad, precio_centavos in lineas:
+            mejor, mejor_id = 0, None
+            for reglas in (por_producto.get(producto_id, vacio), por_categoria.get(categoria, vacio)):
+                for regla in reglas:
+                    if not regla.vigente(ahora, minuto):
+                        continue
+                    descuento = regla.descuento(cantidad, precio_centavos)
+                    if descuento > mejor:
+                        mejor, mejor_id = descuento, regla.id
+            # El descuento nunca deja la línea en negativo
+            resultado.append((min(mejor, cantidad * precio_centavos), mejor_id))
+        return resultado
+
+
+class ControladorPromociones:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _validar(self, datos: dict):
+        tipo = datos.get('tipo')
+        if tipo not in TIPOS_PROMOCION:
+            return f"Tipo de promoción inválido. Use: {', '.join(TIPOS_PROMOCION)}"
+        if not datos.get('nombre'):
+            return "La promoción debe tener nombre"
+        if bool(datos.get('producto_id')) == bool(datos.get('categoria')):
+            return "Indique un producto o una categoría (solo uno)"
+        if tipo == 'porcentaje' and not 0 < (datos.get('porcentaje') or 0) <= 100:
+            return "El porcentaje debe estar entre 0 y 100"
+        if tipo == 'lleve_pague':
+            lleve, pague = datos.get('lleve'), datos.get('pague')
+            if not isinstance(lleve, int) or not isinstance(pague, int) or not 0 <= pague < lleve:
+                return "Lleve y pague deben ser enteros con 0 <= pague < lleve"
+        if tipo == 'precio_especial':
+            if not datos.get('producto_id'):
+                return "El precio especial solo aplica a un producto"
+            if datos.get('precio_especial') is None or datos['precio_especial'] < 0:
+                return "Indique un precio especial válido"
+        for campo in ('hora_inicio', 'hora_fin'):
+            if datos.get(campo):
+                try:
+                    datetime.strptime(datos[campo], "%H:%M")
+                except ValueError:
+                    return f"{campo} debe tener formato HH:MM"
+        if bool(datos.get('hora_inicio')) != bool(datos.get('hora_fin')):
+            return "La franja horaria necesita hora de inicio y de fin"
+        return None
+
+    def _resumen(self, promocion: Promocion):
+        return {
+            'id': promocion.id,
+            'nombre': promocion.nombre,
+            'tipo': promocion.tipo,
+            'producto_id': promocion.producto_id,
+            'categoria': promocion.categoria,
+            'porcentaje': promocion.porcentaje,
+            'lleve': promocion.lleve,
+            'pague': promocion.pague,
+            'precio_especial': promocion.precio_especial,
+            'fecha_inicio': promocion.fecha_inicio,
+            'fecha_fin': promocion.fecha_fin,
+            'hora_inicio': promocion.hora_inicio,
+            'hora_fin': promocion.hora_fin,
+            'activa': promocion.activa
+        }
+
+    def crear_promocion(self, datos: dict, usuario_id: int):
+        try:
+            error = self._validar(datos)
+            if error:
+                return {"error": error}
+            if datos.get('producto_id') and not self.db.get(Producto, datos['producto_id']):
+                return {"error": "Producto no encontrado"}
+
+            fechas = {}
+            for campo in ('fecha_inicio', 'fecha_fin'):
+                fechas[campo] = datetime.fromisoformat(datos[campo]) if datos.get(campo) else None
+
+            promocion = Promocion(
+                nombre=datos['nombre'],
+                tipo=datos['tipo'],
+                producto_id=datos.get('producto_id'),
+                categoria=datos.get('categoria'),
+                porcentaje=datos.get('porcentaje'),
+                lleve=datos.get('lleve'),
+                pague=datos.get('pague'),
+                precio_especial=datos.get('precio_especial'),
+                hora_inicio=datos.get('hora_inicio'),
+                hora_fin=datos.get('hora_fin'),
+                **fechas
+            )
+            self.db.add(promocion)
+            self.db.flush()
+
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="crear_promocion",
+                descripcion=f"Promoción creada ID: {promocion.id}, {promocion.nombre} ({promocion.tipo})",
+                fecha_accion=datetime.now(ZONA_HORARIA)
+            ))
+            self.db.commit()
+            self.db.refresh(promocion)
+
+            motor_promociones.recargar(self.db)
+            logger.info("Promoción %s creada por el usuario %s", promocion.id, usuario_id)
+            return self._resumen(promocion)
+
+        except ValueError as e:
+            self.db.rollback()
+            return {"error": f"Fecha inválida: {str(e)}"}
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error creando promoción: %s", e)
+            return {"error": f"Error creando promoción: {str(e)}"}
+
+    def desactivar_promocion(self, promocion_id: int, usuario_id: int):
+        try:
+            promocion = self.db.get(Promocion, promocion_id)
+            if not promocion:
+                return {"error": "Promoción no encontrada"}
+            if not promocion.activa:
+                return {"error": "La promoción ya está inactiva"}
+
+            promocion.activa = False
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="desactivar_promocion",
+                descripcion=f"Promoción desactivada ID: {promocion.id}, {promocion.nombre}",
+                fecha_accion=datetime.now(ZONA_HORARIA)
+            ))
+            self.db.commit()
+
+            motor_promociones.recargar(self.db)
+            return {"mensaje": "Promoción desactivada", "promocion_id": promocion_id}
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error desactivando promoción: %s", e)
+            return {"error": f"Error desactivando promoción: {str(e)}"}
+
+    def obtener_promociones(self, incluir_inactivas: bool = False):
+        try:
+            consulta = self.db.query(Promocion)
+            if not incluir_inactivas:
+                consulta = consulta.filter(Promocion.activa == True)
+            return [self._resumen(promocion) for promocion in consulta.order_by(Promocion.id.desc())]
+        except Exception as e:
+            return {"error": f"Error obteniendo promociones: {str(e)}"}
+
+    def cotizar(self, items: list):
+        """Precios y descuentos de una canasta sin registrar la venta."""
+        try:
+            items = consolidar_items(items)
+            productos = {
+                producto.id: producto
+                for producto in self.db.execute(
+                    consultas.PRODUCTOS_POR_IDS, {"ids": [item['producto_id'] for item in items]}
+                ).scalars()
+            }
+            for item in items:
+                if item['producto_id'] not in productos:
+                    return {"error": f"Producto {item['producto_id']} no encontrado"}
+
+            lineas = [
+                (item['producto_id'], productos[item['producto_id']].categoria, item['cantidad'],
+                 a_centavos(productos[item['producto_id']].precio_venta))
+                for item in items
+            ]
+            descuentos = motor_promociones.evaluar(lineas)
+
+            detalle = []
+            total_centavos = 0
+            descuento_total = 0
+            for (producto_id, _, cantidad, precio_centavos), (descuento, promocion_id) in zip(lineas, descuentos):
+                subtotal = cantidad * precio_centavos - descuento
+                total_centavos += subtotal
+                descuento_total += descuento
+                detalle.append({
+                    'producto_id': producto_id,
+                    'cantidad': cantidad,
+                    'precio_unitario': a_pesos(precio_centavos),
+                    'descuento': a_pesos(descuento),
+                    'promocion_id': promocion_id,
+                    'subtotal': a_pesos(subtotal)
+                })
+            return {'items': detalle, 'descuento': a_pesos(descuento_total), 'total': a_pesos(total_centavos)}
+
+        except Exception as e:
+            return {"error": f"Error cotizando canasta: {str(e)}"}
+
+
+# Instancia compartida por la aplicación (una por proceso)
+motor_promociones = MotorPromociones()
@@ -0,0 +1,191 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, type_coerce, Integer
+from models.modelos import Venta, ItemVenta, Producto, a_centavos, a_pesos
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = timezone(timedelta(hours=-5))
+
+# Ventanas móviles soportadas: nombre -> cantidad de días (incluyendo hoy)
+VENTANAS = {'hoy': 1, '7d': 7, '30d': 30}
+
+
+class RankingVentas:
+    """Contadores en memoria de productos más vendidos por ventana móvil.
+
+    Cada día tiene su propia cubeta dentro de un buffer circular de
+    ``dias_max`` posiciones. Los totales de cada ventana se mantienen de forma
+    incremental: al registrar una venta se suman y al cambiar de día se restan
+    las cubetas que salen de la ventana, así el top-N no recorre el historial.
+    """
+
+    def __init__(self, dias_max: int = 30):
+        self.dias_max = dias_max
+        self._lock = threading.Lock()
+        self._dia_actual = None
+        # Cubeta por día: producto_id -> [unidades, ingresos en centavos]
+        self._cubetas = [{} for _ in range(dias_max)]
+        # Totales por ventana: producto_id -> [unidades, ingresos]
+        self._totales = {nombre: {} for nombre in VENTANAS}
+        self._productos = {}
+
+    def _hoy(self):
+        return datetime.now(ZONA_HORARIA).date().toordinal()
+
+    def _dia_de(self, fecha: datetime):
+        if fecha is None:
+            return self._hoy()
+        if fecha.tzinfo is not None:
+            fecha = fecha.astimezone(ZONA_HORARIA)
+        return fecha.date().toordinal()
+
+    def _limpiar(self):
+        self._cubetas = [{} for _ in range(self.dias_max)]
+        self._totales = {nombre: {} for nombre in VENTANAS}
+
+    def _avanzar(self, hoy: int):
+        if self._dia_actual is None:
+            self._dia_actual = hoy
+            return
+        if hoy <= self._dia_actual:
+            return
+        if hoy - self._dia_actual >= self.dias_max:
+            self._limpiar()
+            self._dia_actual = hoy
+            return
+
+        while self._dia_actual < hoy:
+            self._dia_actual += 1
+            # Restar de cada ventana el día que deja de pertenecerle
+            for nombre, dias in VENTANAS.items():
+                dia_saliente = self._dia_actual - dias
+                cubeta = self._cubetas[dia_saliente % self.dias_max]
+                totales = self._totales[nombre]
+                for producto_id, (unidades, ingresos) in cubeta.items():
+                    acumulado = totales.get(producto_id)
+                    if acumulado is None:
+                        continue
+                    acumulado[0] -= unidades
+                    acumulado[1] -= ingresos
+                    if acumulado[0] <= 0:
+                        del totales[producto_id]
+            # La posición del nuevo día contenía el día más antiguo del buffer
+            self._cubetas[self._dia_actual % self.dias_max] = {}
+
+    def _aplicar(self, producto_id: int, unidades: int, ingresos: int, dia: int):
+        edad = self._dia_actual - dia
+        if edad < 0 or edad >= self.dias_max:
+            return
+
+        cubeta = self._cubetas[dia % self.dias_max]
+        acumulado = cubeta.setdefault(producto_id, [0, 0])
+        acumulado[0] += unidades
+        acumulado[1] += ingresos
+        if acumulado[0] <= 0:
+            del cubeta[producto_id]
+
+        for nombre, dias in VENTANAS.items():
+            if edad >= dias:
+                continue
+            totales = self._totales[nombre]
+            acumulado = totales.setdefault(producto_id, [0, 0])
+            acumulado[0] += unidades
+            acumulado[1] += ingresos
+            if acumulado[0] <= 0:
+                del totales[producto_id]
+
+    def registrar_producto(self, producto):
+        self._productos[producto.id] = {
+            'nombre': producto.nombre,
+            'codigo': producto.codigo,
+            'categoria': producto.categoria
+        }
+
+    def registrar_venta(self, items: list, fecha: datetime = None):
+        """Suma los items (producto_id, cantidad, subtotal) de una venta."""
+        with self._lock:
+            self._avanzar(self._hoy())
+            dia = self._dia_de(fecha)
+            for producto_id, cantidad, subtotal in items:
+                self._aplicar(producto_id, cantidad, a_centavos(subtotal), dia)
+
+    def anular_venta(self, items: list, fecha: datetime = None):
+        """Resta los items de una venta anulada del día en que se registró."""
+        with self._lock:
+            self._avanzar(self._hoy())
+            dia = self._dia_de(fecha)
+            for producto_id, cantidad, subtotal in items:
+                self._aplicar(producto_id, -cantidad, -a_centavos(subtotal), dia)
+
+    def top(self, ventana: str = '7d', limite: int = 10):
+        if ventana not in VENTANAS:
+            return {"error": f"Ventana no soportada: {ventana}. Opciones: {', '.join(VENTANAS)}"}
+
+        with self._lock:
+            self._avanzar(self._hoy())
+            mejores = heapq.nlargest(
+                limite,
+                self._totales[ventana].items(),
+                key=lambda par: (par[1][0], par[1][1])
+            )
+
+        resultado = []
+        for producto_id, (unidades, ingresos) in mejores:
+            datos = self._productos.get(producto_id, {})
+            resultado.append({
+                'producto_id': producto_id,
+                'nombre': datos.get('nombre'),
+                'codigo': datos.get('codigo'),
+                'categoria': datos.get('categoria'),
+                'total_vendido': unidades,
+                'total_ingresos': a_pesos(ingresos)
+            })
+        return resultado
+
+    def reconstruir(self, db: Session):
+        """Recarga los contadores desde la base de datos (usado al iniciar)."""
+        try:
+            hoy = self._hoy()
+            fecha_limite = datetime.fromordinal(hoy - self.dias_max + 1)
+            dia_venta = func.date(Venta.fecha_venta)
+
+            filas = (db.query(
+                    ItemVenta.producto_id,
+                    dia_venta.label('dia'),
+                    func.sum(ItemVenta.cantidad).label('unidades'),
+                    type_coerce(func.sum(ItemVenta.subtotal), Integer).label('ingresos')
+                )
+                .join(Venta, ItemVenta.venta_id == Venta.id)
+                .filter(
+                    Venta.fecha_venta >= fecha_limite,
+                    Venta.estado == 'completada'
+                )
+                .group_by(ItemVenta.producto_id, dia_venta)
+                .all())
+
+            productos = db.query(Producto.id, Producto.nombre, Producto.codigo, Producto.categoria).all()
+
+            with self._lock:
+                self._limpiar()
+                self._dia_actual = hoy
+                self._productos = {}
+                for p in productos:
+                    self.registrar_producto(p)
+                for fila in filas:
+                    dia = datetime.strptime(fila.dia, '%Y-%m-%d').date().toordinal()
+                    self._aplicar(fila.producto_id, fila.unidades or 0, fila.ingresos or 0, dia)
+
+            logger.info("Ranking de ventas reconstruido con %d agregados diarios", len(filas))
+            return True
+
+        except Exception as e:
+            logger.error("Error reconstruyendo ranking de ventas: %s", e)
+            return False
+
+
+# Instancia compartida por la aplicación (una por proceso)
+ranking_ventas = RankingVentas()
@@ -1,9 +1,9 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
-from models.modelos import Venta, ItemVenta, Producto, MovimientoInventario
-from datetime import datetime, timedelta
+from sqlalchemy import extract
+from models.modelos import Producto, MovimientoInventario, a_pesos
+from controllers.cache_reportes_controller import cache_reportes
+from datetime import datetime, timedelta, timezone
 import logging
-import traceback
 
 logger = logging.getLogger(__name__)
 
@@ -13,33 +13,11 @@ class ControladorReportes:
     
     def generar_balance_economico(self, fecha_inicio: datetime, fecha_fin: datetime):
         try:
-            # Consulta base para ventas - solo sucursal 1
-            datos_ventas = self.db.query(
-                func.sum(Venta.total).label('total_ventas'),
-                func.count(Venta.id).label('cantidad_ventas')
-            ).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == 'completada',
-                    Venta.sucursal_id == 1
-                )
-            ).first()
-            
-            # Consulta para costos - solo sucursal 1
-            datos_costos = self.db.query(
-                func.sum(ItemVenta.cantidad * Producto.costo).label('costo_total')
-            ).join(Producto).join(Venta).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == 'completada',
-                    Venta.sucursal_id == 1
-                )
-            ).first()
-            
-            total_ventas = datos_ventas.total_ventas or 0
-            costo_ventas = datos_costos.costo_total or 0
+            # Días cerrados desde la caché, solo el tramo abierto se consulta
+            datos_ventas = cache_reportes.obtener(self.db, fecha_inicio, fecha_fin)
+            
+            total_ventas = datos_ventas.total_ventas
+            costo_ventas = datos_ventas.costo_total
             utilidad_bruta = total_ventas - costo_ventas
             margen_utilidad = (utilidad_bruta / total_ventas * 100) if total_ventas > 0 else 0
             
@@ -63,7 +41,7 @@ class ControladorReportes:
             return balance
             
         except Exception as e:
-            logger.error(f"Error generando balance económico: {str(e)}")
+            logger.error("Error generando balance económico: %s", e)
             return {"error": f"Error generando balance: {str(e)}"}
     
     def obtener_indicadores_ventas(self, fecha_inicio: datetime = None, fecha_fin: datetime = None):
@@ -74,28 +52,16 @@ class ControladorReportes:
                 fecha_inicio = fecha_fin - timedelta(days=7)
             
             # Ventas del periodo actual
-            ventas_periodo_actual = self.db.query(func.sum(Venta.total)).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == 'completada',
-                    Venta.sucursal_id == 1
-                )
-            ).scalar() or 0
+            ventas_periodo_actual = cache_reportes.obtener(self.db, fecha_inicio, fecha_fin).total_ventas
             
             # Ventas del periodo anterior (misma duración)
             duracion = fecha_fin - fecha_inicio
             fecha_inicio_anterior = fecha_inicio - duracion
             fecha_fin_anterior = fecha_inicio
             
-            ventas_periodo_anterior = self.db.query(func.sum(Venta.total)).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio_anterior,
-                    Venta.fecha_venta < fecha_fin_anterior,
-                    Venta.estado == 'completada',
-                    Venta.sucursal_id == 1
-                )
-            ).scalar() or 0
+            ventas_periodo_anterior = cache_reportes.obtener(
+                self.db, fecha_inicio_anterior, fecha_fin_anterior - timedelta(microseconds=1)
+            ).total_ventas
             
             # Calcular variación
             variacion_ventas = 0
@@ -117,7 +83,7 @@ class ControladorReportes:
             return indicadores
             
         except Exception as e:
-            logger.error(f"Error obteniendo indicadores de ventas: {str(e)}")
+            logger.error("Error obteniendo indicadores de ventas: %s", e)
             return {
                 'comparativa': {
                     'periodo_actual': 0,
@@ -129,55 +95,39 @@ class ControladorReportes:
     
     def obtener_productos_mas_vendidos(self, fecha_inicio: datetime = None, fecha_fin: datetime = None):
         try:
-            print("🎯 Iniciando obtención de productos más vendidos")
-            
-            # Si no se proporcionan fechas, usar un rango amplio
+            # Si no se proporcionan fechas, usar un rango amplio.
+            # Para ventanas recientes (hoy, 7 o 30 días) usar ranking_ventas.top
             if not fecha_inicio or not fecha_fin:
                 fecha_fin = datetime.now(timezone(timedelta(hours=-5)))
                 fecha_inicio = fecha_fin - timedelta(days=365)
-                print("📅 Usando fechas por defecto (último año)")
-            
-            print(f"📊 Consultando entre {fecha_inicio} y {fecha_fin}")
-            
-            # Consulta para productos más vendidos
-            productos_vendidos = (self.db.query(
-                    ItemVenta.producto_id,
-                    Producto.nombre,
-                    Producto.codigo,
-                    Producto.categoria,
-                    func.sum(ItemVenta.cantidad).label('total_vendido'),
-                    func.sum(ItemVenta.subtotal).label('total_ingresos')
-                )
-                .join(Producto, ItemVenta.producto_id == Producto.id)
-                .join(Venta, ItemVenta.venta_id == Venta.id)
-                .filter(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == 'completada'
-                )
-                .group_by(ItemVenta.producto_id, Producto.nombre, Producto.codigo, Producto.categoria)
-                .order_by(func.sum(ItemVenta.cantidad).desc())
-                .all())
-            
-            print(f"✅ Encontrados {len(productos_vendidos)} productos con ventas")
-            
-            resultado = []
-            for p in productos_vendidos:
-                item = {
-                    'producto_id': p.producto_id,
-                    'nombre': p.nombre,
-                    'codigo': p.codigo,
-                    'categoria': p.categoria,
-                    'total_vendido': p.total_vendido or 0,
-                    'total_ingresos': float(p.total_ingresos or 0)
+            
+            # Agregados por producto desde la caché de días cerrados
+            datos_ventas = cache_reportes.obtener(self.db, fecha_inicio, fecha_fin)
+            productos_vendidos = sorted(
+                datos_ventas.productos.items(), key=lambda par: par[1][0], reverse=True
+            )
+            
+            productos = {
+                p.id: p for p in self.db.query(
+                    Producto.id, Producto.nombre, Producto.codigo, Producto.categoria
+                ).filter(Producto.id.in_([producto_id for producto_id, _ in productos_vendidos]))
+            }
+            
+            resultado = [
+                {
+                    'producto_id': producto_id,
+                    'nombre': productos[producto_id].nombre,
+                    'codigo': productos[producto_id].codigo,
+                    'categoria': productos[producto_id].categoria,
+                    'total_vendido': unidades or 0,
+                    'total_ingresos': a_pesos(ingresos or 0)
                 }
-                print(f"   - {item['nombre']}: {item['total_vendido']} unidades")
-                resultado.append(item)
+                for producto_id, (unidades, ingresos, _) in productos_vendidos
+                if producto_id in productos
+            ]
             
             return resultado
             
         except Exception as e:
-            print(f"❌ Error en obtener_productos_mas_vendidos: {str(e)}")
-            print(f"📝 Traceback: {traceback.format_exc()}")
-            logger.error(f"Error obteniendo productos más vendidos: {str(e)}")
+            logger.error("Error obteniendo productos más vendidos: %s", e)
             return []
\ No newline at end of file
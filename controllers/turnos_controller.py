@@ -0,0 +1,199 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import update, select, bindparam, type_coerce, Integer
+from models.modelos import TurnoCaja, RegistroAuditoria, Usuario, a_centavos, a_pesos
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+_turnos = TurnoCaja.__table__
+
+
+def _centavos(columna):
+    return type_coerce(columna, Integer)
+
+
+def sumar_venta(db: Session, usuario_id: int, unidades: int, total_centavos: int):
+    """Suma una venta al turno abierto del usuario dentro de la transacción de la venta.
+
+    Devuelve el id del turno, o None si el usuario no tiene turno abierto.
+    """
+    return db.execute(
+        update(_turnos)
+        .where(_turnos.c.usuario_id == usuario_id, _turnos.c.estado == "abierto")
+        .values(
+            ventas=_turnos.c.ventas + 1,
+            unidades=_turnos.c.unidades + unidades,
+            total_bruto=_centavos(_turnos.c.total_bruto) + total_centavos
+        )
+        .returning(_turnos.c.id)
+    ).scalar()
+
+
+def sumar_anulaciones(db: Session, usuario_id: int, anulaciones: list):
+    """Descuenta ventas anuladas de los turnos abiertos dentro de la transacción de la anulación.
+
+    ``anulaciones`` son tuplas (turno_id de la venta, unidades, total en centavos).
+    Cada anulación va al turno de la venta si sigue abierto; si ya cerró, al
+    turno abierto de quien anula, que es de cuyo cajón sale la devolución.
+    """
+    turnos_venta = {turno_id for turno_id, _, _ in anulaciones if turno_id}
+    abiertos = set(db.execute(
+        select(_turnos.c.id).where(_turnos.c.estado == "abierto", _turnos.c.id.in_(turnos_venta))
+    ).scalars()) if turnos_venta else set()
+    turno_propio = db.execute(
+        select(_turnos.c.id).where(_turnos.c.usuario_id == usuario_id, _turnos.c.estado == "abierto")
+    ).scalar()
+
+    por_turno = {}
+    for turno_id, unidades, total_centavos in anulaciones:
+        destino = turno_id if turno_id in abiertos else turno_propio
+        if destino is None:
+            continue
+        acumulado = por_turno.setdefault(destino, [0, 0, 0])
+        acumulado[0] += 1
+        acumulado[1] += unidades
+        acumulado[2] += total_centavos
+
+    if por_turno:
+        db.execute(
+            update(_turnos)
+            .where(_turnos.c.id == bindparam('id_turno'))
+            .values(
+                anulaciones=_turnos.c.anulaciones + bindparam('b_cantidad', type_=Integer),
+                unidades_anuladas=_turnos.c.unidades_anuladas + bindparam('b_unidades', type_=Integer),
+                total_anulado=_centavos(_turnos.c.total_anulado) + bindparam('b_centavos', type_=Integer)
+            ),
+            [
+                {'id_turno': turno_id, 'b_cantidad': cantidad, 'b_unidades': unidades, 'b_centavos': centavos}
+                for turno_id, (cantidad, unidades, centavos) in por_turno.items()
+            ]
+        )
+
+
+class ControladorTurnos:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _resumen(self, turno: TurnoCaja, nombre_usuario: str = None):
+        neto_centavos = a_centavos(turno.total_bruto) - a_centavos(turno.total_anulado)
+        esperado_centavos = a_centavos(turno.efectivo_inicial) + neto_centavos
+        contado_centavos = None if turno.efectivo_contado is None else a_centavos(turno.efectivo_contado)
+        resumen = {
+            'turno_id': turno.id,
+            'usuario_id': turno.usuario_id,
+            'usuario': nombre_usuario,
+            'estado': turno.estado,
+            'fecha_apertura': turno.fecha_apertura,
+            'fecha_cierre': turno.fecha_cierre,
+            'efectivo_inicial': turno.efectivo_inicial,
+            'ventas': turno.ventas,
+            'unidades': turno.unidades,
+            'total_bruto': turno.total_bruto,
+            'anulaciones': turno.anulaciones,
+            'unidades_anuladas': turno.unidades_anuladas,
+            'total_anulado': turno.total_anulado,
+            'total_neto': a_pesos(neto_centavos),
+            'efectivo_esperado': a_pesos(esperado_centavos),
+            'efectivo_contado': None,
+            'diferencia': None
+        }
+        if contado_centavos is not None:
+            resumen['efectivo_contado'] = a_pesos(contado_centavos)
+            resumen['diferencia'] = a_pesos(contado_centavos - esperado_centavos)
+        return resumen
+
+    def _nombre_usuario(self, usuario_id: int):
+        return self.db.query(Usuario.nombre).filter(Usuario.id == usuario_id).scalar()
+
+    def _turno_abierto(self, usuario_id: int):
+        return self.db.query(TurnoCaja).filter(
+            TurnoCaja.usuario_id == usuario_id,
+            TurnoCaja.estado == "abierto"
+        ).first()
+
+    def abrir_turno(self, usuario_id: int, efectivo_inicial: float = 0):
+        try:
+            if self._turno_abierto(usuario_id):
+                return {"error": "El usuario ya tiene un turno abierto"}
+
+            turno = TurnoCaja(usuario_id=usuario_id, efectivo_inicial=efectivo_inicial or 0)
+            self.db.add(turno)
+            self.db.flush()
+
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="apertura_turno",
+                descripcion=f"Turno de caja abierto ID: {turno.id}, Efectivo inicial: ${turno.efectivo_inicial}",
+                fecha_accion=datetime.now(timezone(timedelta(hours=-5)))
+            ))
+            self.db.commit()
+            self.db.refresh(turno)
+
+            logger.info("Turno %s abierto por el usuario %s", turno.id, usuario_id)
+            return self._resumen(turno, self._nombre_usuario(usuario_id))
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error abriendo turno: %s", e)
+            return {"error": f"Error abriendo turno: {str(e)}"}
+
+    def obtener_turno_actual(self, usuario_id: int):
+        turno = self._turno_abierto(usuario_id)
+        if not turno:
+            return {"error": "El usuario no tiene un turno abierto"}
+        return self._resumen(turno, self._nombre_usuario(usuario_id))
+
+    def cerrar_turno(self, usuario_id: int, efectivo_contado: float = None):
+        """Cierra el turno abierto: los totales ya están en los contadores, no se recorren ventas."""
+        try:
+            turno = self._turno_abierto(usuario_id)
+            if not turno:
+                return {"error": "El usuario no tiene un turno abierto"}
+
+            turno.estado = "cerrado"
+            turno.fecha_cierre = datetime.now(timezone(timedelta(hours=-5)))
+            turno.efectivo_contado = efectivo_contado
+            self.db.flush()
+            resumen = self._resumen(turno, self._nombre_usuario(usuario_id))
+
+            self.db.add(RegistroAuditoria(
+                usuario_id=usuario_id,
+                tipo_accion="cierre_turno",
+                descripcion=(
+                    f"Turno de caja cerrado ID: {turno.id}, Ventas: {resumen['ventas']}, "
+                    f"Neto: ${resumen['total_neto']}, Diferencia: {resumen['diferencia']}"
+                ),
+                fecha_accion=turno.fecha_cierre
+            ))
+            self.db.commit()
+
+            logger.info("Turno %s cerrado por el usuario %s", resumen['turno_id'], usuario_id)
+            return resumen
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error cerrando turno: %s", e)
+            return {"error": f"Error cerrando turno: {str(e)}"}
+
+    def obtener_turnos(self, fecha_inicio: datetime = None, fecha_fin: datetime = None, usuario_id: int = None):
+        """Resúmenes de turnos cerrados, del más reciente al más antiguo."""
+        try:
+            consulta = self.db.query(TurnoCaja, Usuario.nombre).join(
+                Usuario, TurnoCaja.usuario_id == Usuario.id
+            ).filter(TurnoCaja.estado == "cerrado")
+            if fecha_inicio:
+                consulta = consulta.filter(TurnoCaja.fecha_cierre >= fecha_inicio)
+            if fecha_fin:
+                consulta = consulta.filter(TurnoCaja.fecha_cierre <= fecha_fin)
+            if usuario_id:
+                consulta = consulta.filter(TurnoCaja.usuario_id == usuario_id)
+
+            return [
+                self._resumen(turno, nombre)
+                for turno, nombre in consulta.order_by(TurnoCaja.fecha_cierre.desc())
+            ]
+
+        except Exception as e:
+            logger.error("Error obteniendo turnos: %s", e)
+            return {"error": f"Error obteniendo turnos: {str(e)}"}
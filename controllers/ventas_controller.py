@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from models.modelos import Venta, ItemVenta, Producto, MovimientoInventario, RegistroAuditoria
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import insert
+from models.modelos import Venta, ItemVenta, MovimientoInventario, RegistroAuditoria, a_centavos, a_pesos
+from controllers.ranking_controller import ranking_ventas
+from controllers.cache_reportes_controller import cache_reportes
+from controllers.turnos_controller import sumar_venta, sumar_anulaciones
+from controllers.promociones_controller import motor_promociones, consolidar_items
+from models import consultas
 from datetime import datetime, timezone
 import logging
 
@@ -19,33 +24,64 @@ class ControladorVentas:
             # Usar sucursal por defecto (ID 1) ya que solo hay una
             sucursal_id = 1
             
-            # Validar stock y calcular total
-            total_venta = 0
-            items_validados = []
+            # Líneas repetidas del mismo producto se suman antes de validar stock y promociones
+            items = consolidar_items(datos_venta['items'])
+            
+            # Todos los productos de la venta en una sola consulta precompilada
+            productos = {
+                producto.id: producto
+                for producto in self.db.execute(
+                    consultas.PRODUCTOS_POR_IDS, {"ids": [item['producto_id'] for item in items]}
+                ).scalars()
+            }
             
-            for item in datos_venta['items']:
-                producto = self.db.query(Producto).filter(Producto.id == item['producto_id']).first()
+            lineas = []
+            for item in items:
+                producto = productos.get(item['producto_id'])
                 if not producto:
                     return {"error": f"Producto {item['producto_id']} no encontrado"}
                 
                 if producto.stock_actual < item['cantidad']:
                     return {"error": f"Stock insuficiente para {producto.nombre}. Stock actual: {producto.stock_actual}"}
                 
-                subtotal = item['cantidad'] * producto.precio_venta
-                total_venta += subtotal
+                lineas.append((producto.id, producto.categoria, item['cantidad'], a_centavos(producto.precio_venta)))
+            
+            # Promociones de toda la canasta en una pasada sobre los índices compilados
+            descuentos = motor_promociones.evaluar(lineas)
+            
+            # Calcular total (aritmética entera en centavos)
+            total_centavos = 0
+            descuento_centavos = 0
+            items_validados = []
+            
+            for item, (descuento, promocion_id) in zip(items, descuentos):
+                producto = productos[item['producto_id']]
+                subtotal_centavos = item['cantidad'] * a_centavos(producto.precio_venta) - descuento
+                total_centavos += subtotal_centavos
+                descuento_centavos += descuento
                 
                 items_validados.append({
                     'producto': producto,
                     'cantidad': item['cantidad'],
                     'precio_unitario': producto.precio_venta,
-                    'subtotal': subtotal
+                    'subtotal': a_pesos(subtotal_centavos),
+                    'descuento': a_pesos(descuento),
+                    'promocion_id': promocion_id
                 })
             
+            total_venta = a_pesos(total_centavos)
+            
+            # Contadores del turno abierto del cajero, en la misma transacción
+            turno_id = sumar_venta(
+                self.db, usuario_id, sum(item['cantidad'] for item in items_validados), total_centavos
+            )
+            
             # Crear venta con sucursal por defecto
             nueva_venta = Venta(
                 sucursal_id=sucursal_id,  # Siempre sucursal 1
                 usuario_id=usuario_id,
-                total=total_venta
+                total=total_venta,
+                turno_id=turno_id
             )
             self.db.add(nueva_venta)
             self.db.flush()  # Para obtener el ID
@@ -57,7 +93,11 @@ class ControladorVentas:
                     producto_id=item['producto'].id,
                     cantidad=item['cantidad'],
                     precio_unitario=item['precio_unitario'],
-                    subtotal=item['subtotal']
+                    subtotal=item['subtotal'],
+                    costo_unitario=item['producto'].costo,
+                    categoria=item['producto'].categoria,
+                    descuento=item['descuento'],
+                    promocion_id=item['promocion_id']
                 )
                 self.db.add(nuevo_item)
                 
@@ -88,96 +128,205 @@ class ControladorVentas:
             )
             self.db.add(auditoria)
             
+            # Datos para el ranking en memoria (antes de que el commit expire los objetos)
+            items_ranking = []
+            for item in items_validados:
+                ranking_ventas.registrar_producto(item['producto'])
+                items_ranking.append((item['producto'].id, item['cantidad'], item['subtotal']))
+            
             self.db.commit()
             
-            logger.info(f"Venta {nueva_venta.id} registrada exitosamente")
-            return {"mensaje": "Venta registrada exitosamente", "venta_id": nueva_venta.id}
+            ranking_ventas.registrar_venta(items_ranking, nueva_venta.fecha_venta)
+            
+            logger.info("Venta %s registrada exitosamente", nueva_venta.id)
+            return {
+                "mensaje": "Venta registrada exitosamente",
+                "venta_id": nueva_venta.id,
+                "total": total_venta,
+                "descuento": a_pesos(descuento_centavos)
+            }
             
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error registrando venta: {str(e)}")
+            logger.error("Error registrando venta: %s", e)
             return {"error": f"Error al registrar venta: {str(e)}"}
     
     def anular_venta(self, venta_id: int, usuario_id: int, motivo: str):
+        resultado = self.anular_ventas(usuario_id, motivo, venta_ids=[venta_id])
+        if 'error' in resultado:
+            return resultado
+        
+        detalle = resultado['resultados'][0]
+        if 'error' in detalle:
+            return {"error": detalle['error']}
+        return {"mensaje": "Venta anulada exitosamente"}
+    
+    def anular_ventas(self, usuario_id: int, motivo: str, venta_ids: list = None,
+                      fecha_inicio: datetime = None, fecha_fin: datetime = None, cajero_id: int = None):
+        """Anula varias ventas en una sola transacción.
+        
+        Las ventas se eligen por ``venta_ids`` o por filtro (rango de fechas y
+        cajero). Ventas, items y productos se cargan en tres consultas; el stock
+        se actualiza una vez por producto y movimientos y auditoría se insertan
+        en bloque. Devuelve el resultado de cada venta.
+        """
         try:
-            venta = self.db.query(Venta).filter(Venta.id == venta_id).first()
-            if not venta:
-                return {"error": "Venta no encontrada"}
-            
-            if venta.estado == "anulada":
-                return {"error": "La venta ya está anulada"}
-            
-            # Restaurar inventario
-            for item in venta.items:
-                producto = item.producto
-                stock_anterior = producto.stock_actual
-                stock_nuevo = stock_anterior + item.cantidad
-                producto.stock_actual = stock_nuevo
+            if not venta_ids and not (fecha_inicio or fecha_fin or cajero_id):
+                return {"error": "Indique las ventas a anular o un filtro"}
+            
+            consulta = self.db.query(Venta).options(
+                selectinload(Venta.items).selectinload(ItemVenta.producto)
+            )
+            if venta_ids:
+                consulta = consulta.filter(Venta.id.in_(venta_ids))
+            else:
+                consulta = consulta.filter(Venta.estado == "completada")
+            if fecha_inicio:
+                consulta = consulta.filter(Venta.fecha_venta >= fecha_inicio)
+            if fecha_fin:
+                consulta = consulta.filter(Venta.fecha_venta <= fecha_fin)
+            if cajero_id:
+                consulta = consulta.filter(Venta.usuario_id == cajero_id)
+            
+            ventas = {venta.id: venta for venta in consulta.order_by(Venta.id)}
+            orden = list(dict.fromkeys(venta_ids)) if venta_ids else list(ventas)
+            
+            resultados = []
+            anuladas = []
+            for venta_id in orden:
+                venta = ventas.get(venta_id)
+                if venta is None:
+                    resultados.append({"venta_id": venta_id, "error": "Venta no encontrada"})
+                elif venta.estado == "anulada":
+                    resultados.append({"venta_id": venta_id, "error": "La venta ya está anulada"})
+                else:
+                    anuladas.append(venta)
+                    resultados.append({"venta_id": venta_id, "mensaje": "Venta anulada exitosamente"})
+            
+            if not anuladas:
+                return {"anuladas": 0, "resultados": resultados}
+            
+            ahora = datetime.now(timezone.utc)
+            stock = {}
+            productos = {}
+            movimientos = []
+            auditorias = []
+            anulaciones_ranking = []
+            anulaciones_turno = []
+            
+            for venta in anuladas:
+                items_anulados = []
+                for item in venta.items:
+                    items_anulados.append((item.producto_id, item.cantidad, item.subtotal))
+                    producto = item.producto
+                    productos[producto.id] = producto
+                    
+                    # El stock se encadena entre ventas que comparten producto
+                    stock_anterior = stock.get(producto.id, producto.stock_actual)
+                    stock_nuevo = stock_anterior + item.cantidad
+                    stock[producto.id] = stock_nuevo
+                    
+                    movimientos.append({
+                        "producto_id": producto.id,
+                        "tipo_movimiento": "entrada",
+                        "cantidad": item.cantidad,
+                        "stock_anterior": stock_anterior,
+                        "stock_nuevo": stock_nuevo,
+                        "motivo": f"Anulación venta {venta.id}",
+                        "usuario_id": usuario_id
+                    })
                 
-                # Registrar movimiento de inventario
-                movimiento = MovimientoInventario(
-                    producto_id=producto.id,
-                    tipo_movimiento="entrada",
-                    cantidad=item.cantidad,
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=stock_nuevo,
-                    motivo=f"Anulación venta {venta_id}",
-                    usuario_id=usuario_id
-                )
-                self.db.add(movimiento)
+                auditorias.append({
+                    "usuario_id": usuario_id,
+                    "tipo_accion": "anulacion",
+                    "descripcion": f"Venta anulada ID: {venta.id}. Motivo: {motivo}",
+                    "fecha_accion": ahora
+                })
+                anulaciones_ranking.append((items_anulados, venta.fecha_venta))
+                anulaciones_turno.append((
+                    venta.turno_id, sum(cantidad for _, cantidad, _ in items_anulados), a_centavos(venta.total)
+                ))
+                venta.estado = "anulada"
             
-            # Anular venta
-            venta.estado = "anulada"
+            # Una actualización de stock por producto
+            for producto_id, stock_nuevo in stock.items():
+                productos[producto_id].stock_actual = stock_nuevo
             
-            # Registrar en auditoría
-            auditoria = RegistroAuditoria(
-                usuario_id=usuario_id,
-                tipo_accion="anulacion",
-                descripcion=f"Venta anulada ID: {venta_id}. Motivo: {motivo}",
-                fecha_accion=datetime.now(timezone.utc)
-            )
-            self.db.add(auditoria)
+            if movimientos:
+                self.db.execute(insert(MovimientoInventario), movimientos)
+            self.db.execute(insert(RegistroAuditoria), auditorias)
+            sumar_anulaciones(self.db, usuario_id, anulaciones_turno)
             
             self.db.commit()
-            return {"mensaje": "Venta anulada exitosamente"}
+            
+            for items_anulados, fecha_venta in anulaciones_ranking:
+                ranking_ventas.anular_venta(items_anulados, fecha_venta)
+                cache_reportes.invalidar_dia(fecha_venta)
+            
+            logger.info("%s ventas anuladas por el usuario %s", len(anuladas), usuario_id)
+            return {"anuladas": len(anuladas), "resultados": resultados}
             
         except Exception as e:
             self.db.rollback()
+            logger.error("Error anulando ventas: %s", e)
             return {"error": f"Error al anular venta: {str(e)}"}
     
     def obtener_ventas_por_periodo(self, fecha_inicio: datetime, fecha_fin: datetime):
         try:
-            ventas = self.db.query(Venta).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == "completada"
-                )
-            ).order_by(Venta.fecha_venta.desc()).all()
+            ventas = self.db.execute(consultas.VENTAS_PERIODO, {
+                "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin
+            }).scalars().all()
             
             return ventas
             
         except Exception as e:
             return {"error": f"Error obteniendo ventas: {str(e)}"}
     
+    def obtener_ventas_detalle_por_periodo(self, fecha_inicio: datetime, fecha_fin: datetime):
+        # Proyecciones con nombres ya unidos: dos consultas en lugar de una por venta e item
+        try:
+            parametros = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+            ventas = self.db.execute(consultas.VENTAS_DETALLE_PERIODO, parametros).all()
+            items = self.db.execute(consultas.ITEMS_DETALLE_PERIODO, parametros).all()
+            
+            items_por_venta = {}
+            for venta_id, cantidad, nombre, precio_unitario, subtotal in items:
+                items_por_venta.setdefault(venta_id, []).append({
+                    "cantidad": cantidad,
+                    "producto": {"nombre": nombre},
+                    "precio_unitario": precio_unitario,
+                    "subtotal": subtotal
+                })
+            
+            return [
+                {
+                    "id": venta_id,
+                    "fecha_venta": fecha_venta,
+                    "total": total,
+                    "usuario": {"nombre": usuario_nombre},
+                    "items": items_por_venta.get(venta_id, [])
+                }
+                for venta_id, fecha_venta, total, usuario_nombre in ventas
+            ]
+            
+        except Exception as e:
+            return {"error": f"Error obteniendo ventas: {str(e)}"}
+    
     def consolidar_ventas_diarias(self):
         try:
             hoy = datetime.now(timezone.utc).date()
             fecha_inicio = datetime.combine(hoy, datetime.min.time())
             fecha_fin = datetime.combine(hoy, datetime.max.time())
             
-            ventas_hoy = self.db.query(Venta).filter(
-                and_(
-                    Venta.fecha_venta >= fecha_inicio,
-                    Venta.fecha_venta <= fecha_fin,
-                    Venta.estado == "completada"
-                )
-            ).all()
+            # Suma y conteo en la base: no se cargan las ventas del día
+            total_centavos, cantidad = self.db.execute(consultas.TOTALES_VENTAS, {
+                "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin
+            }).one()
             
             consolidado = {
                 'fecha': hoy,
-                'total_ventas': len(ventas_hoy),
-                'monto_total': sum(venta.total for venta in ventas_hoy),
+                'total_ventas': cantidad,
+                'monto_total': a_pesos(total_centavos or 0),
                 'sucursal': 'Tienda StoreVision'
             }
             
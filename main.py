@@ -5,20 +5,54 @@ from contextlib import asynccontextmanager
 from models.database import crear_tablas, motor
 from models import modelos
 from views import api_views
+from views.respuestas import MiddlewareCompresion
+from views.diagnostico import MiddlewarePeticiones, MiddlewareCaptura, MiddlewareBitacora
+from views.estaticos import catalogo_estaticos
 import uvicorn
 from sqlalchemy.orm import sessionmaker
-from controllers.auth_controller import ControladorAutenticacion
+from controllers.ranking_controller import ranking_ventas
+from controllers.busqueda_controller import indice_productos
+from controllers.instantaneas_controller import ControladorInstantaneas
+from controllers.mantenimiento_controller import planificador_mantenimiento
+from controllers.limitador_controller import limitador_login
+from controllers.promociones_controller import motor_promociones
+from controllers.captura_controller import captura_trafico
+from controllers.bitacora_controller import bitacora
 from datetime import timezone, timedelta
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Crear tablas y datos de ejemplo
-    print("Iniciando StoreVision...")
+    # Startup: esquema al día (una consulta si no hay migraciones pendientes).
+    # Los datos de ejemplo se crean aparte: python main.py sembrar
+    bitacora.configurar()
+    logger.info("Iniciando StoreVision...")
     crear_tablas()
-    await inicializar_datos_ejemplo()
+    reconstruir_ranking_ventas()
+    reconstruir_indice_productos()
+    cargar_promociones()
+    tomar_instantanea_stock()
+    # Las páginas y recursos comprimidos se preparan sin demorar el arranque
+    threading.Thread(target=catalogo_estaticos.cargar, name="catalogo-estaticos", daemon=True).start()
+    # Mantenimiento en segundo plano (STOREVISION_MANTENIMIENTO=0 lo desactiva)
+    if os.environ.get("STOREVISION_MANTENIMIENTO", "1") != "0":
+        planificador_mantenimiento.iniciar(motor)
+    # Captura de tráfico desde el arranque (STOREVISION_CAPTURA=1)
+    if os.environ.get("STOREVISION_CAPTURA", "0") == "1":
+        captura_trafico.iniciar()
     yield
     # Shutdown: Limpiar recursos si es necesario
-    print("Cerrando StoreVision...")
+    planificador_mantenimiento.detener()
+    if captura_trafico.activa:
+        captura_trafico.detener()
+    registrar_resumen_logins()
+    logger.info("Cerrando StoreVision...")
+    bitacora.detener()
 
 # Crear aplicación FastAPI con lifespan
 app = FastAPI(
@@ -28,14 +62,29 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Montar archivos estáticos y templates
+# Captura de tráfico para repetir la carga (apagada: una lectura de atributo).
+# Se agrega antes que la compresión para quedar por dentro de ella
+app.add_middleware(MiddlewareCaptura)
+
+# Compresión gzip/brotli negociada para respuestas grandes
+app.add_middleware(MiddlewareCompresion)
+
+# Peticiones en curso para /api/diagnostico (apagado: una lectura de atributo)
+app.add_middleware(MiddlewarePeticiones)
+
+# Id de petición y duración en la bitácora; la más externa para medirlo todo
+app.add_middleware(MiddlewareBitacora)
+
+# Montar archivos estáticos (las páginas usan las URL con huella de /recursos)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Incluir rutas
 app.include_router(api_views.router)
 
-async def inicializar_datos_ejemplo():
-
+def sembrar_datos_ejemplo():
+    # passlib solo se necesita al crear los usuarios de ejemplo
+    from controllers.auth_controller import ControladorAutenticacion
+    
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
     db = SessionLocal()
     
@@ -96,26 +145,81 @@ async def inicializar_datos_ejemplo():
                 {"codigo": "SNK002", "nombre": "Chocolatina Jet", "precio_venta": 1200, "costo": 800, "stock_actual": 120, "stock_minimo": 40, "categoria": "Snacks"},
             ]
             
-            for prod in productos_colombianos:
-                producto = modelos.Producto(**prod)
-                db.add(producto)
+            productos = [modelos.Producto(**prod) for prod in productos_colombianos]
+            db.add_all(productos)
+            db.flush()
+            
+            # Entradas de apertura: el stock a una fecha y la conciliación parten del libro de movimientos
+            db.add_all(
+                modelos.MovimientoInventario(
+                    producto_id=producto.id,
+                    tipo_movimiento='entrada',
+                    cantidad=producto.stock_actual,
+                    stock_anterior=0,
+                    stock_nuevo=producto.stock_actual,
+                    motivo="Stock inicial",
+                    usuario_id=usuario_admin.id
+                )
+                for producto in productos
+            )
             
             db.commit()
-            print("Datos de ejemplo creados exitosamente")
-            print("Usuarios de prueba:")
-            print("- admin@storevision.com / admin123 (Administradora)")
-            print("- cajero@storevision.com / cajero123 (Cajero)")
-            print("Productos colombianos creados: 12 productos") 
-            print("Sucursal creada: Tienda StoreVision")
+            logger.info(
+                "Datos de ejemplo creados: sucursal Tienda StoreVision, %s productos y usuarios de prueba "
+                "admin@storevision.com / admin123 (Administradora), cajero@storevision.com / cajero123 (Cajero)",
+                len(productos_colombianos)
+            )
         else:
-            print("ℹ️  La base de datos ya contiene datos, omitiendo creación de ejemplos")
+            logger.info("La base de datos ya contiene datos, omitiendo creación de ejemplos")
             
     except Exception as e:
-        print(f"Error creando datos de ejemplo: {e}")
+        logger.error("Error creando datos de ejemplo: %s", e)
         db.rollback()
     finally:
         db.close()
 
+def reconstruir_ranking_ventas():
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        ranking_ventas.reconstruir(db)
+    finally:
+        db.close()
+
+def reconstruir_indice_productos():
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        indice_productos.reconstruir(db)
+    finally:
+        db.close()
+
+def cargar_promociones():
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        motor_promociones.recargar(db)
+    finally:
+        db.close()
+
+def tomar_instantanea_stock():
+    # Instantánea diaria del stock para las consultas a fecha
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        ControladorInstantaneas(db).tomar_instantanea_si_corresponde()
+    finally:
+        db.close()
+
+def registrar_resumen_logins():
+    # Los fallos acumulados desde el último resumen no se pierden al cerrar
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        limitador_login.registrar_resumen(db)
+    finally:
+        db.close()
+
 @app.get("/")
 async def root():
     return RedirectResponse(url="/")
@@ -128,5 +232,60 @@ async def health_check():
         "timestamp": modelos.datetime.now(timezone(timedelta(hours=-5))).isoformat()
     }
 
+def importar_ventas_historicas(argumentos):
+    """python main.py importar ARCHIVO [--procesos N] [--lote N] [--usuario EMAIL]"""
+    import argparse
+    from controllers.importacion_controller import ControladorImportacion, PROCESOS_POR_DEFECTO, LINEAS_POR_LOTE
+    
+    analizador = argparse.ArgumentParser(
+        prog="python main.py importar",
+        description="Importa ventas históricas de un CSV o JSON Lines (opcionalmente .gz)"
+    )
+    analizador.add_argument("archivo")
+    analizador.add_argument("--procesos", type=int, default=PROCESOS_POR_DEFECTO, help="procesos de validación")
+    analizador.add_argument("--lote", type=int, default=LINEAS_POR_LOTE, help="líneas por lote")
+    analizador.add_argument("--usuario", help="email del usuario de las ventas sin usuario (por defecto, la administradora)")
+    opciones = analizador.parse_args(argumentos)
+    
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+    db = SessionLocal()
+    try:
+        consulta = db.query(modelos.Usuario.id)
+        if opciones.usuario:
+            consulta = consulta.filter(modelos.Usuario.email == opciones.usuario)
+        else:
+            consulta = consulta.filter(modelos.Usuario.rol == 'administradora').order_by(modelos.Usuario.id)
+        usuario = consulta.first()
+        if usuario is None:
+            logger.error("No existe el usuario %s", opciones.usuario or "administradora")
+            return 1
+        
+        resultado = ControladorImportacion(db).importar(
+            opciones.archivo, usuario.id, opciones.procesos, opciones.lote
+        )
+    finally:
+        db.close()
+    
+    if 'error' in resultado:
+        logger.error(resultado['error'])
+        return 1
+    for error in resultado['detalle_errores']:
+        logger.warning("Línea %s (venta %s): %s", error['linea'], error['venta'], error['error'])
+    # El ranking y la caché de un servidor ya en marcha son de su proceso
+    logger.info("Si el servidor está en marcha: POST /api/mantenimiento/tareas/refrescar_agregados")
+    return 0
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="localhost", port=8001, reload=True)
\ No newline at end of file
+    bitacora.configurar()
+    crear_tablas()
+    # python main.py importar ventas.csv: carga de ventas históricas
+    if sys.argv[1:2] == ["importar"]:
+        codigo = importar_ventas_historicas(sys.argv[2:])
+        bitacora.detener()
+        sys.exit(codigo)
+    sembrar_datos_ejemplo()
+    # Lo encolado se escribe antes de salir o de ceder el proceso a uvicorn
+    bitacora.detener()
+    # python main.py sembrar: solo prepara la base (despliegues con varios workers)
+    if sys.argv[1:] != ["sembrar"]:
+        uvicorn.run("main:app", host="localhost", port=8001, reload=True)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""Sentencias precompiladas de las rutas más frecuentes.
+
+Cada sentencia se construye una sola vez al importar el módulo y recibe sus
+valores como parámetros enlazados, así su clave de caché no cambia y SQLAlchemy
+reutiliza el SQL compilado en cada ejecución. Las lecturas que no necesitan
+objetos del ORM son proyecciones de columnas (Core).
+
+Uso: ``db.execute(consultas.PRODUCTO_POR_ID, {"producto_id": 5})``.
+"""
+from sqlalchemy import select, insert, bindparam, func, type_coerce, Integer
+from models.modelos import Producto, Usuario, Venta, ItemVenta
+
+# Entidades del ORM (rutas de escritura)
+
+PRODUCTO_POR_ID = select(Producto).where(Producto.id == bindparam("producto_id"))
+
+PRODUCTOS_POR_IDS = select(Producto).where(Producto.id.in_(bindparam("ids", expanding=True)))
+
+USUARIO_POR_EMAIL = select(Usuario).where(Usuario.email == bindparam("email"))
+
+_VENTAS_COMPLETADAS = (
+    Venta.fecha_venta >= bindparam("fecha_inicio"),
+    Venta.fecha_venta <= bindparam("fecha_fin"),
+    Venta.estado == "completada",
+)
+
+VENTAS_PERIODO = select(Venta).where(*_VENTAS_COMPLETADAS).order_by(Venta.fecha_venta.desc())
+
+# Proyecciones (rutas de lectura)
+
+VENTAS_DETALLE_PERIODO = (
+    select(Venta.id, Venta.fecha_venta, Venta.total, Usuario.nombre)
+    .join(Usuario, Venta.usuario_id == Usuario.id)
+    .where(*_VENTAS_COMPLETADAS)
+    .order_by(Venta.fecha_venta.desc())
+)
+
+ITEMS_DETALLE_PERIODO = (
+    select(ItemVenta.venta_id, ItemVenta.cantidad, Producto.nombre, ItemVenta.precio_unitario, ItemVenta.subtotal)
+    .join(Venta, ItemVenta.venta_id == Venta.id)
+    .join(Producto, ItemVenta.producto_id == Producto.id)
+    .where(*_VENTAS_COMPLETADAS)
+    .order_by(ItemVenta.id)
+)
+
+# Agregados de reportes: montos en centavos (type_coerce evita la conversión de Dinero)
+
+_DIA_VENTA = func.date(Venta.fecha_venta)
+_TOTALES_VENTA = (type_coerce(func.sum(Venta.total), Integer), func.count(Venta.id))
+_TOTALES_ITEM = (
+    ItemVenta.producto_id,
+    func.sum(ItemVenta.cantidad),
+    type_coerce(func.sum(ItemVenta.subtotal), Integer),
+    # Costo guardado en el item al vender: no se une con productos
+    type_coerce(func.sum(ItemVenta.cantidad * ItemVenta.costo_unitario), Integer),
+)
+
+TOTALES_VENTAS = select(*_TOTALES_VENTA).where(*_VENTAS_COMPLETADAS)
+
+TOTALES_VENTAS_POR_DIA = select(_DIA_VENTA, *_TOTALES_VENTA).where(*_VENTAS_COMPLETADAS).group_by(_DIA_VENTA)
+
+TOTALES_ITEMS = (
+    select(*_TOTALES_ITEM)
+    .join(Venta, ItemVenta.venta_id == Venta.id)
+    .where(*_VENTAS_COMPLETADAS)
+    .group_by(ItemVenta.producto_id)
+)
+
+TOTALES_ITEMS_POR_DIA = (
+    select(_DIA_VENTA, *_TOTALES_ITEM)
+    .join(Venta, ItemVenta.venta_id == Venta.id)
+    .where(*_VENTAS_COMPLETADAS)
+    .group_by(_DIA_VENTA, ItemVenta.producto_id)
+)
+
+# Carga masiva de ventas históricas: montos ya en centavos (bindparam Integer
+# en lugar de la conversión de Dinero) y los ids en el orden de los parámetros
+
+# Ventas ya importadas con su total (centavos) y fecha, para distinguir una
+# reanudación de otra venta con el mismo número
+VENTAS_POR_REFERENCIA = select(
+    Venta.referencia_externa, type_coerce(Venta.total, Integer), Venta.fecha_venta
+).where(
+    Venta.referencia_externa.in_(bindparam("referencias", expanding=True))
+)
+
+INSERTAR_VENTAS_HISTORICAS = (
+    insert(Venta)
+    .values(total=bindparam("total", type_=Integer))
+    .returning(Venta.id, sort_by_parameter_order=True)
+)
+
+INSERTAR_ITEMS_HISTORICOS = insert(ItemVenta).values(
+    precio_unitario=bindparam("precio_unitario", type_=Integer),
+    subtotal=bindparam("subtotal", type_=Integer),
+    costo_unitario=bindparam("costo_unitario", type_=Integer),
+    descuento=bindparam("descuento", type_=Integer),
+)
@@ -1,12 +1,21 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 # Base de datos SQLite para desarrollo
-DATABASE_URL = "sqlite:///./storevision.db"
+DATABASE_URL = os.environ.get("STOREVISION_DB", "sqlite:///./storevision.db")
 
 motor = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(motor, "connect")
+def configurar_sqlite(conexion_dbapi, registro):
+    # WAL: las lecturas no esperan a las escrituras; el planificador hace los checkpoints
+    cursor = conexion_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SesionLocal = sessionmaker(autocommit=False, autoflush=False, bind=motor)
 
 
@@ -20,4 +29,6 @@ def obtener_db():
         db.close()
 
 def crear_tablas():
-    Base.metadata.create_all(bind=motor)
\ No newline at end of file
+    """Lleva el esquema a la última versión; si ya lo está, cuesta una consulta."""
+    from models.migraciones import migrar_esquema
+    return migrar_esquema(motor)
@@ -0,0 +1,228 @@
+from sqlalchemy import inspect, text, Integer, MetaData
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def crear_esquema_base(conexion):
+    """Crea las tablas e índices que falten; en una base anterior al versionado deja el esquema al día."""
+    from models.database import Base
+
+    Base.metadata.create_all(bind=conexion)
+    # create_all no agrega índices nuevos a tablas que ya existen
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(bind=conexion, checkfirst=True)
+    return True
+
+
+def migrar_costo_items_venta(conexion):
+    """Agrega costo_unitario y categoria a items_venta y los llena con los datos actuales del producto."""
+    columnas = {columna['name'] for columna in inspect(conexion).get_columns('items_venta')}
+    if 'costo_unitario' in columnas and 'categoria' in columnas:
+        return False
+
+    if 'costo_unitario' not in columnas:
+        conexion.execute(text("ALTER TABLE items_venta ADD COLUMN costo_unitario FLOAT"))
+    if 'categoria' not in columnas:
+        conexion.execute(text("ALTER TABLE items_venta ADD COLUMN categoria VARCHAR(50)"))
+
+    # Las ventas anteriores no guardaron el costo: se usa el costo actual del producto
+    resultado = conexion.execute(text(
+        "UPDATE items_venta SET "
+        "costo_unitario = (SELECT costo FROM productos WHERE productos.id = items_venta.producto_id), "
+        "categoria = (SELECT categoria FROM productos WHERE productos.id = items_venta.producto_id) "
+        "WHERE costo_unitario IS NULL"
+    ))
+
+    logger.info("items_venta migrada: %d items con costo histórico", resultado.rowcount)
+    return True
+
+
+def migrar_turno_ventas(conexion):
+    """Agrega a ventas la referencia al turno de caja (las ventas anteriores quedan sin turno)."""
+    columnas = {columna['name'] for columna in inspect(conexion).get_columns('ventas')}
+    if 'turno_id' in columnas:
+        return False
+
+    conexion.execute(text("ALTER TABLE ventas ADD COLUMN turno_id INTEGER REFERENCES turnos_caja(id)"))
+
+    logger.info("ventas migrada: columna turno_id agregada")
+    return True
+
+
+def migrar_promociones(conexion):
+    """Crea la tabla de promociones y agrega a items_venta el descuento y la promoción aplicada."""
+    from models.modelos import Promocion
+
+    Promocion.__table__.create(bind=conexion, checkfirst=True)
+    for indice in Promocion.__table__.indexes:
+        indice.create(bind=conexion, checkfirst=True)
+
+    columnas = {columna['name'] for columna in inspect(conexion).get_columns('items_venta')}
+    if 'descuento' in columnas and 'promocion_id' in columnas:
+        return False
+
+    if 'descuento' not in columnas:
+        conexion.execute(text("ALTER TABLE items_venta ADD COLUMN descuento INTEGER NOT NULL DEFAULT 0"))
+    if 'promocion_id' not in columnas:
+        conexion.execute(text("ALTER TABLE items_venta ADD COLUMN promocion_id INTEGER REFERENCES promociones(id)"))
+
+    logger.info("items_venta migrada: columnas descuento y promocion_id agregadas")
+    return True
+
+
+def migrar_referencia_ventas(conexion):
+    """Agrega a ventas la referencia externa de las ventas importadas, con índice único."""
+    columnas = {columna['name'] for columna in inspect(conexion).get_columns('ventas')}
+
+    if 'referencia_externa' not in columnas:
+        conexion.execute(text("ALTER TABLE ventas ADD COLUMN referencia_externa VARCHAR(64)"))
+    # Varios NULL no chocan en un índice único de SQLite: las ventas de caja no cuentan
+    conexion.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_ventas_referencia_externa ON ventas (referencia_externa)"
+    ))
+
+    if 'referencia_externa' in columnas:
+        return False
+    logger.info("ventas migrada: columna referencia_externa agregada")
+    return True
+
+
+# Columnas de montos que pasaron de Float (pesos) a Dinero (centavos enteros)
+COLUMNAS_DINERO = {
+    'productos': ('precio_venta', 'costo'),
+    'ventas': ('total',),
+    'items_venta': ('precio_unitario', 'subtotal', 'costo_unitario'),
+    'instantaneas_stock': ('costo',),
+}
+
+
+def migrar_dinero_a_centavos(conexion):
+    """Reconstruye las tablas con montos en punto flotante para guardarlos en centavos enteros.
+
+    SQLite no permite cambiar el tipo de una columna: se crea la tabla nueva,
+    se copian los datos multiplicando los montos por 100 y se reemplaza la anterior.
+    """
+    from models.database import Base
+
+    inspector = inspect(conexion)
+    pendientes = []
+    for nombre, columnas_dinero in COLUMNAS_DINERO.items():
+        if not inspector.has_table(nombre):
+            continue
+        tipos = {columna['name']: columna['type'] for columna in inspector.get_columns(nombre)}
+        if any(not isinstance(tipos.get(columna), Integer) for columna in columnas_dinero if columna in tipos):
+            pendientes.append((Base.metadata.tables[nombre], columnas_dinero, set(tipos)))
+
+    if not pendientes:
+        return False
+
+    # Copia del esquema para que las claves foráneas de las tablas temporales resuelvan
+    esquema = MetaData()
+    for tabla in Base.metadata.sorted_tables:
+        tabla.to_metadata(esquema)
+
+    for tabla, columnas_dinero, existentes in pendientes:
+        temporal = tabla.to_metadata(esquema, name=f"{tabla.name}_centavos")
+        conexion.execute(CreateTable(temporal))
+
+        columnas = [columna.name for columna in tabla.columns if columna.name in existentes]
+        origen = [
+            f"CAST(ROUND({columna} * 100) AS INTEGER)" if columna in columnas_dinero else columna
+            for columna in columnas
+        ]
+        conexion.execute(text(
+            f"INSERT INTO {temporal.name} ({', '.join(columnas)}) "
+            f"SELECT {', '.join(origen)} FROM {tabla.name}"
+        ))
+        conexion.execute(text(f"DROP TABLE {tabla.name}"))
+        conexion.execute(text(f"ALTER TABLE {temporal.name} RENAME TO {tabla.name}"))
+        for indice in tabla.indexes:
+            indice.create(bind=conexion)
+
+        logger.info("Montos de %s migrados a centavos", tabla.name)
+
+    return True
+
+
+# Migraciones en orden. Cada cambio de esquema agrega una entrada nueva con la
+# siguiente versión; las ya publicadas no se modifican. Todas son idempotentes
+# para poder llevar al día bases creadas antes del versionado. Reciben la
+# conexión de migrar_esquema, ya dentro de su transacción: no confirman nada.
+MIGRACIONES = [
+    (1, "esquema_base", crear_esquema_base),
+    (2, "costo_items_venta", migrar_costo_items_venta),
+    (3, "dinero_a_centavos", migrar_dinero_a_centavos),
+    (4, "turno_ventas", migrar_turno_ventas),
+    (5, "promociones", migrar_promociones),
+    (6, "referencia_ventas", migrar_referencia_ventas),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# Cuánto espera un proceso a que otro termine de migrar (milisegundos)
+ESPERA_BLOQUEO_MS = 600000
+
+
+def version_actual(motor):
+    """Versión del esquema en una sola consulta (0 si la base no tiene la tabla de versiones)."""
+    try:
+        with motor.connect() as conexion:
+            return conexion.execute(text("SELECT MAX(version) FROM version_esquema")).scalar() or 0
+    except OperationalError:
+        return 0
+
+
+def migrar_esquema(motor):
+    """Aplica las migraciones pendientes y devuelve los nombres de las aplicadas.
+
+    Varios procesos pueden arrancar a la vez sobre la misma base: la versión
+    se vuelve a leer bajo ``BEGIN IMMEDIATE`` y las migraciones pendientes se
+    aplican con sus filas de versión en esa misma transacción. Los demás
+    esperan el bloqueo y encuentran el esquema al día.
+    """
+    if version_actual(motor) >= VERSION_ESQUEMA:
+        return []
+
+    # Los modelos deben estar registrados en Base.metadata
+    import models.modelos  # noqa: F401
+
+    with motor.connect() as conexion:
+        # Sin transacciones implícitas de pysqlite: la transacción es la de BEGIN IMMEDIATE
+        conexion.execution_options(isolation_level="AUTOCOMMIT")
+        espera_anterior = conexion.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conexion.exec_driver_sql(f"PRAGMA busy_timeout = {ESPERA_BLOQUEO_MS}")
+        conexion.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            conexion.execute(text(
+                "CREATE TABLE IF NOT EXISTS version_esquema ("
+                "version INTEGER PRIMARY KEY, nombre VARCHAR(100) NOT NULL, fecha_aplicacion DATETIME NOT NULL)"
+            ))
+            version = conexion.execute(text("SELECT MAX(version) FROM version_esquema")).scalar() or 0
+
+            aplicadas = []
+            for numero, nombre, migracion in MIGRACIONES:
+                if numero <= version:
+                    continue
+                migracion(conexion)
+                conexion.execute(
+                    text("INSERT INTO version_esquema (version, nombre, fecha_aplicacion) VALUES (:version, :nombre, :fecha)"),
+                    {"version": numero, "nombre": nombre, "fecha": datetime.now(timezone(timedelta(hours=-5))).isoformat()}
+                )
+                aplicadas.append(nombre)
+            conexion.exec_driver_sql("COMMIT")
+        except BaseException:
+            # Algunos errores de SQLite ya deshacen la transacción
+            if conexion.connection.dbapi_connection.in_transaction:
+                conexion.exec_driver_sql("ROLLBACK")
+            raise
+        finally:
+            conexion.exec_driver_sql(f"PRAGMA busy_timeout = {espera_anterior}")
+
+    for nombre in aplicadas:
+        logger.info("Migración %s aplicada", nombre)
+    return aplicadas
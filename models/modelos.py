@@ -1,9 +1,36 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index, Float
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 from datetime import datetime, timezone, timedelta
 
+
+def a_centavos(valor):
+    """Pesos (int, float o Decimal) a centavos enteros."""
+    return int(round(valor * 100))
+
+
+def a_pesos(centavos):
+    return centavos / 100
+
+
+class Dinero(TypeDecorator):
+    """Montos guardados como centavos enteros y expuestos en pesos.
+
+    Las sumas en SQL son enteras y exactas; la conversión a pesos ocurre solo
+    al leer, así que la API conserva su formato.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else a_centavos(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else a_pesos(value)
+
 class Usuario(Base):
     __tablename__ = "usuarios"
     
@@ -25,8 +52,8 @@ class Producto(Base):
     codigo = Column(String(50), unique=True, index=True)
     nombre = Column(String(100), nullable=False)
     descripcion = Column(String(255))
-    precio_venta = Column(Float, nullable=False)
-    costo = Column(Float, nullable=False)
+    precio_venta = Column(Dinero, nullable=False)
+    costo = Column(Dinero, nullable=False)
     stock_actual = Column(Integer, default=0)
     stock_minimo = Column(Integer, default=5)
     categoria = Column(String(50))
@@ -47,14 +74,21 @@ class Venta(Base):
     id = Column(Integer, primary_key=True, index=True)
     sucursal_id = Column(Integer, ForeignKey("sucursales.id"), nullable=False)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    total = Column(Float, nullable=False)
+    total = Column(Dinero, nullable=False)
 
     fecha_venta = Column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone(timedelta(hours=-5)))
+        default=lambda: datetime.now(timezone(timedelta(hours=-5))),
+        index=True
     )
 
     estado = Column(String(20), default="completada")  # completada, anulada
+    # Turno de caja abierto al registrar la venta (None si el cajero no abrió turno)
+    turno_id = Column(Integer, ForeignKey("turnos_caja.id"))
+    # Número de ticket del sistema de origen en ventas importadas (None en las de caja).
+    # Su índice único lo crea la migración referencia_ventas: declarado aquí, la
+    # migración del esquema base lo intentaría crear antes de que exista la columna
+    referencia_externa = Column(String(64))
     
     sucursal = relationship("Sucursal")
     usuario = relationship("Usuario")
@@ -65,11 +99,17 @@ class ItemVenta(Base):
     __tablename__ = "items_venta"
     
     id = Column(Integer, primary_key=True, index=True)
-    venta_id = Column(Integer, ForeignKey("ventas.id"), nullable=False)
+    venta_id = Column(Integer, ForeignKey("ventas.id"), nullable=False, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
     cantidad = Column(Integer, nullable=False)
-    precio_unitario = Column(Float, nullable=False)
-    subtotal = Column(Float, nullable=False)
+    precio_unitario = Column(Dinero, nullable=False)
+    subtotal = Column(Dinero, nullable=False)
+    # Costo y categoría del producto al momento de la venta
+    costo_unitario = Column(Dinero)
+    categoria = Column(String(50))
+    # Promoción aplicada al item; subtotal = cantidad * precio_unitario - descuento
+    descuento = Column(Dinero, nullable=False, default=0, server_default="0")
+    promocion_id = Column(Integer, ForeignKey("promociones.id"))
     
     venta = relationship("Venta", back_populates="items")
     producto = relationship("Producto")
@@ -94,6 +134,12 @@ class MovimientoInventario(Base):
     producto = relationship("Producto")
     usuario = relationship("Usuario")
 
+    # Paginación por cursor (fecha_movimiento, id), global y por producto
+    __table_args__ = (
+        Index("ix_movimientos_fecha_id", "fecha_movimiento", "id"),
+        Index("ix_movimientos_producto_fecha_id", "producto_id", "fecha_movimiento", "id"),
+    )
+
 class RegistroAuditoria(Base):
     __tablename__ = "registros_auditoria"
     
@@ -109,4 +155,108 @@ class RegistroAuditoria(Base):
 
     ip_address = Column(String(45))
     
-    usuario = relationship("Usuario")
\ No newline at end of file
+    usuario = relationship("Usuario")
+
+class InstantaneaStock(Base):
+    __tablename__ = "instantaneas_stock"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False, index=True)
+    stock = Column(Integer, nullable=False)
+    costo = Column(Dinero, nullable=False)
+    # Último movimiento incluido en el stock de la instantánea
+    ultimo_movimiento_id = Column(Integer, nullable=False, default=0)
+
+    fecha_instantanea = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone(timedelta(hours=-5))),
+        index=True
+    )
+    
+    producto = relationship("Producto")
+
+class ConciliacionStock(Base):
+    """Punto de control de la conciliación de stock de un producto contra sus movimientos."""
+    __tablename__ = "conciliaciones_stock"
+    
+    producto_id = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    # Movimiento hasta el que se verificó (el máximo es el punto de partida de la siguiente ejecución)
+    ultimo_movimiento_id = Column(Integer, nullable=False, default=0)
+    # Stock que explican los movimientos hasta ese punto
+    stock_esperado = Column(Integer, nullable=False)
+    # stock_nuevo del último movimiento, eslabón para verificar el siguiente
+    ultimo_stock_nuevo = Column(Integer, nullable=False)
+    # stock_actual - stock_esperado en la última conciliación
+    diferencia = Column(Integer, nullable=False, default=0)
+    rupturas = Column(Integer, nullable=False, default=0)
+    ultima_ruptura_id = Column(Integer)
+
+    fecha_conciliacion = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone(timedelta(hours=-5)))
+    )
+    
+    producto = relationship("Producto")
+
+class TurnoCaja(Base):
+    """Turno de caja de un usuario con contadores que se actualizan en cada venta y anulación."""
+    __tablename__ = "turnos_caja"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    estado = Column(String(20), nullable=False, default="abierto")  # abierto, cerrado
+
+    fecha_apertura = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone(timedelta(hours=-5)))
+    )
+    fecha_cierre = Column(DateTime(timezone=True), index=True)
+
+    efectivo_inicial = Column(Dinero, nullable=False, default=0)
+    ventas = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    total_bruto = Column(Dinero, nullable=False, default=0)
+    anulaciones = Column(Integer, nullable=False, default=0)
+    unidades_anuladas = Column(Integer, nullable=False, default=0)
+    total_anulado = Column(Dinero, nullable=False, default=0)
+    # Conteo del cajón al cerrar
+    efectivo_contado = Column(Dinero)
+    
+    usuario = relationship("Usuario")
+
+    # Un solo turno abierto por usuario
+    __table_args__ = (
+        Index("ix_turnos_caja_abierto", "usuario_id", unique=True, sqlite_where=estado == "abierto"),
+    )
+
+class Promocion(Base):
+    """Regla de precio que se aplica en caja a un producto o a una categoría.
+
+    Tipos: ``porcentaje`` (descuento sobre el subtotal), ``lleve_pague``
+    (lleve N pague M unidades) y ``precio_especial`` (precio unitario fijo,
+    solo por producto). Las fechas y la franja horaria limitan su vigencia.
+    """
+    __tablename__ = "promociones"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    nombre = Column(String(100), nullable=False)
+    tipo = Column(String(20), nullable=False)  # porcentaje, lleve_pague, precio_especial
+    producto_id = Column(Integer, ForeignKey("productos.id"), index=True)
+    categoria = Column(String(50), index=True)
+    porcentaje = Column(Float)
+    lleve = Column(Integer)
+    pague = Column(Integer)
+    precio_especial = Column(Dinero)
+    fecha_inicio = Column(DateTime(timezone=True))
+    fecha_fin = Column(DateTime(timezone=True))
+    # Franja diaria en hora local "HH:MM" (fin excluido; puede cruzar la medianoche)
+    hora_inicio = Column(String(5))
+    hora_fin = Column(String(5))
+    activa = Column(Boolean, nullable=False, default=True)
+    fecha_modificacion = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone(timedelta(hours=-5))),
+        onupdate=lambda: datetime.now(timezone(timedelta(hours=-5)))
+    )
+    
+    producto = relationship("Producto")
@@ -113,8 +113,8 @@ async function cargarDashboard() {
             }
         }
         
-        // Cargar productos más vendidos
-        const responseProductos = await fetch('/api/reportes/productos-mas-vendidos', {
+        // Cargar productos más vendidos (ranking en vivo de los últimos 30 días)
+        const responseProductos = await fetch('/api/reportes/productos-mas-vendidos/vivo?ventana=30d&limite=10', {
             headers: {
                 'session-id': sessionId
             }
@@ -1,49 +1,96 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from models.database import obtener_db
-from models.modelos import Producto, Venta, ItemVenta, RegistroAuditoria  # Agregar importaciones
+from models.database import obtener_db, SesionLocal
+from models.modelos import Producto, Venta, ItemVenta, RegistroAuditoria, MovimientoInventario  # Agregar importaciones
 from controllers.ventas_controller import ControladorVentas
 from controllers.inventario_controller import ControladorInventario
+from controllers.turnos_controller import ControladorTurnos
+from controllers.promociones_controller import ControladorPromociones
+from controllers.conciliacion_controller import ControladorConciliacion
 from controllers.auth_controller import ControladorAutenticacion
+from controllers.limitador_controller import limitador_login
 from controllers.reportes_controller import ControladorReportes  # Agregar esta importación
+from controllers.ranking_controller import ranking_ventas
+from controllers.archivo_controller import ControladorArchivo, DIAS_RETENCION
+from controllers.instantaneas_controller import ControladorInstantaneas
+from controllers.busqueda_controller import ControladorBusqueda, indice_productos
+from controllers.mantenimiento_controller import planificador_mantenimiento
+from controllers.diagnostico_controller import perfilador_muestreo, trazador_memoria, registro_peticiones
+from controllers.captura_controller import captura_trafico
+from controllers.bitacora_controller import bitacora
+from controllers.exportacion_controller import ControladorExportacion, AGRUPACIONES_BALANCE
+from views.respuestas import RespuestaJSON
+from views.exportacion import generar_csv, generar_xlsx, TIPOS_CONTENIDO
+from views.estaticos import catalogo_estaticos, PREFIJO_RECURSOS
 from datetime import datetime
+import math
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 # Simulación de sesión (en producción usar JWT)
 usuarios_activos = {}
 
-# Vistas de la interfaz web
+# Vistas de la interfaz web (prerenderizadas al iniciar, ver views/estaticos.py)
 @router.get("/", response_class=HTMLResponse)
 async def pagina_principal(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return catalogo_estaticos.pagina(request, "/")
 
 @router.get("/ventas", response_class=HTMLResponse)
 async def pagina_ventas(request: Request):
-    return templates.TemplateResponse("ventas.html", {"request": request})
+    return catalogo_estaticos.pagina(request, "/ventas")
 
 @router.get("/inventario", response_class=HTMLResponse)
 async def pagina_inventario(request: Request):
-    return templates.TemplateResponse("inventario.html", {"request": request})
+    return catalogo_estaticos.pagina(request, "/inventario")
 
 @router.get("/reportes", response_class=HTMLResponse)
 async def pagina_reportes(request: Request):
-    return templates.TemplateResponse("reportes.html", {"request": request})
+    return catalogo_estaticos.pagina(request, "/reportes")
+
+@router.get(PREFIJO_RECURSOS + "/{nombre:path}")
+async def obtener_recurso(nombre: str, request: Request):
+    respuesta = catalogo_estaticos.recurso(request, nombre)
+    if respuesta is None:
+        raise HTTPException(status_code=404, detail="Recurso no encontrado")
+    return respuesta
 
 # API Endpoints
 @router.post("/api/login")
 async def login(request: Request, db: Session = Depends(obtener_db)):
     datos = await request.json()
-    controlador_auth = ControladorAutenticacion(db)
+    ip = request.client.host
     
-    usuario = controlador_auth.autenticar_usuario(
-        datos['email'], 
-        datos['password'],
-        request.client.host
-    )
+    # Límite por email e IP antes de bcrypt y de cualquier consulta
+    espera = limitador_login.verificar(datos.get('email'), ip)
+    if espera > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiados intentos de inicio de sesión. Intente más tarde",
+            headers={"Retry-After": str(math.ceil(espera))}
+        )
+    
+    # Espera un cupo de bcrypt en el threadpool; solo se rechaza si la cola no avanza
+    cupo = await run_in_threadpool(limitador_login.ocupar_verificacion)
+    if cupo is None:
+        raise HTTPException(
+            status_code=429,
+            detail="Servidor ocupado verificando credenciales. Intente de nuevo",
+            headers={"Retry-After": "1"}
+        )
+    
+    try:
+        controlador_auth = ControladorAutenticacion(db)
+        # bcrypt es costoso en CPU: fuera del event loop para no frenar la caja
+        usuario = await run_in_threadpool(
+            controlador_auth.autenticar_usuario,
+            datos['email'],
+            datos['password'],
+            ip
+        )
+    finally:
+        limitador_login.liberar_verificacion(cupo)
     
     if not usuario:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
@@ -86,6 +133,76 @@ async def crear_venta(request: Request, db: Session = Depends(obtener_db)):
     
     return resultado
 
+def _usuario_sesion(request: Request):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    return usuarios_activos[session_id]
+
+@router.post("/api/turnos/abrir")
+async def abrir_turno(request: Request, db: Session = Depends(obtener_db)):
+    usuario = _usuario_sesion(request)
+    datos = await request.json()
+    
+    resultado = ControladorTurnos(db).abrir_turno(usuario['usuario_id'], datos.get('efectivo_inicial', 0))
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/turnos/actual")
+async def obtener_turno_actual(request: Request, db: Session = Depends(obtener_db)):
+    usuario = _usuario_sesion(request)
+    
+    resultado = ControladorTurnos(db).obtener_turno_actual(usuario['usuario_id'])
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=404, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/turnos/cerrar")
+async def cerrar_turno(request: Request, db: Session = Depends(obtener_db)):
+    usuario = _usuario_sesion(request)
+    datos = await request.json()
+    
+    resultado = ControladorTurnos(db).cerrar_turno(usuario['usuario_id'], datos.get('efectivo_contado'))
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/turnos")
+async def obtener_turnos(
+    request: Request,
+    fecha_inicio: str = None,
+    fecha_fin: str = None,
+    usuario_id: int = None,
+    db: Session = Depends(obtener_db)
+):
+    if _usuario_sesion(request)['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver los cierres de caja")
+    
+    try:
+        inicio = datetime.fromisoformat(fecha_inicio) if fecha_inicio else None
+        fin = datetime.fromisoformat(fecha_fin) if fecha_fin else None
+        # Una fecha sin hora como fin incluye el día completo
+        if fin and len(fecha_fin) == 10:
+            fin = fin.replace(hour=23, minute=59, second=59, microsecond=999999)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    resultado = ControladorTurnos(db).obtener_turnos(inicio, fin, usuario_id)
+    
+    if isinstance(resultado, dict) and 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
 @router.get("/api/ventas/consolidado")
 async def obtener_consolidado_ventas(db: Session = Depends(obtener_db)):
     controlador_ventas = ControladorVentas(db)
@@ -98,6 +215,28 @@ async def obtener_alertas_inventario(db: Session = Depends(obtener_db)):
     alertas = controlador_inventario.verificar_alertas_inventario()
     return alertas
 
+@router.get("/api/inventario/reabastecimiento")
+async def obtener_sugerencias_reabastecimiento(
+    dias_historia: int = 90,
+    dias_entrega: int = 3,
+    dias_revision: int = 7,
+    nivel_servicio: float = 0.95,
+    solo_alertas: bool = False,
+    db: Session = Depends(obtener_db)
+):
+    # NumPy se importa con el primer cálculo, no al arrancar
+    from controllers.reabastecimiento_controller import ControladorReabastecimiento
+    
+    controlador_reabastecimiento = ControladorReabastecimiento(db)
+    sugerencias = controlador_reabastecimiento.calcular_sugerencias(
+        dias_historia, dias_entrega, dias_revision, nivel_servicio, solo_alertas
+    )
+    
+    if isinstance(sugerencias, dict) and 'error' in sugerencias:
+        raise HTTPException(status_code=400, detail=sugerencias['error'])
+    
+    return sugerencias
+
 @router.get("/api/reportes/productos-mas-vendidos")
 async def obtener_productos_mas_vendidos(
     fecha_inicio: str = None,
@@ -119,6 +258,16 @@ async def obtener_productos_mas_vendidos(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo productos más vendidos: {str(e)}")
 
+@router.get("/api/reportes/productos-mas-vendidos/vivo")
+async def obtener_productos_mas_vendidos_vivo(ventana: str = '7d', limite: int = 10):
+    # Ranking en memoria (hoy, 7d, 30d) sin consultar la base de datos
+    productos = ranking_ventas.top(ventana, limite)
+    
+    if isinstance(productos, dict) and 'error' in productos:
+        raise HTTPException(status_code=400, detail=productos['error'])
+    
+    return productos
+
 @router.post("/api/inventario/movimientos")
 async def registrar_movimiento_inventario(request: Request, db: Session = Depends(obtener_db)):
     datos = await request.json()
@@ -140,19 +289,11 @@ async def registrar_movimiento_inventario(request: Request, db: Session = Depend
 @router.get("/api/inventario/productos")
 async def obtener_productos_inventario(db: Session = Depends(obtener_db)):
     try:
-        productos = db.query(Producto).filter(Producto.activo == True).all()
-        return [
-            {
-                "id": p.id,
-                "codigo": p.codigo,
-                "nombre": p.nombre,
-                "categoria": p.categoria,
-                "stock_actual": p.stock_actual,
-                "stock_minimo": p.stock_minimo,
-                "precio_venta": p.precio_venta
-            }
-            for p in productos
-        ]
+        productos = db.query(
+            Producto.id, Producto.codigo, Producto.nombre, Producto.categoria,
+            Producto.stock_actual, Producto.stock_minimo, Producto.precio_venta
+        ).filter(Producto.activo == True).all()
+        return RespuestaJSON([dict(p._mapping) for p in productos])
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo productos: {str(e)}")
 
@@ -161,6 +302,7 @@ async def obtener_historial_inventario(
     producto_id: int = None,
     fecha_inicio: str = None,
     fecha_fin: str = None,
+    incluir_archivo: bool = False,
     db: Session = Depends(obtener_db)
 ):
     try:
@@ -170,13 +312,13 @@ async def obtener_historial_inventario(
         fecha_fin_dt = datetime.fromisoformat(fecha_fin) if fecha_fin else None
         
         historial = controlador_inventario.obtener_historial_movimientos(
-            producto_id, fecha_inicio_dt, fecha_fin_dt
+            producto_id, fecha_inicio_dt, fecha_fin_dt, incluir_archivo
         )
         
         if isinstance(historial, dict) and 'error' in historial:
             raise HTTPException(status_code=400, detail=historial['error'])
         
-        return [
+        return RespuestaJSON([
             {
                 "fecha_movimiento": m.fecha_movimiento,
                 "producto": {"nombre": m.producto.nombre},
@@ -188,11 +330,182 @@ async def obtener_historial_inventario(
                 "usuario": {"nombre": m.usuario.nombre}
             }
             for m in historial
-        ]
+        ])
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo historial: {str(e)}")
 
+@router.get("/api/inventario/libro")
+async def obtener_libro_inventario(
+    producto_id: int = None,
+    fecha_inicio: str = None,
+    fecha_fin: str = None,
+    cursor: str = None,
+    limite: int = 100,
+    db: Session = Depends(obtener_db)
+):
+    try:
+        fecha_inicio_dt = datetime.fromisoformat(fecha_inicio) if fecha_inicio else None
+        fecha_fin_dt = datetime.fromisoformat(fecha_fin) if fecha_fin else None
+        # Una fecha sin hora como fin incluye el día completo
+        if fecha_fin_dt and len(fecha_fin) == 10:
+            fecha_fin_dt = fecha_fin_dt.replace(hour=23, minute=59, second=59, microsecond=999999)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    resultado = ControladorInventario(db).obtener_libro_movimientos(
+        producto_id, fecha_inicio_dt, fecha_fin_dt, cursor, min(max(limite, 1), 500)
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return RespuestaJSON(resultado)
+
+@router.post("/api/inventario/instantaneas")
+async def tomar_instantanea_stock(request: Request, db: Session = Depends(obtener_db)):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if usuarios_activos[session_id]['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para tomar instantáneas de stock")
+    
+    resultado = ControladorInstantaneas(db).tomar_instantanea()
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/inventario/conciliacion")
+async def conciliar_stock(request: Request, reiniciar: bool = False, db: Session = Depends(obtener_db)):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if usuarios_activos[session_id]['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para conciliar el stock")
+    
+    resultado = await run_in_threadpool(ControladorConciliacion(db).conciliar, reiniciar)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/inventario/conciliacion")
+async def obtener_discrepancias_stock(request: Request, db: Session = Depends(obtener_db)):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if usuarios_activos[session_id]['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver la conciliación de stock")
+    
+    resultado = ControladorConciliacion(db).obtener_discrepancias()
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/inventario/stock-a-fecha")
+async def obtener_stock_a_fecha(
+    fecha: str,
+    producto_id: int = None,
+    db: Session = Depends(obtener_db)
+):
+    try:
+        controlador_instantaneas = ControladorInstantaneas(db)
+        resultado = controlador_instantaneas.obtener_stock_a_fecha(
+            datetime.fromisoformat(fecha), producto_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error calculando stock a fecha: {str(e)}")
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/inventario/stock-historico")
+async def obtener_stock_historico(
+    producto_id: int,
+    fecha_inicio: str,
+    fecha_fin: str,
+    db: Session = Depends(obtener_db)
+):
+    try:
+        controlador_instantaneas = ControladorInstantaneas(db)
+        serie = controlador_instantaneas.obtener_serie_stock(
+            producto_id, datetime.fromisoformat(fecha_inicio), datetime.fromisoformat(fecha_fin)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error calculando serie de stock: {str(e)}")
+    
+    if isinstance(serie, dict) and 'error' in serie:
+        raise HTTPException(status_code=400, detail=serie['error'])
+    
+    return serie
+
+@router.post("/api/mantenimiento/archivar")
+async def archivar_historicos(request: Request, db: Session = Depends(obtener_db)):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    usuario = usuarios_activos[session_id]
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para archivar históricos")
+    
+    # Todos los parámetros son opcionales: el cuerpo puede venir vacío
+    datos = await request.json() if await request.body() else {}
+    controlador_archivo = ControladorArchivo(db)
+    resultado = controlador_archivo.archivar(
+        datos.get('dias_retencion', DIAS_RETENCION), usuario['usuario_id']
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/mantenimiento/estado")
+async def obtener_estado_mantenimiento(request: Request, limite: int = 50):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if usuarios_activos[session_id]['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver el mantenimiento")
+    
+    return planificador_mantenimiento.estado(limite)
+
+@router.post("/api/mantenimiento/tareas/{nombre}")
+async def ejecutar_tarea_mantenimiento(nombre: str, request: Request):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    if usuarios_activos[session_id]['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para ejecutar tareas de mantenimiento")
+    
+    # La tarea bloquea hasta terminar (o agotar su tiempo): fuera del event loop
+    resultado = await run_in_threadpool(planificador_mantenimiento.ejecutar, nombre)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=404, detail=resultado['error'])
+    
+    return resultado
+
 @router.get("/api/reportes/balance")
 async def obtener_balance_economico(
     fecha_inicio: str,
@@ -235,6 +548,114 @@ async def obtener_indicadores_ventas(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo indicadores: {str(e)}")
 
+@router.get("/api/reportes/analisis-abc")
+async def obtener_analisis_abc(
+    fecha_inicio: str,
+    fecha_fin: str,
+    umbral_a: float = 0.8,
+    umbral_b: float = 0.95,
+    dias_cobertura: float = 90,
+    limite: int = 200,
+    clase: str = None,
+    db: Session = Depends(obtener_db)
+):
+    # NumPy se importa con el primer análisis, no al arrancar
+    from controllers.analisis_controller import ControladorAnalisis
+    
+    try:
+        inicio, fin = _rango_exportacion(fecha_inicio, fecha_fin)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    resultado = await run_in_threadpool(
+        ControladorAnalisis(db).analizar, inicio, fin, umbral_a, umbral_b, dias_cobertura,
+        max(1, min(limite, 5000)), clase
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return RespuestaJSON(resultado)
+
+def _rango_exportacion(fecha_inicio: str, fecha_fin: str):
+    inicio = datetime.fromisoformat(fecha_inicio)
+    fin = datetime.fromisoformat(fecha_fin)
+    # Una fecha sin hora como fin incluye el día completo
+    if len(fecha_fin) == 10:
+        fin = fin.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return inicio, fin
+
+def _respuesta_exportacion(nombre: str, formato: str, generar_filas):
+    """Descarga en streaming; la sesión de base de datos vive mientras se envían las filas."""
+    if formato not in TIPOS_CONTENIDO:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}. Opciones: csv, xlsx")
+    
+    def contenido():
+        db = SesionLocal()
+        try:
+            encabezados, filas = generar_filas(ControladorExportacion(db))
+            if formato == 'xlsx':
+                yield from generar_xlsx(encabezados, filas, hoja=nombre.split('_')[0])
+            else:
+                yield from generar_csv(encabezados, filas)
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        contenido(),
+        media_type=TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'}
+    )
+
+@router.get("/api/exportar/ventas")
+async def exportar_ventas(fecha_inicio: str, fecha_fin: str, formato: str = 'csv'):
+    try:
+        inicio, fin = _rango_exportacion(fecha_inicio, fecha_fin)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    return _respuesta_exportacion(
+        f"ventas_{inicio.date()}_{fin.date()}", formato,
+        lambda controlador: controlador.exportar_ventas(inicio, fin)
+    )
+
+@router.get("/api/exportar/movimientos")
+async def exportar_movimientos(
+    fecha_inicio: str,
+    fecha_fin: str,
+    producto_id: int = None,
+    formato: str = 'csv'
+):
+    try:
+        inicio, fin = _rango_exportacion(fecha_inicio, fecha_fin)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    return _respuesta_exportacion(
+        f"movimientos_{inicio.date()}_{fin.date()}", formato,
+        lambda controlador: controlador.exportar_movimientos(inicio, fin, producto_id)
+    )
+
+@router.get("/api/exportar/balance")
+async def exportar_balance(
+    fecha_inicio: str,
+    fecha_fin: str,
+    agrupar: str = 'dia',
+    formato: str = 'csv'
+):
+    try:
+        inicio, fin = _rango_exportacion(fecha_inicio, fecha_fin)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    if agrupar not in AGRUPACIONES_BALANCE:
+        raise HTTPException(status_code=400, detail=f"Agrupación no soportada: {agrupar}. Opciones: {', '.join(AGRUPACIONES_BALANCE)}")
+    
+    return _respuesta_exportacion(
+        f"balance_{agrupar}_{inicio.date()}_{fin.date()}", formato,
+        lambda controlador: controlador.exportar_balance(inicio, fin, agrupar)
+    )
+
 @router.get("/api/ventas")
 async def obtener_ventas(
     fecha: str = None,
@@ -250,35 +671,94 @@ async def obtener_ventas(
             fecha_inicio = datetime.utcnow().replace(hour=0, minute=0, second=0)
             fecha_fin = datetime.utcnow().replace(hour=23, minute=59, second=59)
         
-        ventas = controlador_ventas.obtener_ventas_por_periodo(
+        ventas = controlador_ventas.obtener_ventas_detalle_por_periodo(
             fecha_inicio, fecha_fin
         )
         
         if isinstance(ventas, dict) and 'error' in ventas:
             raise HTTPException(status_code=400, detail=ventas['error'])
         
-        return [
-            {
-                "id": v.id,
-                "fecha_venta": v.fecha_venta,
-                "total": v.total,
-                "usuario": {"nombre": v.usuario.nombre},
-                "items": [
-                    {
-                        "cantidad": i.cantidad,
-                        "producto": {"nombre": i.producto.nombre},
-                        "precio_unitario": i.precio_unitario,
-                        "subtotal": i.subtotal
-                    }
-                    for i in v.items
-                ]
-            }
-            for v in ventas
-        ]
+        return RespuestaJSON(ventas)
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo ventas: {str(e)}")
     
+@router.post("/api/ventas/anular-lote")
+async def anular_ventas_lote(request: Request, db: Session = Depends(obtener_db)):
+    session_id = request.headers.get('session-id')
+    
+    if not session_id or session_id not in usuarios_activos:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    usuario = usuarios_activos[session_id]
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para anular ventas")
+    
+    datos = await request.json()
+    try:
+        fecha_inicio = datetime.fromisoformat(datos['fecha_inicio']) if datos.get('fecha_inicio') else None
+        fecha_fin = datetime.fromisoformat(datos['fecha_fin']) if datos.get('fecha_fin') else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fechas inválidas: {str(e)}")
+    
+    controlador_ventas = ControladorVentas(db)
+    resultado = controlador_ventas.anular_ventas(
+        usuario['usuario_id'],
+        datos.get('motivo', 'Sin motivo especificado'),
+        venta_ids=datos.get('venta_ids'),
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        cajero_id=datos.get('cajero_id')
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+# Importación de ventas históricas desde archivos del directorio de importación
+@router.post("/api/ventas/importar")
+async def importar_ventas(request: Request):
+    usuario = _usuario_sesion(request)
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para importar ventas")
+    
+    # Carga diferida: la importación trae el pool de procesos
+    from controllers.importacion_controller import importacion_ventas, PROCESOS_POR_DEFECTO, LINEAS_POR_LOTE
+    
+    if importacion_ventas.en_curso:
+        raise HTTPException(status_code=409, detail="Ya hay una importación en curso")
+    
+    datos = await request.json()
+    if not datos.get('archivo'):
+        raise HTTPException(status_code=400, detail="Indique el archivo a importar")
+    
+    resultado = importacion_ventas.iniciar(
+        datos['archivo'],
+        usuario['usuario_id'],
+        int(datos.get('procesos', PROCESOS_POR_DEFECTO)),
+        int(datos.get('lote', LINEAS_POR_LOTE))
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/ventas/importar")
+async def estado_importacion_ventas(request: Request):
+    """Progreso de la importación en curso o resultado de la última."""
+    usuario = _usuario_sesion(request)
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para importar ventas")
+    
+    from controllers.importacion_controller import importacion_ventas
+    
+    return importacion_ventas.estado()
+
 @router.post("/api/ventas/{venta_id}/anular")
 async def anular_venta(
     venta_id: int,
@@ -313,21 +793,24 @@ async def anular_venta(
 @router.get("/api/productos")
 async def obtener_productos(db: Session = Depends(obtener_db)):
     try:
-        productos = db.query(Producto).filter(Producto.activo == True).all()
-        return [
-            {
-                "id": p.id,
-                "nombre": p.nombre,
-                "precio_venta": p.precio_venta,
-                "stock_actual": p.stock_actual,
-                "categoria": p.categoria,
-                "codigo": p.codigo
-            }
-            for p in productos
-        ]
+        productos = db.query(
+            Producto.id, Producto.nombre, Producto.precio_venta,
+            Producto.stock_actual, Producto.categoria, Producto.codigo
+        ).filter(Producto.activo == True).all()
+        return RespuestaJSON([dict(p._mapping) for p in productos])
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error obteniendo productos: {str(e)}")
     
+@router.get("/api/productos/buscar")
+async def buscar_productos(q: str, limite: int = 10, db: Session = Depends(obtener_db)):
+    controlador_busqueda = ControladorBusqueda(db)
+    productos = controlador_busqueda.buscar_productos(q, min(max(limite, 1), 50))
+    
+    if isinstance(productos, dict) and 'error' in productos:
+        raise HTTPException(status_code=400, detail=productos['error'])
+    
+    return productos
+    
 @router.post("/api/inventario/productos")
 async def crear_producto(request: Request, db: Session = Depends(obtener_db)):
     try:
@@ -361,6 +844,20 @@ async def crear_producto(request: Request, db: Session = Depends(obtener_db)):
         
         db.add(nuevo_producto)
         
+        if nuevo_producto.stock_actual:
+            # Entrada de apertura: el stock a una fecha y la conciliación reconstruyen
+            # el stock desde los movimientos y sin ella partirían de 0
+            db.flush()
+            db.add(MovimientoInventario(
+                producto_id=nuevo_producto.id,
+                tipo_movimiento='entrada',
+                cantidad=nuevo_producto.stock_actual,
+                stock_anterior=0,
+                stock_nuevo=nuevo_producto.stock_actual,
+                motivo="Stock inicial al crear el producto",
+                usuario_id=usuario['usuario_id']
+            ))
+        
         # Registrar en auditoría
         auditoria = RegistroAuditoria(
             usuario_id=usuario['usuario_id'],
@@ -372,6 +869,9 @@ async def crear_producto(request: Request, db: Session = Depends(obtener_db)):
         
         db.commit()
         
+        ranking_ventas.registrar_producto(nuevo_producto)
+        indice_productos.actualizar(nuevo_producto)
+        
         return {"mensaje": "Producto creado exitosamente", "producto_id": nuevo_producto.id}
         
     except Exception as e:
@@ -380,6 +880,178 @@ async def crear_producto(request: Request, db: Session = Depends(obtener_db)):
     
 
 
+@router.get("/api/promociones")
+async def obtener_promociones(request: Request, incluir_inactivas: bool = False, db: Session = Depends(obtener_db)):
+    _usuario_sesion(request)
+    
+    resultado = ControladorPromociones(db).obtener_promociones(incluir_inactivas)
+    
+    if isinstance(resultado, dict) and 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/promociones")
+async def crear_promocion(request: Request, db: Session = Depends(obtener_db)):
+    usuario = _usuario_sesion(request)
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para crear promociones")
+    
+    datos = await request.json()
+    # Compila de nuevo los índices al guardar: fuera del event loop
+    resultado = await run_in_threadpool(ControladorPromociones(db).crear_promocion, datos, usuario['usuario_id'])
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/promociones/cotizar")
+async def cotizar_canasta(request: Request, db: Session = Depends(obtener_db)):
+    _usuario_sesion(request)
+    datos = await request.json()
+    
+    if not datos.get('items'):
+        raise HTTPException(status_code=400, detail="Debe agregar productos a la canasta")
+    
+    resultado = ControladorPromociones(db).cotizar(datos['items'])
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/promociones/{promocion_id}/desactivar")
+async def desactivar_promocion(promocion_id: int, request: Request, db: Session = Depends(obtener_db)):
+    usuario = _usuario_sesion(request)
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para desactivar promociones")
+    
+    resultado = await run_in_threadpool(
+        ControladorPromociones(db).desactivar_promocion, promocion_id, usuario['usuario_id']
+    )
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+# Diagnóstico en producción (solo administradora). Nada queda activo salvo
+# mientras se perfila, se traza memoria, se registran peticiones en curso o
+# se captura el tráfico.
+def _administradora_diagnostico(request: Request):
+    usuario = _usuario_sesion(request)
+    
+    if usuario['rol'] != 'administradora':
+        raise HTTPException(status_code=403, detail="No tiene permisos para el diagnóstico")
+    
+    return usuario
+
+@router.post("/api/diagnostico/perfil", response_class=PlainTextResponse)
+async def perfilar_aplicacion(request: Request, segundos: float = 10, intervalo_ms: float = 5, inactivos: bool = False):
+    """Pilas plegadas (formato de flamegraph.pl / speedscope) muestreadas durante ``segundos``."""
+    _administradora_diagnostico(request)
+    
+    resultado = await run_in_threadpool(perfilador_muestreo.perfilar, segundos, intervalo_ms, inactivos)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=409, detail=resultado['error'])
+    
+    return PlainTextResponse(resultado['pilas'], headers={
+        "X-Muestras": str(resultado['muestras']),
+        "X-Duracion-Segundos": str(resultado['duracion_segundos'])
+    })
+
+@router.post("/api/diagnostico/memoria/iniciar")
+async def iniciar_trazado_memoria(request: Request, marcos: int = 10, limite_segundos: int = 600):
+    _administradora_diagnostico(request)
+    
+    resultado = trazador_memoria.iniciar(marcos, limite_segundos)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=409, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/diagnostico/memoria/instantanea")
+async def instantanea_memoria(request: Request, top: int = 20, agrupar: str = "lineno"):
+    _administradora_diagnostico(request)
+    
+    resultado = await run_in_threadpool(trazador_memoria.instantanea, max(1, min(top, 200)), agrupar)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/diagnostico/memoria/detener")
+async def detener_trazado_memoria(request: Request):
+    _administradora_diagnostico(request)
+    
+    resultado = trazador_memoria.detener()
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=409, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/diagnostico/peticiones")
+async def activar_registro_peticiones(request: Request, activo: bool = True):
+    _administradora_diagnostico(request)
+    return registro_peticiones.activar(activo)
+
+@router.get("/api/diagnostico/peticiones")
+async def obtener_peticiones_en_curso(request: Request):
+    _administradora_diagnostico(request)
+    return registro_peticiones.en_curso()
+
+@router.post("/api/diagnostico/captura/iniciar")
+async def iniciar_captura_trafico(request: Request):
+    """Empieza a grabar el tráfico para repetirlo con benchmarks/repetir_captura.py."""
+    _administradora_diagnostico(request)
+    
+    resultado = await run_in_threadpool(captura_trafico.iniciar)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=409, detail=resultado['error'])
+    
+    return resultado
+
+@router.post("/api/diagnostico/captura/detener")
+async def detener_captura_trafico(request: Request):
+    _administradora_diagnostico(request)
+    
+    resultado = await run_in_threadpool(captura_trafico.detener)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=409, detail=resultado['error'])
+    
+    return resultado
+
+@router.get("/api/diagnostico/captura")
+async def estado_captura_trafico(request: Request):
+    _administradora_diagnostico(request)
+    return captura_trafico.estado()
+
+@router.get("/api/diagnostico/bitacora")
+async def estado_bitacora(request: Request):
+    _administradora_diagnostico(request)
+    return bitacora.estado()
+
+@router.post("/api/diagnostico/bitacora/nivel")
+async def fijar_nivel_bitacora(request: Request, modulo: str, nivel: str):
+    """Nivel de un módulo en caliente (``NOTSET`` vuelve al nivel general)."""
+    _administradora_diagnostico(request)
+    
+    resultado = bitacora.fijar_nivel(modulo, nivel)
+    
+    if 'error' in resultado:
+        raise HTTPException(status_code=400, detail=resultado['error'])
+    
+    return resultado
+
 @router.get("/api/debug/ventas")
 async def debug_ventas(db: Session = Depends(obtener_db)):
     """Endpoint temporal para debug de ventas"""
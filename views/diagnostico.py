@@ -0,0 +1,134 @@
+import logging
+import time
+
+from controllers.bitacora_controller import peticion_actual, nuevo_id_peticion
+from controllers.diagnostico_controller import registro_peticiones
+from controllers.captura_controller import captura_trafico, PREFIJOS_EXCLUIDOS, MAX_RESPUESTA
+
+# Una línea por petición (método, ruta, estado, duración) con su id. Apagada
+# por defecto (ver NIVELES_POR_DEFECTO); se enciende con
+# STOREVISION_LOG_NIVELES=peticiones=INFO o POST /api/diagnostico/bitacora/nivel
+logger_peticiones = logging.getLogger("peticiones")
+
+
+class MiddlewarePeticiones:
+    """Anota las peticiones HTTP en curso en ``registro_peticiones``.
+
+    Con el registro apagado solo cuesta leer un atributo por petición.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not registro_peticiones.activo or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        peticion_id = registro_peticiones.entrar(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            registro_peticiones.salir(peticion_id)
+
+
+class MiddlewareCaptura:
+    """Pasa a ``captura_trafico`` cada petición con su cuerpo, estado y duración.
+
+    Va por dentro de la compresión para ver las respuestas sin comprimir. Solo
+    guarda el cuerpo de las respuestas de POST JSON pequeñas, de donde salen
+    los ids generados (sesión, venta...). Con la captura apagada solo cuesta
+    leer un atributo por petición.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (not captura_trafico.activa or scope["type"] != "http"
+                or scope["path"].startswith(PREFIJOS_EXCLUIDOS)):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        cuerpo = []
+        respuesta = []
+        estado = 0
+        guardar_respuesta = False
+
+        async def recibir():
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                cuerpo.append(mensaje.get("body", b""))
+            return mensaje
+
+        async def enviar(mensaje):
+            nonlocal estado, guardar_respuesta
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                if scope["method"] == "POST":
+                    cabeceras = dict(mensaje.get("headers", []))
+                    longitud = cabeceras.get(b"content-length")
+                    guardar_respuesta = (
+                        cabeceras.get(b"content-type", b"").startswith(b"application/json")
+                        and b"content-encoding" not in cabeceras
+                        and longitud is not None and int(longitud) <= MAX_RESPUESTA
+                    )
+            elif mensaje["type"] == "http.response.body" and guardar_respuesta:
+                respuesta.append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, recibir, enviar)
+        finally:
+            captura_trafico.registrar(
+                scope, inicio, b"".join(cuerpo), estado, b"".join(respuesta), time.perf_counter() - inicio
+            )
+
+
+class MiddlewareBitacora:
+    """Da a cada petición un id (el de ``X-Request-Id`` si llega uno) y registra su duración.
+
+    El id queda en ``peticion_actual`` para que todos los registros de la
+    petición, también los de run_in_threadpool, lo lleven, y vuelve al
+    cliente en la cabecera ``X-Request-Id``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        peticion_id = None
+        for clave, valor in scope["headers"]:
+            if clave == b"x-request-id":
+                peticion_id = valor.decode("latin-1")[:64]
+                break
+        if peticion_id is None:
+            peticion_id = nuevo_id_peticion()
+        cabecera = (b"x-request-id", peticion_id.encode("latin-1"))
+        token = peticion_actual.set(peticion_id)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                mensaje["headers"] = [*mensaje.get("headers", ()), cabecera]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if logger_peticiones.isEnabledFor(logging.INFO):
+                duracion = round((time.perf_counter() - inicio) * 1000, 2)
+                logger_peticiones.info(
+                    "%s %s %s %s ms", scope["method"], scope["path"], estado, duracion,
+                    extra={"metodo": scope["method"], "ruta": scope["path"], "estado": estado,
+                           "duracion_ms": duracion}
+                )
+            peticion_actual.reset(token)
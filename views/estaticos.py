@@ -0,0 +1,159 @@
+from fastapi.responses import Response
+from views.respuestas import elegir_codificacion, brotli
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+# Páginas de la interfaz: no dependen de datos del servidor y se renderizan una vez
+PAGINAS = {
+    '/': 'dashboard.html',
+    '/ventas': 'ventas.html',
+    '/inventario': 'inventario.html',
+    '/reportes': 'reportes.html',
+}
+
+# Prefijo de los recursos con huella de contenido en el nombre
+PREFIJO_RECURSOS = '/recursos'
+
+# Los recursos con huella nunca cambian; las páginas se revalidan con su ETag
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_PAGINA = 'no-cache'
+
+
+class Recurso:
+    """Contenido precalculado: cuerpo original, variantes comprimidas y ETag."""
+
+    __slots__ = ('cuerpo', 'variantes', 'huella', 'tipo', 'cache')
+
+    def __init__(self, cuerpo: bytes, tipo: str, cache: str):
+        self.cuerpo = cuerpo
+        self.tipo = tipo
+        self.cache = cache
+        self.huella = hashlib.sha256(cuerpo).hexdigest()[:16]
+        self.variantes = {'gzip': gzip.compress(cuerpo, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variantes['br'] = brotli.compress(cuerpo, quality=11)
+
+    def etag(self, codificacion: str = None):
+        return f'"{self.huella}-{codificacion}"' if codificacion else f'"{self.huella}"'
+
+
+def _coincide_etag(if_none_match: str, recurso: Recurso):
+    for etiqueta in if_none_match.split(','):
+        etiqueta = etiqueta.strip()
+        if etiqueta == '*':
+            return True
+        if etiqueta.startswith('W/'):
+            etiqueta = etiqueta[2:]
+        # Cualquier variante (gzip, br o sin comprimir) representa el mismo contenido
+        if etiqueta.strip('"').split('-')[0] == recurso.huella:
+            return True
+    return False
+
+
+class CatalogoEstaticos:
+    """Páginas prerenderizadas y recursos estáticos con huella, listos para servir.
+
+    Al cargar se calcula el hash de cada archivo de ``static`` y se publica
+    como ``/recursos/<nombre>.<hash>.<ext>`` con caché inmutable; las plantillas
+    se renderizan con esas URL. Todo se comprime una sola vez con la mejor
+    calidad de gzip y brotli.
+    """
+
+    def __init__(self, directorio_static: str = 'static', directorio_templates: str = 'templates'):
+        self.directorio_static = directorio_static
+        self.directorio_templates = directorio_templates
+        self._lock = threading.Lock()
+        # Una sola carga a la vez; las peticiones que llegan antes esperan la primera
+        self._carga = threading.RLock()
+        self._urls = {}
+        self._recursos = {}
+        self._paginas = {}
+
+    def url(self, nombre: str):
+        """URL con huella de un archivo de ``static`` (o la URL original si no existe)."""
+        return self._urls.get(nombre, f'/static/{nombre}')
+
+    def cargar(self):
+        with self._carga:
+            return self._cargar()
+
+    def _cargar(self):
+        from jinja2 import Environment, FileSystemLoader
+
+        urls = {}
+        recursos = {}
+        for raiz, _, archivos in os.walk(self.directorio_static):
+            for archivo in sorted(archivos):
+                ruta = os.path.join(raiz, archivo)
+                nombre = os.path.relpath(ruta, self.directorio_static).replace(os.sep, '/')
+                with open(ruta, 'rb') as f:
+                    cuerpo = f.read()
+                tipo = mimetypes.guess_type(archivo)[0] or 'application/octet-stream'
+                if tipo.startswith('text/') or tipo == 'application/javascript':
+                    tipo += '; charset=utf-8'
+                recurso = Recurso(cuerpo, tipo, CACHE_INMUTABLE)
+                base, extension = os.path.splitext(nombre)
+                con_huella = f'{base}.{recurso.huella[:10]}{extension}'
+                urls[nombre] = f'{PREFIJO_RECURSOS}/{con_huella}'
+                recursos[con_huella] = recurso
+
+        entorno = Environment(loader=FileSystemLoader(self.directorio_templates), autoescape=True)
+        entorno.globals['estatico'] = lambda nombre: urls.get(nombre, f'/static/{nombre}')
+        paginas = {
+            ruta: Recurso(
+                entorno.get_template(plantilla).render().encode('utf-8'),
+                'text/html; charset=utf-8',
+                CACHE_PAGINA
+            )
+            for ruta, plantilla in PAGINAS.items()
+        }
+
+        with self._lock:
+            self._urls = urls
+            self._recursos = recursos
+            self._paginas = paginas
+        return len(recursos), len(paginas)
+
+    def _responder(self, request, recurso: Recurso):
+        cabeceras = {
+            'Cache-Control': recurso.cache,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and _coincide_etag(if_none_match, recurso):
+            cabeceras['ETag'] = recurso.etag()
+            return Response(status_code=304, headers=cabeceras)
+
+        codificacion = elegir_codificacion(request.headers.get('accept-encoding', ''))
+        if codificacion in recurso.variantes:
+            cabeceras['Content-Encoding'] = codificacion
+            cabeceras['ETag'] = recurso.etag(codificacion)
+            return Response(recurso.variantes[codificacion], media_type=recurso.tipo, headers=cabeceras)
+
+        cabeceras['ETag'] = recurso.etag()
+        return Response(recurso.cuerpo, media_type=recurso.tipo, headers=cabeceras)
+
+    def _asegurar_carga(self):
+        if not self._paginas:
+            with self._carga:
+                if not self._paginas:
+                    self.cargar()
+
+    def pagina(self, request, ruta: str):
+        self._asegurar_carga()
+        return self._responder(request, self._paginas[ruta])
+
+    def recurso(self, request, nombre: str):
+        self._asegurar_carga()
+        recurso = self._recursos.get(nombre)
+        if recurso is None:
+            return None
+        return self._responder(request, recurso)
+
+
+# Instancia compartida por la aplicación (una por proceso)
+catalogo_estaticos = CatalogoEstaticos()
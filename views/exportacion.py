@@ -0,0 +1,150 @@
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+import csv
+import io
+import zipfile
+
+# Filas acumuladas antes de enviar un bloque al cliente
+FILAS_POR_BLOQUE = 500
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def generar_csv(encabezados: list, filas):
+    """Bloques de bytes CSV (UTF-8 con BOM para que Excel respete las tildes)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(encabezados)
+
+    pendientes = 0
+    for fila in filas:
+        escritor.writerow([_texto(valor) for valor in fila])
+        pendientes += 1
+        if pendientes >= FILAS_POR_BLOQUE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _Salida(io.RawIOBase):
+    """Destino no posicionable de zipfile: acumula lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self._bloques = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._bloques.append(bytes(datos))
+        return len(datos)
+
+    def retirar(self):
+        datos = b''.join(self._bloques)
+        self._bloques = []
+        return datos
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(hoja: str):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(hoja[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(_texto(valor)))}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(valor) for valor in valores) + '</row>'
+
+
+def generar_xlsx(encabezados: list, filas, hoja: str = 'Datos'):
+    """Bloques de bytes de un libro XLSX de una hoja, escrito en streaming.
+
+    La hoja usa cadenas en línea (sin tabla de cadenas compartidas), así
+    cada fila se escribe y se envía sin guardar las anteriores.
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        libro.writestr('_rels/.rels', _RELS)
+        libro.writestr('xl/workbook.xml', _workbook(hoja))
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _fila_xml(encabezados)
+            ).encode('utf-8'))
+
+            bloque = []
+            for fila in filas:
+                bloque.append(_fila_xml(fila))
+                if len(bloque) >= FILAS_POR_BLOQUE:
+                    hoja_xml.write(''.join(bloque).encode('utf-8'))
+                    bloque = []
+                    datos = salida.retirar()
+                    if datos:
+                        yield datos
+
+            hoja_xml.write((''.join(bloque) + '</sheetData></worksheet>').encode('utf-8'))
+
+    yield salida.retirar()
@@ -0,0 +1,163 @@
+from fastapi.responses import Response
+import gzip
+import orjson
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se negocia gzip
+    brotli = None
+
+# Respuestas más pequeñas que esto no compensan el costo de comprimir
+TAMANO_MINIMO_COMPRESION = 1024
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+class RespuestaJSON(Response):
+    """Respuesta JSON serializada con orjson directamente a bytes.
+
+    Las vistas que la devuelven evitan el ``jsonable_encoder`` de FastAPI;
+    orjson serializa ``datetime`` en formato ISO igual que FastAPI.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def elegir_codificacion(accept_encoding: str):
+    """Codificación preferida según Accept-Encoding: br, luego gzip."""
+    codificaciones = {}
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        codificaciones[nombre.strip()] = calidad
+
+    if brotli is not None and codificaciones.get("br", 0) > 0:
+        return "br"
+    if codificaciones.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compresor:
+    def __init__(self, codificacion: str):
+        if codificacion == "br":
+            self._compresor = brotli.Compressor(quality=4)
+            self._comprimir = self._compresor.process
+            self._terminar = self._compresor.finish
+        else:
+            self._compresor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._comprimir = self._compresor.compress
+            self._terminar = self._compresor.flush
+
+    def comprimir(self, datos: bytes):
+        return self._comprimir(datos)
+
+    def terminar(self):
+        return self._terminar()
+
+
+def comprimir(datos: bytes, codificacion: str):
+    if codificacion == "br":
+        return brotli.compress(datos, quality=4)
+    return gzip.compress(datos, compresslevel=6)
+
+
+class MiddlewareCompresion:
+    """Compresión gzip/brotli negociada para respuestas de texto.
+
+    Las respuestas completas se comprimen de una vez si superan
+    ``tamano_minimo``; las respuestas en streaming se comprimen por bloques.
+    """
+
+    def __init__(self, app, tamano_minimo: int = TAMANO_MINIMO_COMPRESION):
+        self.app = app
+        self.tamano_minimo = tamano_minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for nombre, valor in scope["headers"]:
+            if nombre == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+                break
+
+        codificacion = elegir_codificacion(accept_encoding)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compresor = None
+        omitir = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor, omitir
+
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                cabeceras = {nombre.lower(): valor for nombre, valor in mensaje.get("headers", [])}
+                tipo = cabeceras.get(b"content-type", b"").decode("latin-1")
+                omitir = (
+                    b"content-encoding" in cabeceras
+                    or not tipo.startswith(TIPOS_COMPRIMIBLES)
+                )
+                if omitir:
+                    await send(inicio)
+                return
+
+            if mensaje["type"] != "http.response.body" or omitir:
+                await send(mensaje)
+                return
+
+            cuerpo = mensaje.get("body", b"")
+            mas_cuerpo = mensaje.get("more_body", False)
+
+            if compresor is None and not mas_cuerpo:
+                # Respuesta completa en un solo mensaje
+                if len(cuerpo) < self.tamano_minimo:
+                    await send(inicio)
+                    await send(mensaje)
+                    return
+                comprimido = comprimir(cuerpo, codificacion)
+                await send(self._cabeceras(inicio, codificacion, len(comprimido)))
+                await send({"type": "http.response.body", "body": comprimido})
+                return
+
+            if compresor is None:
+                # Primer bloque de una respuesta en streaming
+                compresor = _Compresor(codificacion)
+                await send(self._cabeceras(inicio, codificacion, None))
+
+            datos = compresor.comprimir(cuerpo)
+            if not mas_cuerpo:
+                datos += compresor.terminar()
+            await send({"type": "http.response.body", "body": datos, "more_body": mas_cuerpo})
+
+        await self.app(scope, receive, enviar)
+
+    def _cabeceras(self, inicio, codificacion: str, longitud):
+        cabeceras = []
+        vary = b"Accept-Encoding"
+        for nombre, valor in inicio.get("headers", []):
+            if nombre.lower() == b"vary":
+                vary = valor + b", Accept-Encoding"
+            elif nombre.lower() != b"content-length":
+                cabeceras.append((nombre, valor))
+        cabeceras.append((b"content-encoding", codificacion.encode("latin-1")))
+        cabeceras.append((b"vary", vary))
+        if longitud is not None:
+            cabeceras.append((b"content-length", str(longitud).encode("latin-1")))
+        return {**inicio, "headers": cabeceras}